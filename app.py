@@ -6,18 +6,34 @@ This provides a user-friendly web interface for filling out the questionnaire
 and visualizing biological age results.
 """
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from flask import (Flask, render_template, request, jsonify, redirect, url_for, g, Response, abort,
+                   make_response, send_from_directory, stream_with_context)
 import matplotlib
 matplotlib.use('Agg')  # Use non-interactive backend
-import matplotlib.pyplot as plt
+from matplotlib.artist import setp
 import os
 import json
-import io
-import base64
+import hmac
+import inspect
 import logging
+import mimetypes
+import threading
+import time
 from datetime import datetime, timedelta
+import questionnaire_bioage
 from questionnaire_bioage import QuestionnaireAgeCalculator
 from functools import wraps
+import metrics
+from metrics import stage_timer
+from profiling import RequestProfiler
+from page_cache import PageCache, content_hash
+from assets import AssetManifest, IMMUTABLE_MAX_AGE
+from compression import ENCODINGS, choose_encoding, compress_response
+from plot_cache import PlotCache
+from rendering import figure_png, new_figure
+from render_pool import RenderPool, render_results_plot
+from percentiles import PercentileIndex
+from longitudinal import LongitudinalStore, new_token, valid_token
 
 # Configure logging
 logging.basicConfig(
@@ -53,8 +69,179 @@ def add_security_headers(response):
     
     return response
 
-# Initialize the calculator
-calculator = QuestionnaireAgeCalculator()
+# Request latency and status metrics (exposed on /metrics)
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        endpoint = request.endpoint or 'unknown'
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+        metrics.REQUESTS_TOTAL.inc(endpoint=endpoint, status=str(response.status_code))
+    return response
+
+# Negotiated gzip/brotli compression of HTML and JSON responses
+@app.after_request
+def compress_responses(response):
+    page = g.pop('cached_page', None)
+    encoding = choose_encoding(request.accept_encodings)
+    if page is not None and encoding is not None:
+        return compress_response(response, request.accept_encodings,
+                                 compressed_body=page.encoded(encoding), encoding=encoding)
+    return compress_response(response, request.accept_encodings)
+
+# Sampling profiler, enabled with PROFILE_SAMPLE_RATE (e.g. 0.001 for 1 in 1000 requests)
+profiler = RequestProfiler.from_environment()
+
+# Token for the admin views; they are disabled when it isn't set
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+@app.before_request
+def start_profiling():
+    if profiler.enabled and request.endpoint not in ('static', 'assets', 'plot_image', 'plot_status',
+                                                     'metrics_endpoint', 'admin_profiles'):
+        g.profile = profiler.start()
+
+@app.teardown_request
+def stop_profiling(exc):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profiler.stop(profile, label=request.endpoint or 'unknown')
+
+# Initialize the calculator. Plots are drawn with matplotlib's object-oriented API, so
+# requests can render concurrently in threaded workers; RENDER_POOL_SIZE bounds the
+# figure templates of the fast results plot (one per concurrently rendering thread).
+RENDER_POOL_SIZE = int(os.environ.get('RENDER_POOL_SIZE', 4))
+calculator = QuestionnaireAgeCalculator(plot_pool_size=RENDER_POOL_SIZE)
+
+# Rendered pages that only change between deploys, and their HTTP caching
+page_cache = PageCache()
+QUESTIONNAIRE_VERSION = content_hash(calculator.get_questions(), calculator.get_categories())
+PAGE_MAX_AGE = int(os.environ.get('PAGE_MAX_AGE', 300))  # Seconds browsers reuse a page
+
+def cached_page(render, version=''):
+    """
+    Serve a page rendered once per process, with a strong ETag.
+    
+    The cache key includes the endpoint, the script root (which affects the
+    generated URLs), the current year (shown in the footer) and a version of
+    the page's inputs. Requests with a matching If-None-Match get a 304.
+    """
+    key = (request.endpoint, request.script_root, datetime.now().year, version)
+    page = page_cache.get(key, render)
+    
+    # The client may hold the plain or a compressed representation ("<etag>-gzip")
+    for etag in [page.etag] + [f"{page.etag}-{encoding}" for encoding in ENCODINGS]:
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            break
+    else:
+        response = Response(page.body, mimetype='text/html')
+        response.set_etag(page.etag)
+        g.cached_page = page  # Lets compress_responses reuse the memoized compressed body
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.max_age = PAGE_MAX_AGE
+    return response
+
+# Stream the results and comparison pages, so that the numbers reach the browser
+# while the plot embedded further down the page is still being drawn
+STREAM_TEMPLATES = os.environ.get('STREAM_TEMPLATES', '0') == '1'
+
+class LazyMarkup:
+    """Template value computed when the template renders it."""
+    
+    def __init__(self, func):
+        self.func = func
+        self._value = None
+    
+    def __html__(self):
+        if self._value is None:
+            self._value = self.func()
+        return self._value
+    
+    __str__ = __html__
+
+def render_page(template_name, stage=None, **context):
+    """
+    Render a template, or stream it when STREAM_TEMPLATES is enabled.
+    
+    With a stage name, the rendering is timed as that stage of the request. A
+    streamed template is rendered while the response is sent, so its stage
+    covers the whole stream (rendering and sending).
+    """
+    if not STREAM_TEMPLATES:
+        if stage is None:
+            return render_template(template_name, **context)
+        with stage_timer(stage):
+            return render_template(template_name, **context)
+    app.update_template_context(context)
+    stream = app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(5)  # Send every few template chunks rather than each one
+    if stage is not None:
+        stream = _timed_stream(stream, stage)
+    return Response(stream_with_context(stream), mimetype='text/html')
+
+def _timed_stream(stream, stage):
+    with stage_timer(stage):
+        yield from stream
+
+# Rendered plots, served from /plots/<key>.png instead of being inlined in the pages.
+# The key hashes the plot inputs and the plotting code, so cached images of an
+# older deploy are never served for new code.
+plot_cache = PlotCache.from_environment()
+# Opt-in fast plot rendering (FAST_PLOTS=1: pre-built figure template, fixed reduced
+# resolution); by default the full-resolution figure is drawn from scratch on every request
+FAST_PLOTS = os.environ.get('FAST_PLOTS', '0') == '1'
+PLOT_VERSION = content_hash(inspect.getsource(questionnaire_bioage), matplotlib.__version__, FAST_PLOTS)
+
+# Optional background rendering of the results plot (RENDER_WORKERS processes); the
+# results page then polls /plots/<key>/status for the image
+render_pool = RenderPool.from_environment(plot_cache)
+if render_pool is not None:
+    metrics.REGISTRY.register(metrics.Gauge(
+        'bioage_render_pending', "Plots queued or rendering in the background render pool.",
+        lambda: {(('pid', str(os.getpid())),): render_pool.pending}))
+# Longest wait of a long-polling status request, in seconds
+MAX_PLOT_WAIT = 10
+
+# Population percentiles of the aging pace by age band and sex, built from the stored
+# results and an optional reference file on first use (or by warm_up)
+RESULTS_DIR = 'results'
+_percentile_index = None
+_percentile_lock = threading.Lock()
+
+def get_percentile_index():
+    """The percentile index of this worker process, built on first use."""
+    global _percentile_index
+    if _percentile_index is None:
+        with _percentile_lock:
+            if _percentile_index is None:
+                _percentile_index = PercentileIndex.from_environment(RESULTS_DIR)
+    return _percentile_index
+
+# Optional per-person tracking of results over time (LONGITUDINAL_DB); people who opt in
+# get a random tracking token (cookie, shown once for other devices) and the trend of
+# their aging pace with every result
+longitudinal_store = LongitudinalStore.from_environment()
+TRACKING_COOKIE = 'bioage_tracking'
+TRACKING_COOKIE_MAX_AGE = 2 * 365 * 24 * 3600
+
+def warm_up():
+    """Build the plot figure templates and the percentile index before the first request (see gunicorn.conf.py)."""
+    if render_pool is not None:
+        render_pool.start(fast=FAST_PLOTS)
+    elif FAST_PLOTS:
+        calculator.plot_templates.fill()
+    get_percentile_index()
+
+# Fingerprinted static assets (python build_assets.py); falls back to /static without a build
+assets_manifest = AssetManifest(app.static_folder)
+app.jinja_env.globals.update(asset_url=assets_manifest.url, image_set=assets_manifest.image_set)
 
 # Custom template filters
 @app.template_filter('now')
@@ -62,11 +249,33 @@ def get_now(value, format_string='%Y'):
     """Get current date/time in specified format (default: year)"""
     return datetime.now().strftime(format_string)
 
-# Rate limiting configuration
+# Rate limiting configuration (overridable with environment variables, e.g. for load tests)
 RATE_LIMIT = {
-    'requests': 10,  # Number of requests
-    'window': 60     # Time window in seconds
+    'requests': int(os.environ.get('RATE_LIMIT_REQUESTS', 10)),  # Number of requests
+    'window': int(os.environ.get('RATE_LIMIT_WINDOW', 60))       # Time window in seconds
 }
+# Recent request times per client, shared by the threads of a worker process
+_rate_limit_requests = {}
+_rate_limit_lock = threading.Lock()
+
+# Admin access decorator
+def admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            abort(404)
+        token = request.headers.get('X-Admin-Token') or request.args.get('token', '')
+        authorization = request.headers.get('Authorization', '')
+        if not token and authorization.startswith('Bearer '):
+            # Prometheus scrape configs send the token as a bearer token
+            token = authorization[len('Bearer '):]
+        if not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+            logger.warning(f"Rejected admin request from IP: {request.remote_addr}")
+            return render_template('error.html',
+                                   error_code=403,
+                                   error_message="Acceso denegado"), 403
+        return f(*args, **kwargs)
+    return decorated_function
 
 # Rate limiting decorator
 def rate_limit(f):
@@ -81,39 +290,53 @@ def rate_limit(f):
         # Get current timestamp
         now = datetime.now()
         
-        # Get existing requests
-        requests = getattr(app, '_rate_limit', {}).get(rate_key, [])
-        
-        # Remove old requests
-        requests = [req_time for req_time in requests 
-                   if now - req_time < timedelta(seconds=RATE_LIMIT['window'])]
+        # Check and record the request atomically, so that concurrent requests
+        # from threaded workers can't both pass the limit
+        with _rate_limit_lock:
+            # Remove old requests
+            requests = [req_time for req_time in _rate_limit_requests.get(rate_key, [])
+                        if now - req_time < timedelta(seconds=RATE_LIMIT['window'])]
+            
+            # Check if limit exceeded
+            limited = len(requests) >= RATE_LIMIT['requests']
+            if not limited:
+                # Add new request
+                requests.append(now)
+            _rate_limit_requests[rate_key] = requests
         
-        # Check if limit exceeded
-        if len(requests) >= RATE_LIMIT['requests']:
+        if limited:
             logger.warning(f"Rate limit exceeded for IP: {client_ip}")
+            metrics.RATE_LIMITED_TOTAL.inc()
             return jsonify({
                 'error': 'Demasiadas solicitudes. Por favor, espera un momento antes de intentar nuevamente.'
             }), 429
         
-        # Add new request
-        requests.append(now)
-        
-        # Update rate limit data
-        if not hasattr(app, '_rate_limit'):
-            app._rate_limit = {}
-        app._rate_limit[rate_key] = requests
-        
         return f(*args, **kwargs)
     return decorated_function
 
+@app.route('/assets/<path:filename>')
+def assets(filename):
+    """Serve built assets, precompressed when possible, with far-future caching."""
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoded = assets_manifest.encoded_file(filename, request.accept_encodings)
+    served = encoded[1] if encoded else filename
+    response = send_from_directory(assets_manifest.dist_folder, served,
+                                   mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+    if encoded:
+        response.headers['Content-Encoding'] = encoded[0]
+    if filename in assets_manifest.encodings:
+        response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
 @app.route('/')
 def index():
     """Render the home page."""
-    return render_template('index.html')
+    return cached_page(lambda: render_template('index.html'))
 
-@app.route('/questionnaire')
-def questionnaire():
-    """Render the questionnaire page."""
+def render_questionnaire():
+    """Render the questionnaire page HTML."""
     questions = calculator.get_questions()
     categories = calculator.get_categories()
     
@@ -132,14 +355,23 @@ def questionnaire():
     
     return render_template('questionnaire.html', 
                           categorized_questions=categorized_questions,
-                          categories=categories)
+                          categories=categories,
+                          tracking_enabled=longitudinal_store is not None)
+
+@app.route('/questionnaire')
+def questionnaire():
+    """Render the questionnaire page (cached, keyed on the question table)."""
+    return cached_page(render_questionnaire, version=QUESTIONNAIRE_VERSION)
 
 @app.route('/calculate', methods=['POST'])
 @rate_limit
 def calculate():
     """Process form submission and calculate biological age."""
     # Get all form data
-    form_data = request.form.to_dict()
+    with stage_timer('parse_form'):
+        form_data = request.form.to_dict()
+        track = form_data.pop('track', '') == '1'
+        tracking_code = form_data.pop('tracking_code', '').strip()
     
     # Debug info
     print(f"Form data received: {form_data}")
@@ -158,55 +390,107 @@ def calculate():
     # Calculate biological age
     try:
         print("Calculating biological age...")
-        results = calculator.calculate_biological_age(form_data)
+        with stage_timer('calculate_biological_age'):
+            results = calculator.calculate_biological_age(form_data)
         print(f"Results: {results}")
         
         print("Generating recommendations...")
-        recommendations = calculator.generate_recommendations(results)
+        with stage_timer('generate_recommendations'):
+            recommendations = calculator.generate_recommendations(results)
+        
+        with stage_timer('suggest_improvements'):
+            improvements = calculator.suggest_improvements(form_data)
+        
+        # Rank the result among people of the same age band and sex, then add it
+        sex = form_data.get('sex')
+        with stage_timer('percentile'):
+            percentile_index = get_percentile_index()
+            percentile = percentile_index.better_than(results['chronological_age'], sex, results['aging_pace'])
+            percentile_index.add(results['chronological_age'], sex, results['aging_pace'])
+        
+        # Store the result in the person's history and get their trend. The token is
+        # issued by the server: a code entered from another device, else the cookie,
+        # else a new one that is shown once
+        trend = None
+        tracking_token = new_tracking_token = None
+        if longitudinal_store is not None and track:
+            tracking_token = next((token for token in (tracking_code, request.cookies.get(TRACKING_COOKIE))
+                                   if valid_token(token)), None)
+            if tracking_token is None:
+                tracking_token = new_tracking_token = new_token()
+            with stage_timer('longitudinal'):
+                trend = longitudinal_store.record(tracking_token, results)
         
-        # Generate visualizations
-        print("Creating visualization...")
-        fig = calculator.plot_results(results)
+        # Generate visualizations (shared by everyone with the same results)
+        plot_key = plot_cache.key('results', PLOT_VERSION, results)
         
-        # Convert plot to base64 for embedding in HTML
-        img_data = io.BytesIO()
-        fig.savefig(img_data, format='png', bbox_inches='tight')
-        plt.close(fig)
-        img_data.seek(0)
-        plot_base64 = base64.b64encode(img_data.getvalue()).decode('utf-8')
+        def make_plot():
+            app.logger.debug("Creating visualization...")
+            with stage_timer('plot_results'):
+                return calculator.plot_results_png(results, fast=FAST_PLOTS)
+        
+        def get_plot_url():
+            plot_cache.get_or_render(plot_key, make_plot)
+            return url_for('plot_image', key=plot_key)
+        
+        plot_status_url = None
+        if render_pool is not None and render_pool.submit(plot_key, render_results_plot, results, FAST_PLOTS):
+            # Rendered in the background; the page polls for the image
+            plot_url = None
+            plot_status_url = url_for('plot_status', key=plot_key)
+        elif STREAM_TEMPLATES:
+            # When streaming, the plot is drawn once the page reaches it
+            plot_url = LazyMarkup(get_plot_url)
+        else:
+            plot_url = get_plot_url()
         
         # Store results in session for results page
         timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
         result_data = {
             'results': results,
             'recommendations': recommendations,
-            'plot_base64': plot_base64,
+            'percentile': percentile,
+            'trend': trend,
+            'plot_key': plot_key,
             'timestamp': timestamp
         }
         
         # Save results to a file (optional - for history feature)
-        results_dir = 'results'
-        os.makedirs(results_dir, exist_ok=True)
+        results_dir = RESULTS_DIR
         print(f"Saving results to {results_dir}/result_{timestamp}.json")
-        with open(f'{results_dir}/result_{timestamp}.json', 'w') as f:
-            # We can't directly serialize the plot, so exclude it
-            serializable_data = {
-                'results': results,
-                'recommendations': recommendations,
-                'timestamp': timestamp
-            }
-            json.dump(serializable_data, f)
+        with stage_timer('save_results'):
+            os.makedirs(results_dir, exist_ok=True)
+            with open(f'{results_dir}/result_{timestamp}.json', 'w') as f:
+                # The plot itself lives in the plot cache, under plot_key
+                serializable_data = {
+                    'results': results,
+                    'recommendations': recommendations,
+                    'sex': sex,
+                    'plot_key': plot_key,
+                    'timestamp': timestamp
+                }
+                json.dump(serializable_data, f)
         
         # Get categories for the results page
         categories = calculator.get_categories()
         
         print("Rendering results page...")
         # Return the results page
-        return render_template('results.html', 
-                              results=results,
-                              recommendations=recommendations,
-                              plot_base64=plot_base64,
-                              categories=categories)
+        response = make_response(render_page('results.html',
+                                             stage='render_template',
+                                             results=results,
+                                             recommendations=recommendations,
+                                             improvements=improvements,
+                                             percentile=percentile,
+                                             trend=trend,
+                                             tracking_code=new_tracking_token,
+                                             plot_url=plot_url,
+                                             plot_status_url=plot_status_url,
+                                             categories=categories))
+        if tracking_token is not None:
+            response.set_cookie(TRACKING_COOKIE, tracking_token, max_age=TRACKING_COOKIE_MAX_AGE,
+                                httponly=True, secure=request.is_secure, samesite='Lax')
+        return response
         
     except Exception as e:
         print(f"Error calculating biological age: {str(e)}")
@@ -217,63 +501,79 @@ def calculate():
 @app.route('/about')
 def about():
     """Render the about page with information on the method."""
-    return render_template('about.html')
+    return cached_page(lambda: render_template('about.html'))
 
 @app.route('/privacy')
 def privacy():
     """Render the privacy policy page."""
-    return render_template('privacy.html')
+    return cached_page(lambda: render_template('privacy.html'))
 
 @app.route('/terms')
 def terms():
     """Render the terms of service page."""
-    return render_template('terms.html')
+    return cached_page(lambda: render_template('terms.html'))
+
+# Comparison page: a 45-year-old with an average lifestyle, and the answers each
+# lifestyle scenario changes
+COMPARISON_BASE = {
+    'age': 45,
+    'sex': 'male',
+    'sleep': '7-8',
+    'smoking': 'never',
+    'alcohol': 'moderate',
+    'exercise': 'moderate',
+    'strength_training': 'sometimes',
+    'diet': 'good',
+    'fruits_veggies': '2-3',
+    'bmi': 'normal',
+    'chronic_conditions': '0',
+    'medications': '0',
+    'blood_pressure': 'normal',
+    'stress': 'moderate',
+    'happiness': 'happy',
+    'social_connections': 'good',
+    'education': 'bachelors',
+    'mental_activity': 'several_weekly',
+    'sedentary': '7-9',
+    'longevity_family': 'moderate'
+}
+COMPARISON_SCENARIOS = {
+    "Caso Base": {},
+    "Sueño Deficiente": {'sleep': '<5'},
+    "Estilo de Vida Activo": {'exercise': 'very_active', 'strength_training': 'very_often', 'sedentary': '4-6'},
+    "Hábitos de Salud Deficientes": {'smoking': 'current_light', 'alcohol': 'heavy', 'diet': 'poor', 'exercise': 'none'},
+    "Estilo de Vida Óptimo": {'sleep': '7-8', 'exercise': 'very_active', 'strength_training': 'very_often', 
+                              'diet': 'excellent', 'fruits_veggies': '6+', 'stress': 'low', 'happiness': 'very_happy', 
+                              'social_connections': 'excellent', 'mental_activity': 'daily'}
+}
 
 @app.route('/comparison')
 def comparison():
     """Render the comparison page showing different lifestyle scenarios."""
-    # Base case - 45-year-old with average lifestyle
-    base_responses = {
-        'age': 45,
-        'sex': 'male',
-        'sleep': '7-8',
-        'smoking': 'never',
-        'alcohol': 'moderate',
-        'exercise': 'moderate',
-        'strength_training': 'sometimes',
-        'diet': 'good',
-        'fruits_veggies': '2-3',
-        'bmi': 'normal',
-        'chronic_conditions': '0',
-        'medications': '0',
-        'blood_pressure': 'normal',
-        'stress': 'moderate',
-        'happiness': 'happy',
-        'social_connections': 'good',
-        'education': 'bachelors',
-        'mental_activity': 'several_weekly',
-        'sedentary': '7-9',
-        'longevity_family': 'moderate'
-    }
-    
-    # Scenarios to compare
-    scenarios = {
-        "Caso Base": base_responses.copy(),
-        "Sueño Deficiente": {**base_responses.copy(), 'sleep': '<5'},
-        "Estilo de Vida Activo": {**base_responses.copy(), 'exercise': 'very_active', 'strength_training': 'very_often', 'sedentary': '4-6'},
-        "Hábitos de Salud Deficientes": {**base_responses.copy(), 'smoking': 'current_light', 'alcohol': 'heavy', 'diet': 'poor', 'exercise': 'none'},
-        "Estilo de Vida Óptimo": {**base_responses.copy(), 'sleep': '7-8', 'exercise': 'very_active', 'strength_training': 'very_often', 
-                             'diet': 'excellent', 'fruits_veggies': '6+', 'stress': 'low', 'happiness': 'very_happy', 
-                             'social_connections': 'excellent', 'mental_activity': 'daily'}
-    }
-    
-    # Calculate biological age for each scenario
-    scenario_results = {}
-    for name, responses in scenarios.items():
-        scenario_results[name] = calculator.calculate_biological_age(responses)
+    # The base profile is scored once; each scenario only rescores its changed answers
+    profile = calculator.what_if(COMPARISON_BASE)
+    scenario_results = profile.evaluate_many(COMPARISON_SCENARIOS)
+    
+    plot_key = plot_cache.key('comparison', inspect.getsource(plot_comparison),
+                              matplotlib.__version__, scenario_results)
+    
+    def get_plot_url():
+        plot_cache.get_or_render(plot_key, lambda: plot_comparison(scenario_results))
+        return url_for('plot_image', key=plot_key)
+    
+    # When streaming, the plot is drawn once the page reaches it
+    comparison_plot_url = LazyMarkup(get_plot_url) if STREAM_TEMPLATES else get_plot_url()
     
+    return render_page('comparison.html', 
+                       scenarios=COMPARISON_SCENARIOS,
+                       scenario_results=scenario_results,
+                       comparison_plot_url=comparison_plot_url)
+
+def plot_comparison(scenario_results):
+    """Draw the scenario comparison chart and return it as PNG bytes."""
     # Create comparison visualization
-    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 6))
+    fig = new_figure(figsize=(12, 6))
+    ax1, ax2 = fig.subplots(1, 2)
     
     # Plot biological ages
     scenario_names = list(scenario_results.keys())
@@ -283,7 +583,7 @@ def comparison():
     ax1.set_title('Edad Biológica por Escenario', fontsize=14)
     ax1.set_ylabel('Edad Biológica (años)')
     ax1.grid(axis='y', linestyle='--', alpha=0.7)
-    plt.setp(ax1.get_xticklabels(), rotation=45, ha='right')
+    setp(ax1.get_xticklabels(), rotation=45, ha='right')
     
     # Add values on top of bars
     for bar in bars:
@@ -301,7 +601,7 @@ def comparison():
     ax2.set_ylabel('Ritmo de Envejecimiento (años)')
     ax2.grid(axis='y', linestyle='--', alpha=0.7)
     ax2.axhline(y=0, color='k', linestyle='-', alpha=0.3)
-    plt.setp(ax2.get_xticklabels(), rotation=45, ha='right')
+    setp(ax2.get_xticklabels(), rotation=45, ha='right')
     
     # Add values on top of bars
     for bar in bars:
@@ -311,20 +611,68 @@ def comparison():
                  f'{height:+.1f}',
                  ha='center', va='bottom' if height >= 0 else 'top')
     
-    plt.suptitle('Impacto de Elecciones de Estilo de Vida en la Edad Biológica', fontsize=16, fontweight='bold')
-    plt.tight_layout(rect=[0, 0, 1, 0.95])
+    fig.suptitle('Impacto de Elecciones de Estilo de Vida en la Edad Biológica', fontsize=16, fontweight='bold')
+    fig.tight_layout(rect=[0, 0, 1, 0.95])
+    
+    return figure_png(fig, bbox_inches='tight')
+
+@app.route('/plots/<key>.png')
+def plot_image(key):
+    """Serve a rendered plot; the URL identifies the image, so it can be cached forever."""
+    image = plot_cache.get(key)
+    if image is None:
+        abort(404)
+    response = Response(image, mimetype='image/png')
+    response.set_etag(key)
+    response.cache_control.public = True
+    response.cache_control.max_age = IMMUTABLE_MAX_AGE
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
+
+@app.route('/plots/<key>/status')
+def plot_status(key):
+    """
+    Status of a plot rendered in the background, as JSON with the image URL when ready.
     
-    # Convert to base64 for embedding in HTML
-    img_data = io.BytesIO()
-    fig.savefig(img_data, format='png', bbox_inches='tight')
-    plt.close(fig)
-    img_data.seek(0)
-    comparison_plot = base64.b64encode(img_data.getvalue()).decode('utf-8')
+    With ?wait=<seconds> (at most MAX_PLOT_WAIT) the request is held until the
+    plot is ready or the time is up (long polling).
+    """
+    timeout = min(max(request.args.get('wait', 0, type=float), 0), MAX_PLOT_WAIT)
+    if render_pool is not None:
+        status = render_pool.wait(key, timeout)
+    else:
+        status = 'ready' if plot_cache.get(key) is not None else 'missing'
     
-    return render_template('comparison.html', 
-                          scenarios=scenarios,
-                          scenario_results=scenario_results,
-                          comparison_plot=comparison_plot)
+    data = {'status': status}
+    if status == 'ready':
+        data['url'] = url_for('plot_image', key=key)
+    status_code = {'ready': 200, 'pending': 202, 'failed': 500, 'missing': 404}[status]
+    response = jsonify(data)
+    response.status_code = status_code
+    response.cache_control.no_store = True
+    return response
+
+@app.route('/metrics')
+@admin_required
+def metrics_endpoint():
+    """Expose request, stage, cache, rate-limit and memory metrics in Prometheus text format (admin only)."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/profiles')
+@admin_required
+def admin_profiles():
+    """List the most expensive functions across the sampled request profiles."""
+    sort = request.args.get('sort', 'cumulative')
+    if sort not in ('cumulative', 'tottime'):
+        sort = 'cumulative'
+    limit = min(request.args.get('limit', 30, type=int), 500)
+    summary = profiler.top_functions(limit=limit, sort=sort)
+    if request.args.get('format') == 'json':
+        return jsonify(summary)
+    return render_template('admin_profiles.html',
+                           summary=summary,
+                           sort=sort,
+                           sample_rate=profiler.sample_rate)
 
 # Modificación para Vercel - exportar la aplicación Flask
 app.debug = False
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+URLs for the fingerprinted assets produced by build_assets.py.
+
+AssetManifest reads static/dist/manifest.json and maps original static file
+names to their content-hashed, precompressed and resized variants. When no
+build is present, every lookup falls back to the original file under /static,
+so the app works unchanged in development.
+
+In templates:
+    <link rel="stylesheet" href="{{ asset_url('css/style.css') }}">
+    <img src="{{ asset_url('img/logo.jpeg', width=640) }}">
+    style="background-image: {{ image_set('img/clock.jpg', width=1920) }}"
+"""
+
+import json
+import os
+from typing import Dict, Optional
+
+from flask import url_for
+
+from build_assets import DIST_DIR, MANIFEST_NAME
+
+# Cache lifetime of fingerprinted assets (one year, the practical maximum)
+IMMUTABLE_MAX_AGE = 31536000
+
+
+class AssetManifest:
+    """
+    Lookup of built assets.
+    
+    Parameters:
+    -----------
+    static_folder : str
+        Static folder of the app (the build output is in <static_folder>/dist)
+    endpoint : str, default='assets'
+        Endpoint serving the files of the build output
+    """
+    
+    def __init__(self, static_folder: str, endpoint: str = 'assets'):
+        self.dist_folder = os.path.join(static_folder, DIST_DIR)
+        self.endpoint = endpoint
+        self.entries: Dict[str, Dict] = {}
+        self.encodings: Dict[str, Dict[str, str]] = {}
+        self.load()
+    
+    def load(self) -> None:
+        """(Re)load the manifest; without one every lookup falls back to /static."""
+        path = os.path.join(self.dist_folder, MANIFEST_NAME)
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+        # Precompressed variants by served file name
+        self.encodings = {
+            entry['file']: entry['encodings']
+            for entry in self.entries.values() if entry.get('encodings')
+        }
+    
+    def _file(self, filename: str, width: Optional[int], fmt: str) -> Optional[str]:
+        entry = self.entries.get(filename)
+        if entry is None:
+            return None
+        variants = entry.get('variants')
+        if width is None or not variants:
+            return entry['file']
+        # Smallest variant at least as wide as requested, else the original
+        for variant_width in sorted(variants, key=int):
+            if int(variant_width) >= width:
+                return variants[variant_width][fmt]
+        return entry['file'] if fmt == 'jpeg' else variants[max(variants, key=int)][fmt]
+    
+    def url(self, filename: str, width: Optional[int] = None, webp: bool = False) -> str:
+        """
+        URL of a static file, fingerprinted if the build has it.
+        
+        Parameters:
+        -----------
+        filename : str
+            Path relative to the static folder (e.g. 'css/style.css')
+        width : int, optional
+            For raster images, the display width in pixels; the smallest
+            resized variant at least this wide is used
+        webp : bool, default=False
+            Use the WebP variant (requires width)
+        
+        Returns:
+        --------
+        str
+            URL of the file
+        """
+        file = self._file(filename, width, 'webp' if webp else 'jpeg')
+        if file is None:
+            return url_for('static', filename=filename)
+        return url_for(self.endpoint, filename=file)
+    
+    def image_set(self, filename: str, width: int) -> str:
+        """
+        CSS image-set() offering the WebP variant with a JPEG fallback.
+        
+        Browsers without image-set type() support ignore the declaration, so it
+        should follow a plain url() declaration of the same image.
+        """
+        webp = self._file(filename, width, 'webp')
+        jpeg = self._file(filename, width, 'jpeg')
+        if webp is None or webp == jpeg:
+            return f"url('{self.url(filename, width)}')"
+        return (f"image-set(url('{url_for(self.endpoint, filename=webp)}') type('image/webp'), "
+                f"url('{url_for(self.endpoint, filename=jpeg)}') type('image/jpeg'))")
+    
+    def encoded_file(self, file: str, accept_encodings) -> Optional[tuple]:
+        """
+        Best precompressed variant of a built file accepted by the client.
+        
+        Parameters:
+        -----------
+        file : str
+            Name of a built file relative to the build output
+        accept_encodings : werkzeug.datastructures.MIMEAccept-like
+            The request's Accept-Encoding header (request.accept_encodings)
+        
+        Returns:
+        --------
+        tuple or None
+            (encoding, file name) or None to serve the file uncompressed
+        """
+        for encoding in ('br', 'gzip'):
+            variant = self.encodings.get(file, {}).get(encoding)
+            if variant and accept_encodings[encoding]:
+                return encoding, variant
+        return None
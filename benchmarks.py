@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite for the biological age scoring and rendering hot paths.
+
+Covered: KlemeraDoubal.fit/predict (also served by its prediction cache),
+predict_variants and its density plot, the NHANES III
+reference weights and PhenoAge (scalar and batch APIs),
+QuestionnaireAgeCalculator.calculate_biological_age, what-if evaluation,
+suggest_improvements and generate_recommendations, plot_results (full and fast
+rendering) and the Flask /calculate and /comparison routes.
+
+Every benchmark has a setup step (not timed) that prepares simulated data with
+bioage_example.generate_simulated_data and returns the callable to time. The
+size is the number of rows for the scoring benchmarks and the number of
+questionnaires, plots or requests for the others; benchmarks that loop in
+Python are capped at a maximum size and reported as skipped above it. Each
+callable is timed several times and once more under tracemalloc to record the
+peak memory it allocates. Results are printed and can be saved as JSON and
+compared against a previous run to catch regressions.
+
+Example:
+    python benchmarks.py --sizes 1 1000 100000 10000000 --output bench.json
+    python benchmarks.py --only kd_predict_float64 kd_predict_float32 --sizes 10000000
+    python benchmarks.py --output new.json --compare bench.json --threshold 0.2
+"""
+
+import argparse
+import copy
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence
+
+import matplotlib
+matplotlib.use('Agg')  # Use non-interactive backend
+import matplotlib.pyplot as plt
+import numpy as np
+
+from bioage_example import generate_simulated_data
+from batch_scoring import PHENOAGE_COLUMNS
+from kd_reference_weights import (
+    NHANES_III_MALE_WEIGHTS,
+    calculate_bioage_from_reference,
+    calculate_bioage_from_reference_batch,
+    calculate_phenoage,
+    calculate_phenoage_batch
+)
+from klemera_doubal import KlemeraDoubal
+from questionnaire_bioage import QuestionnaireAgeCalculator
+from synthetic_cohort import generate_chunk, questionnaire_responses
+
+NHANES_BIOMARKERS = list(NHANES_III_MALE_WEIGHTS)
+
+# Registered benchmarks: name -> (setup function, maximum number of rows)
+BENCHMARKS = {}
+
+
+def benchmark(name: str, max_rows: Optional[int] = None):
+    """
+    Register a benchmark.
+    
+    The decorated setup function receives the number of rows and returns the
+    callable to time, optionally together with a dict of extra information
+    to store with the result.
+    """
+    def register(setup: Callable):
+        BENCHMARKS[name] = (setup, max_rows)
+        return setup
+    return register
+
+
+@lru_cache(maxsize=1)
+def _cohort(n_rows: int):
+    return generate_simulated_data(n_samples=n_rows)
+
+
+@lru_cache(maxsize=2)
+def _columns(n_rows: int, dtype: str) -> Dict[str, np.ndarray]:
+    data = _cohort(n_rows)
+    names = ['age'] + NHANES_BIOMARKERS + list(PHENOAGE_COLUMNS.values())
+    columns = {name: data[name].to_numpy(dtype=dtype) for name in dict.fromkeys(names)}
+    columns['sex_label'] = data['sex_label'].to_numpy()
+    return columns
+
+
+@lru_cache(maxsize=1)
+def _fitted_kd() -> KlemeraDoubal:
+    kd = KlemeraDoubal(chronological_age_col='age')
+    kd.fit(generate_simulated_data(n_samples=10000), biomarkers=NHANES_BIOMARKERS)
+    return kd
+
+
+def _dtype_variants(name: str, scorer: Callable):
+    """Register float64 and float32 benchmarks of a batch scorer."""
+    for dtype in ('float64', 'float32'):
+        def setup(n_rows, dtype=dtype):
+            columns = _columns(n_rows, dtype)
+            run = lambda: scorer(columns, dtype)
+            if dtype == 'float64':
+                return run
+            # Accuracy of the float32 path against the float64 path
+            reference = scorer(_columns(n_rows, 'float64'), 'float64')
+            error = np.abs(run().astype(np.float64) - reference)
+            return run, {'max_abs_error': float(np.nanmax(error))}
+        benchmark(f"{name}_{dtype}")(setup)
+
+
+_dtype_variants('kd_predict', lambda columns, dtype: _fitted_kd().predict(
+    columns, include_chronological=True, dtype=dtype))
+
+_dtype_variants('nhanes_batch', lambda columns, dtype: calculate_bioage_from_reference_batch(
+    {name: columns[name] for name in NHANES_BIOMARKERS},
+    columns['sex_label'],
+    include_chronological_age=True,
+    chronological_age=columns['age'],
+    dtype=dtype))
+
+_dtype_variants('phenoage_batch', lambda columns, dtype: calculate_phenoage_batch(
+    dtype=dtype,
+    **{argument: columns[column] for argument, column in PHENOAGE_COLUMNS.items()}))
+
+
+@benchmark('kd_fit')
+def bench_kd_fit(n_rows):
+    data = _cohort(max(n_rows, 3))  # A regression needs at least three rows
+    return lambda: KlemeraDoubal(chronological_age_col='age').fit(data, NHANES_BIOMARKERS)
+
+
+@benchmark('kd_predict_dataframe')
+def bench_kd_predict_dataframe(n_rows):
+    data = _cohort(n_rows)
+    return lambda: _fitted_kd().predict(data, include_chronological=True)
+
+
+@benchmark('kd_predict_variants')
+def bench_kd_predict_variants(n_rows):
+    # BA_E, BA_EC and BA_CA from one pass, as in batch scoring
+    data = _cohort(n_rows)
+    kd = _fitted_kd()
+    return lambda: kd.predict_variants(data)
+
+
+@benchmark('kd_predict_cache_hit')
+def bench_kd_predict_cache_hit(n_rows):
+    # Repeat prediction of the same cohort served by the prediction cache
+    data = _cohort(n_rows)
+    # Its own model: the shared one must keep measuring real predictions
+    kd = copy.copy(_fitted_kd())
+    kd.enable_prediction_cache(fingerprint_rows=65536)
+    kd.predict(data, include_chronological=True)
+    return lambda: kd.predict(data, include_chronological=True)
+
+
+@benchmark('kd_plot_density')
+def bench_kd_plot_density(n_rows):
+    # Density mode; the prediction is reused after the first run
+    data = _cohort(max(n_rows, 3))
+    kd = _fitted_kd()
+    
+    def run():
+        fig, _ = kd.plot_biological_vs_chronological(data, plot_mode='density')
+        fig.savefig(io.BytesIO(), format='png')
+        plt.close(fig)
+    return run
+
+
+@benchmark('calculate_bioage_from_reference', max_rows=100000)
+def bench_calculate_bioage_from_reference(n_rows):
+    # One call per person, as in bioage_example.calculate_biological_ages
+    data = _cohort(n_rows)
+    biomarkers = data[NHANES_BIOMARKERS].to_dict('records')
+    people = list(zip(biomarkers, data['sex_label'], data['age']))
+    
+    def run():
+        for values, sex, age in people:
+            calculate_bioage_from_reference(values, sex=sex,
+                                            include_chronological_age=True,
+                                            chronological_age=age)
+    return run
+
+
+@benchmark('calculate_phenoage')
+def bench_calculate_phenoage(n_rows):
+    # The scalar API applied to whole columns
+    columns = _columns(n_rows, 'float64')
+    arguments = {argument: columns[column] for argument, column in PHENOAGE_COLUMNS.items()}
+    
+    def run():
+        with np.errstate(all='ignore'):
+            calculate_phenoage(**arguments)
+    return run
+
+
+@lru_cache(maxsize=1)
+def _calculator() -> QuestionnaireAgeCalculator:
+    return QuestionnaireAgeCalculator()
+
+
+@lru_cache(maxsize=1)
+def _questionnaires(n: int, seed: int = 42) -> List[Dict]:
+    """Random but valid questionnaire responses."""
+    return questionnaire_responses(generate_chunk(n, seed))
+
+
+@benchmark('questionnaire_calculate', max_rows=100000)
+def bench_questionnaire_calculate(n_rows):
+    calculator = _calculator()
+    responses = _questionnaires(n_rows)
+    
+    def run():
+        for response in responses:
+            calculator.calculate_biological_age(response)
+    return run
+
+
+@benchmark('what_if_evaluate', max_rows=100000)
+def bench_what_if_evaluate(n_rows):
+    # One changed answer per questionnaire, as for a what-if slider
+    calculator = _calculator()
+    profiles = [calculator.what_if(r) for r in _questionnaires(n_rows)]
+    
+    def run():
+        for profile in profiles:
+            profile.evaluate({'sleep': '<5'})
+    return run
+
+
+@benchmark('suggest_improvements', max_rows=100000)
+def bench_suggest_improvements(n_rows):
+    calculator = _calculator()
+    questionnaires = _questionnaires(n_rows)
+    
+    def run():
+        for responses in questionnaires:
+            calculator.suggest_improvements(responses)
+    return run
+
+
+@benchmark('generate_recommendations', max_rows=100000)
+def bench_generate_recommendations(n_rows):
+    calculator = _calculator()
+    results = [calculator.calculate_biological_age(r) for r in _questionnaires(n_rows)]
+    
+    def run():
+        for result in results:
+            calculator.generate_recommendations(result)
+    return run
+
+
+@benchmark('plot_results', max_rows=100)
+def bench_plot_results(n_rows):
+    # Figure creation plus PNG encoding, as done by /calculate
+    calculator = _calculator()
+    results = [calculator.calculate_biological_age(r) for r in _questionnaires(n_rows)]
+    
+    def run():
+        for result in results:
+            fig = calculator.plot_results(result)
+            fig.savefig(io.BytesIO(), format='png', bbox_inches='tight')
+            plt.close(fig)
+    return run
+
+
+@benchmark('plot_results_fast', max_rows=1000)
+def bench_plot_results_fast(n_rows):
+    # Figure template updated in place, fixed DPI, no tight bounding box
+    calculator = _calculator()
+    results = [calculator.calculate_biological_age(r) for r in _questionnaires(n_rows)]
+    calculator.plot_results_png(results[0], fast=True)  # Build the template outside the timing
+    
+    def run():
+        for result in results:
+            calculator.plot_results_png(result, fast=True)
+    return run
+
+
+@lru_cache(maxsize=1)
+def _flask_client():
+    import app as webapp
+    webapp.app.logger.disabled = True
+    webapp.RATE_LIMIT['requests'] = sys.maxsize
+    return webapp.app.test_client()
+
+
+def _in_scratch_directory(run: Callable) -> Callable:
+    """Run a callable inside a temporary directory so that files it writes
+    (such as the results/ history of /calculate) don't end up in the repo."""
+    directory = tempfile.mkdtemp(prefix='bioage_bench_')
+    
+    def wrapped():
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            return run()
+        finally:
+            os.chdir(cwd)
+    return wrapped
+
+
+def _quiet(run: Callable) -> Callable:
+    """Silence the debug prints of the Flask routes while timing."""
+    def wrapped():
+        stdout = sys.stdout
+        sys.stdout = io.StringIO()
+        try:
+            return run()
+        finally:
+            sys.stdout = stdout
+    return wrapped
+
+
+@benchmark('flask_calculate', max_rows=100)
+def bench_flask_calculate(n_rows):
+    client = _flask_client()
+    forms = [{key: str(value) for key, value in r.items()} for r in _questionnaires(n_rows)]
+    
+    def run():
+        for form in forms:
+            response = client.post('/calculate', data=form)
+            assert response.status_code == 200
+    return _in_scratch_directory(_quiet(run))
+
+
+@benchmark('flask_comparison', max_rows=100)
+def bench_flask_comparison(n_rows):
+    client = _flask_client()
+    
+    def run():
+        for _ in range(n_rows):
+            response = client.get('/comparison')
+            assert response.status_code == 200
+    return _quiet(run)
+
+
+def run_benchmark(name: str, n_rows: int, repeat: int = 3) -> Dict:
+    """
+    Run one benchmark for one data size.
+    
+    Returns:
+    --------
+    dict
+        Best and mean wall time, throughput, peak allocated bytes and any
+        extra information returned by the setup function
+    """
+    setup, max_rows = BENCHMARKS[name]
+    if max_rows is not None and n_rows > max_rows:
+        return {'name': name, 'n_rows': n_rows, 'skipped': f"more than {max_rows} rows"}
+    
+    prepared = setup(n_rows)
+    run, info = prepared if isinstance(prepared, tuple) else (prepared, {})
+    
+    run()  # Warm-up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    
+    tracemalloc.start()
+    run()
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    best = min(timings)
+    return {
+        'name': name,
+        'n_rows': n_rows,
+        'best_s': best,
+        'mean_s': sum(timings) / len(timings),
+        'rows_per_s': n_rows / best if best > 0 else None,
+        'peak_alloc_bytes': peak_bytes,
+        **info
+    }
+
+
+def run_benchmarks(names: Sequence[str], sizes: Sequence[int], repeat: int = 3) -> Dict:
+    """Run the given benchmarks for every size and collect the results."""
+    results = []
+    for n_rows in sizes:
+        for name in names:
+            result = run_benchmark(name, n_rows, repeat)
+            results.append(result)
+            if 'skipped' in result:
+                print(f"{name:<32} {n_rows:>10}  skipped ({result['skipped']})")
+                continue
+            line = (f"{name:<32} {n_rows:>10}  {result['best_s'] * 1000:10.2f} ms"
+                    f"  {result['peak_alloc_bytes'] / 2**20:9.1f} MB")
+            if 'max_abs_error' in result:
+                line += f"  max error {result['max_abs_error']:.2e}"
+            print(line)
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'repeat': repeat,
+        'results': results
+    }
+
+
+def compare_reports(baseline: Dict, current: Dict, threshold: float = 0.2) -> List[Dict]:
+    """
+    Compare two benchmark reports.
+    
+    Parameters:
+    -----------
+    baseline : dict
+        Report of a previous run (as written by --output)
+    current : dict
+        Report of the current run
+    threshold : float, default=0.2
+        Relative slowdown of the best time above which a benchmark counts as
+        a regression
+    
+    Returns:
+    --------
+    List[dict]
+        One entry per benchmark and size present in both reports, with the
+        ratio of current to baseline best time and a regression flag
+    """
+    previous = {(r['name'], r['n_rows']): r for r in baseline['results'] if 'best_s' in r}
+    comparisons = []
+    for result in current['results']:
+        key = (result['name'], result['n_rows'])
+        if 'best_s' not in result or key not in previous:
+            continue
+        ratio = result['best_s'] / previous[key]['best_s']
+        comparisons.append({
+            'name': result['name'],
+            'n_rows': result['n_rows'],
+            'baseline_s': previous[key]['best_s'],
+            'current_s': result['best_s'],
+            'ratio': ratio,
+            'regression': ratio > 1 + threshold
+        })
+    return comparisons
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the biological age scoring and rendering paths.")
+    parser.add_argument('--sizes', nargs='+', type=int, default=[1, 1000, 100000],
+                        help="Numbers of rows (or calls) to benchmark")
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), default=None,
+                        help="Benchmarks to run (default: all)")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per benchmark")
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    parser.add_argument('--compare', help="Compare against the results in this JSON file")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Relative slowdown reported as a regression (default: 0.2)")
+    args = parser.parse_args(argv)
+    
+    report = run_benchmarks(args.only or list(BENCHMARKS), args.sizes, args.repeat)
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        comparisons = compare_reports(baseline, report, args.threshold)
+        print(f"\nComparison with {args.compare}:")
+        for c in comparisons:
+            flag = "  REGRESSION" if c['regression'] else ""
+            print(f"{c['name']:<32} {c['n_rows']:>10}  {c['ratio']:6.2f}x{flag}")
+        if any(c['regression'] for c in comparisons):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -14,7 +14,13 @@ from kd_reference_weights import calculate_bioage_from_reference, calculate_phen
 
 # Simulate a small dataset of people with different ages and biomarker values
 def generate_simulated_data(n_samples=100, seed=42):
-    """Generate a simulated dataset of people with biomarkers."""
+    """
+    Generate a simulated dataset of people with biomarkers.
+    
+    The biomarkers are only weakly correlated with age: a KD model fitted on
+    them estimates a negative s_BA^2 (about -0.77 with the NHANES III
+    biomarkers on 10,000 rows), so its corrected estimate BA_EC is NaN.
+    """
     np.random.seed(seed)
     
     # Generate ages between 30 and 80
@@ -44,7 +50,7 @@ def generate_simulated_data(n_samples=100, seed=42):
     data = pd.DataFrame({
         'age': ages,
         'sex': sex,
-        'sex_label': ['male' if s == 0 else 'female' for s in sex],
+        'sex_label': np.where(sex == 0, 'male', 'female').astype(object),
         'c_reactive_protein': c_reactive_protein,
         'glycated_hemoglobin': glycated_hemoglobin,
         'serum_albumin': serum_albumin,
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Static asset build step: fingerprinting, precompression and responsive images.
+
+For every file under static/ this script writes to static/dist/:
+
+- a copy with a content hash in its name (css/style.3f2a9c1b0d.css), so that it
+  can be cached forever and is re-downloaded only when it changes
+- precompressed .gz and, when the brotli package is installed, .br variants
+  of text assets (CSS, JS, SVG, ...)
+- resized JPEG and WebP variants of raster images at several widths
+  (never wider than the original)
+
+and a manifest.json mapping the original names to the generated files, which
+assets.AssetManifest uses to emit the hashed URLs. Without a build the app
+falls back to serving the original files from /static.
+
+The build is incremental: unchanged files keep their names and are not
+processed again. Files that are no longer referenced are removed.
+
+Example:
+    python build_assets.py
+    python build_assets.py --widths 640 1280 1920 --quality 80
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Dict, Optional, Sequence
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# Extensions worth precompressing (images are already compressed)
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.xml')
+# Raster images that get resized variants
+RASTER_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+DEFAULT_WIDTHS = (640, 1280, 1920)
+DEFAULT_QUALITY = 80
+
+
+def file_hash(path: str, length: int = 10) -> str:
+    """Hash of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:length]
+
+
+def _write_compressed(path: str, data: bytes) -> Dict[str, str]:
+    """Write .gz (and .br if available) variants; return the encodings written."""
+    encodings = {}
+    gz_path = path + '.gz'
+    if not os.path.exists(gz_path):
+        # mtime=0 keeps the output identical between builds
+        with gzip.GzipFile(gz_path, 'wb', compresslevel=9, mtime=0) as f:
+            f.write(data)
+    encodings['gzip'] = os.path.basename(gz_path)
+    
+    try:
+        import brotli
+    except ImportError:
+        return encodings
+    br_path = path + '.br'
+    if not os.path.exists(br_path):
+        with open(br_path, 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+    encodings['br'] = os.path.basename(br_path)
+    return encodings
+
+
+def _write_image_variants(source: str, hashed_stem: str, out_dir: str,
+                          widths: Sequence[int], quality: int) -> Dict[str, Dict[str, str]]:
+    """Write resized JPEG and WebP variants; return {width: {format: file name}}."""
+    from PIL import Image, ImageOps
+    
+    variants = {}
+    image = None
+    for width in sorted(widths):
+        names = {
+            'jpeg': f"{hashed_stem}.{width}w.jpg",
+            'webp': f"{hashed_stem}.{width}w.webp"
+        }
+        variants[str(width)] = names
+        if all(os.path.exists(os.path.join(out_dir, n)) for n in names.values()):
+            continue
+        if image is None:
+            image = ImageOps.exif_transpose(Image.open(source))
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        if width >= image.width:
+            del variants[str(width)]
+            continue
+        height = round(image.height * width / image.width)
+        resized = image.resize((width, height), Image.LANCZOS)
+        resized.save(os.path.join(out_dir, names['webp']), 'WEBP', quality=quality, method=6)
+        resized.convert('RGB').save(os.path.join(out_dir, names['jpeg']), 'JPEG',
+                                    quality=quality, optimize=True, progressive=True)
+    return variants
+
+
+def build_assets(static_dir: str = 'static',
+                 widths: Sequence[int] = DEFAULT_WIDTHS,
+                 quality: int = DEFAULT_QUALITY,
+                 verbose: bool = True) -> Dict:
+    """
+    Build fingerprinted, precompressed and resized assets.
+    
+    Parameters:
+    -----------
+    static_dir : str
+        Static folder of the app; the output goes to <static_dir>/dist
+    widths : Sequence[int]
+        Widths (pixels) of the resized image variants
+    quality : int
+        JPEG/WebP quality of the resized variants
+    verbose : bool
+        Print a line per asset
+    
+    Returns:
+    --------
+    dict
+        The manifest, also written to <static_dir>/dist/manifest.json
+    """
+    dist_dir = os.path.join(static_dir, DIST_DIR)
+    os.makedirs(dist_dir, exist_ok=True)
+    manifest = {}
+    
+    for root, dirs, files in os.walk(static_dir):
+        if os.path.abspath(root) == os.path.abspath(static_dir):
+            dirs[:] = [d for d in dirs if d != DIST_DIR]
+        dirs.sort()
+        for name in sorted(files):
+            if name.startswith('.'):
+                continue
+            source = os.path.join(root, name)
+            relative = os.path.relpath(source, static_dir).replace(os.sep, '/')
+            subdir, _ = os.path.split(relative)
+            stem, extension = os.path.splitext(name)
+            hashed_stem = f"{stem}.{file_hash(source)}"
+            out_dir = os.path.join(dist_dir, subdir)
+            os.makedirs(out_dir, exist_ok=True)
+            
+            hashed_name = hashed_stem + extension
+            hashed_path = os.path.join(out_dir, hashed_name)
+            if not os.path.exists(hashed_path):
+                shutil.copyfile(source, hashed_path)
+            
+            prefix = f"{subdir}/" if subdir else ''
+            entry = {'file': prefix + hashed_name, 'size': os.path.getsize(source)}
+            if extension.lower() in COMPRESSIBLE_EXTENSIONS:
+                with open(source, 'rb') as f:
+                    entry['encodings'] = {
+                        encoding: prefix + file_name
+                        for encoding, file_name in _write_compressed(hashed_path, f.read()).items()
+                    }
+            if extension.lower() in RASTER_EXTENSIONS:
+                variants = _write_image_variants(source, hashed_stem, out_dir, widths, quality)
+                entry['variants'] = {
+                    width: {fmt: prefix + file_name for fmt, file_name in names.items()}
+                    for width, names in variants.items()
+                }
+            manifest[relative] = entry
+            if verbose:
+                extras = sorted(entry.get('encodings', {})) + [f"{w}w" for w in entry.get('variants', {})]
+                print(f"{relative} -> {entry['file']}" + (f" ({', '.join(extras)})" if extras else ''))
+    
+    _prune(dist_dir, manifest)
+    with open(os.path.join(dist_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def _referenced_files(manifest: Dict) -> set:
+    files = set()
+    for entry in manifest.values():
+        files.add(entry['file'])
+        files.update(entry.get('encodings', {}).values())
+        for names in entry.get('variants', {}).values():
+            files.update(names.values())
+    return files
+
+
+def _prune(dist_dir: str, manifest: Dict) -> None:
+    """Remove outputs of previous builds that the manifest no longer references."""
+    keep = _referenced_files(manifest)
+    for root, _, files in os.walk(dist_dir):
+        for name in files:
+            relative = os.path.relpath(os.path.join(root, name), dist_dir).replace(os.sep, '/')
+            if relative != MANIFEST_NAME and relative not in keep:
+                os.remove(os.path.join(root, name))
+
+
+def _total_size(dist_dir: str, files) -> int:
+    return sum(os.path.getsize(os.path.join(dist_dir, f)) for f in files)
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description="Build fingerprinted, compressed and resized static assets.")
+    parser.add_argument('--static-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'),
+                        help="Static folder of the app")
+    parser.add_argument('--widths', nargs='+', type=int, default=list(DEFAULT_WIDTHS),
+                        help="Widths of the resized image variants")
+    parser.add_argument('--quality', type=int, default=DEFAULT_QUALITY, help="JPEG/WebP quality")
+    parser.add_argument('--quiet', action='store_true', help="Only print the summary")
+    args = parser.parse_args(argv)
+    
+    start_time = time.perf_counter()
+    manifest = build_assets(args.static_dir, args.widths, args.quality, verbose=not args.quiet)
+    dist_dir = os.path.join(args.static_dir, DIST_DIR)
+    
+    original = sum(entry['size'] for entry in manifest.values())
+    print(f"\nBuilt {len(manifest)} assets in {time.perf_counter() - start_time:.1f} s "
+          f"({_total_size(dist_dir, _referenced_files(manifest)) / 2**20:.1f} MB in {dist_dir}, "
+          f"originals {original / 2**20:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Column access helpers for scoring cohorts stored in columnar formats.
+
+The scoring functions only ever need a handful of biomarker columns, so instead
+of requiring a pandas DataFrame they accept any "column container":
+
+- pandas DataFrames
+- dictionaries (or other mappings) of 1-D NumPy arrays, including np.memmap
+- NumPy structured arrays, including memory-mapped .npy files
+- pyarrow Tables, for example Feather/Arrow IPC files opened with memory_map
+
+open_columns() opens a directory of per-column .npy files, a structured .npy
+file or a Feather/Arrow file as memory-mapped columns, reading only the
+requested columns. Nothing is loaded into RAM until the values are touched, so
+a cohort much larger than memory can be scored chunk by chunk.
+"""
+
+import hashlib
+import os
+import zlib
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# File extensions of Feather / Arrow IPC files
+ARROW_EXTENSIONS = ('.feather', '.arrow', '.ipc')
+
+# Blocks of rows checksummed by sampled fingerprints (data_fingerprint sample_rows)
+SAMPLE_BLOCKS = 64
+
+
+def column_names(data) -> List[str]:
+    """Return the column names of a column container."""
+    if isinstance(data, pd.DataFrame):
+        return list(data.columns)
+    if isinstance(data, np.ndarray) and data.dtype.names is not None:
+        return list(data.dtype.names)
+    if hasattr(data, 'column_names'):  # pyarrow.Table
+        return list(data.column_names)
+    return list(data.keys())
+
+
+def n_rows(data) -> int:
+    """Return the number of rows of a column container."""
+    if isinstance(data, (pd.DataFrame, np.ndarray)):
+        return len(data)
+    if hasattr(data, 'num_rows'):  # pyarrow.Table
+        return data.num_rows
+    names = column_names(data)
+    return len(data[names[0]]) if names else 0
+
+
+def get_column(data, name: str, dtype=None) -> np.ndarray:
+    """
+    Return one column as a 1-D NumPy array, avoiding copies where possible.
+    
+    Memory-mapped arrays, structured-array fields and single-chunk Arrow
+    columns without nulls are returned as views of the underlying buffers.
+    A copy is only made when a dtype conversion is requested.
+    
+    Parameters:
+    -----------
+    data : column container
+        DataFrame, mapping of arrays, structured array or pyarrow Table
+    name : str
+        Column name
+    dtype : numpy dtype, optional
+        Convert the column to this dtype (no copy if it already matches)
+    
+    Returns:
+    --------
+    np.ndarray
+        Column values
+    """
+    if isinstance(data, pd.DataFrame):
+        values = data[name].to_numpy()
+    elif hasattr(data, 'column_names'):  # pyarrow.Table
+        column = data.column(name)
+        if column.num_chunks == 1:
+            values = column.chunk(0).to_numpy(zero_copy_only=False)
+        else:
+            values = column.to_numpy()
+    else:
+        values = data[name]
+    return np.asarray(values, dtype=dtype)
+
+
+def data_fingerprint(data, columns: Optional[Sequence[str]] = None,
+                     chunk_rows: int = 1_000_000, sample_rows: Optional[int] = None) -> str:
+    """
+    Fingerprint of the contents of some columns, e.g. to key cached predictions.
+    
+    Every value is checksummed (CRC-32 per column, at memory speed), so any
+    change to the data changes the fingerprint; columns are read in chunks of
+    chunk_rows rows, so memory use doesn't grow with the cohort.
+    
+    With sample_rows, only that many rows, in SAMPLE_BLOCKS blocks spread
+    from the first to the last row, are checksummed, in constant time whatever the cohort size. Changes to
+    other rows go unnoticed, so this is only suitable for data that isn't
+    modified in place (e.g. files read or memory-mapped once).
+    
+    Parameters:
+    -----------
+    data : column container
+        DataFrame, mapping of arrays, structured array or pyarrow Table
+    columns : Sequence[str], optional
+        Columns to fingerprint. Defaults to all columns.
+    chunk_rows : int
+        Rows checksummed at a time for non-contiguous columns
+    sample_rows : int, optional
+        Rows checksummed per column; None checksums every row
+    
+    Returns:
+    --------
+    str
+        Hex digest of the row count, column names, dtypes and checksums
+    """
+    columns = list(columns) if columns is not None else column_names(data)
+    rows = n_rows(data)
+    digest = hashlib.sha256(str(rows).encode())
+    if sample_rows and rows > sample_rows:
+        digest.update(f"\0sampled {sample_rows}".encode())
+        # Contiguous blocks spread over the rows (the last block ends at the
+        # last row); gathering single rows would touch every cache line anyway
+        block = max(1, sample_rows // SAMPLE_BLOCKS)
+        starts = np.linspace(0, rows - block, min(SAMPLE_BLOCKS, sample_rows)).astype(np.int64)
+        ranges = [(int(start), int(start) + block) for start in starts]
+    else:
+        ranges = [(start, start + chunk_rows) for start in range(0, rows, chunk_rows)]
+    for name in columns:
+        values = get_column(data, name)
+        checksum = 0
+        if values.dtype.hasobject:
+            # Object columns (e.g. labels) have no stable buffer to checksum
+            for start, stop in ranges:
+                checksum = zlib.crc32(pd.util.hash_array(values[start:stop]).tobytes(), checksum)
+        else:
+            for start, stop in ranges:
+                checksum = zlib.crc32(np.ascontiguousarray(values[start:stop]), checksum)
+        digest.update(f"{name}\0{values.dtype.str}\0{checksum}\0".encode())
+    return digest.hexdigest()[:32]
+
+
+def select_rows(data, start: int, stop: int):
+    """Return rows [start, stop) of a column container without copying."""
+    if isinstance(data, (pd.DataFrame, pd.Series)):
+        return data.iloc[start:stop]
+    if isinstance(data, np.ndarray):
+        return data[start:stop]
+    if hasattr(data, 'column_names'):  # pyarrow.Table
+        return data.slice(start, stop - start)
+    return {name: values[start:stop] for name, values in data.items()}
+
+
+def open_columns(path: str, columns: Optional[Sequence[str]] = None):
+    """
+    Open a columnar cohort file with memory mapping.
+    
+    Parameters:
+    -----------
+    path : str
+        One of:
+        - a directory containing one <column>.npy file per column
+        - a .npy file holding a structured array
+        - a Feather/Arrow IPC file (.feather, .arrow or .ipc)
+    columns : Sequence[str], optional
+        Columns to open. Defaults to all columns.
+    
+    Returns:
+    --------
+    column container
+        Dictionary of memory-mapped arrays, memory-mapped structured array or
+        memory-mapped pyarrow Table
+    """
+    if os.path.isdir(path):
+        if columns is None:
+            columns = sorted(f[:-4] for f in os.listdir(path) if f.endswith('.npy'))
+        return {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+            for name in columns
+        }
+    
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.npy':
+        array = np.load(path, mmap_mode='r')
+        if array.dtype.names is None:
+            raise ValueError(f"'{path}' does not contain a structured array")
+        return array
+    if extension in ARROW_EXTENSIONS:
+        import pyarrow.feather as feather
+        return feather.read_table(path, columns=list(columns) if columns else None,
+                                  memory_map=True)
+    raise ValueError(f"Unsupported columnar format: '{path}'")
+
+
+def write_npy_columns(data: pd.DataFrame, directory: str) -> Dict[str, str]:
+    """
+    Write a DataFrame as a directory of per-column .npy files.
+    
+    String columns are stored as fixed-width unicode so that every column can
+    be memory-mapped by open_columns.
+    
+    Parameters:
+    -----------
+    data : pd.DataFrame
+        Data to write
+    directory : str
+        Output directory (created if needed)
+    
+    Returns:
+    --------
+    Dict[str, str]
+        Mapping of column names to the written file paths
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for name in data.columns:
+        values = data[name].to_numpy()
+        if values.dtype == object:
+            values = values.astype(str)
+        paths[name] = os.path.join(directory, f"{name}.npy")
+        np.save(paths[name], values)
+    return paths
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Negotiated gzip/brotli compression of dynamic responses.
+
+compress_response() compresses HTML and JSON responses with the best encoding
+the client accepts (brotli when the brotli package is installed, else gzip).
+Buffered responses are compressed in one go; streamed responses are compressed
+incrementally and flushed after every chunk, so streaming still delivers the
+first bytes early. Strong ETags get the encoding appended ("abc" becomes
+"abc-gzip"), because the compressed body is a different representation.
+"""
+
+import zlib
+from typing import Iterable, Iterator, Optional
+
+try:
+    import brotli
+except ImportError:  # Optional dependency; gzip is used without it
+    brotli = None
+
+# Mimetypes worth compressing; static files are precompressed by build_assets.py
+COMPRESSIBLE_MIMETYPES = frozenset({'text/html', 'application/json'})
+
+# Smaller bodies aren't worth the CPU time and headers
+MIN_SIZE = 500
+
+# Fast settings suited to compressing on every request
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encodings) -> Optional[str]:
+    """Best supported encoding accepted by the client (request.accept_encodings)."""
+    for encoding in ENCODINGS:
+        if accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compress a complete body."""
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_stream(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    """Compress a streamed body, flushing after every chunk."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+def should_compress(response) -> bool:
+    """Whether a response is a compressible, not yet encoded body."""
+    return (response.status_code >= 200
+            and response.status_code not in (204, 304)
+            and response.mimetype in COMPRESSIBLE_MIMETYPES
+            and 'Content-Encoding' not in response.headers
+            and not response.direct_passthrough
+            and (response.is_streamed or (response.content_length or 0) >= MIN_SIZE))
+
+
+def compress_response(response, accept_encodings, compressed_body: Optional[bytes] = None,
+                      encoding: Optional[str] = None):
+    """
+    Compress a Flask/Werkzeug response in place if it's worth it.
+    
+    Parameters:
+    -----------
+    response : flask.Response
+        Response to compress
+    accept_encodings : werkzeug.datastructures.Accept
+        The request's Accept-Encoding header (request.accept_encodings)
+    compressed_body : bytes, optional
+        Already compressed body (e.g. memoized for a cached page) to use
+        instead of compressing the response body
+    encoding : str, optional
+        Encoding of compressed_body
+    
+    Returns:
+    --------
+    flask.Response
+        The same response object
+    """
+    if not should_compress(response):
+        return response
+    response.vary.add('Accept-Encoding')
+    if compressed_body is None:
+        encoding = choose_encoding(accept_encodings)
+        if encoding is None:
+            return response
+    
+    if response.is_streamed:
+        response.response = compress_stream(response.iter_encoded(), encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        if compressed_body is None:
+            compressed_body = compress(response.get_data(), encoding)
+        response.set_data(compressed_body)
+    response.headers['Content-Encoding'] = encoding
+    
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f"{etag}-{encoding}")
+    return response
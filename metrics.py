@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lightweight in-process metrics with Prometheus text exposition.
+
+Provides counters, histograms and callback gauges that are cheap enough to
+wrap every stage of a request (a span costs two perf_counter calls, a bisect
+and a lock), and a render() function producing the Prometheus text format for
+a /metrics endpoint.
+
+Metrics are kept per process: with several gunicorn workers every scrape
+reports the worker that served it, identified by the 'pid' label of
+bioage_process_resident_memory_bytes.
+
+Example:
+    from metrics import stage_timer, render
+    
+    with stage_timer('plot_results'):
+        fig = calculator.plot_results(results)
+    
+    print(render())
+"""
+
+import bisect
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values)
+    )
+    return '{' + pairs + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonically increasing counter with optional labels."""
+    
+    type_name = 'counter'
+    
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels.get(name, '') for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels.get(name, '') for name in self.label_names), 0)
+    
+    def samples(self) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name, _format_labels(self.label_names, key), value) for key, value in items]
+
+
+class Histogram:
+    """Histogram of observations (e.g. durations in seconds) with optional labels."""
+    
+    type_name = 'histogram'
+    
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.get(name, '') for name in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+    
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(labels.get(name, '') for name in self.label_names))
+        return series[2] if series else 0
+    
+    def samples(self) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._series.items())
+        samples = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.label_names + ('le',), key + (_format_value(bound),))
+                samples.append((self.name + '_bucket', labels, cumulative))
+            labels = _format_labels(self.label_names, key)
+            samples.append((self.name + '_sum', labels, total))
+            samples.append((self.name + '_count', labels, count))
+        return samples
+
+
+class Gauge:
+    """Gauge whose samples are computed by a callback at scrape time."""
+    
+    type_name = 'gauge'
+    
+    def __init__(self, name: str, documentation: str,
+                 callback: Callable[[], Dict[Tuple[Tuple[str, str], ...], float]]):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+    
+    def samples(self) -> List[Tuple[str, str, float]]:
+        return [
+            (self.name, _format_labels([n for n, _ in labels], [v for _, v in labels]), value)
+            for labels, value in self.callback().items()
+        ]
+
+
+class Registry:
+    """Collection of metrics rendered together."""
+    
+    def __init__(self):
+        self._metrics = []
+    
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+    
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format (0.0.4)."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def resident_memory_bytes() -> int:
+    """Current resident set size of this process (peak RSS where /proc is unavailable)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'bioage_request_seconds', "Request latency by endpoint.", labels=('endpoint',)))
+REQUESTS_TOTAL = REGISTRY.register(Counter(
+    'bioage_requests_total', "Requests by endpoint and status code.", labels=('endpoint', 'status')))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'bioage_stage_seconds', "Time spent in each stage of request handling.", labels=('stage',)))
+RATE_LIMITED_TOTAL = REGISTRY.register(Counter(
+    'bioage_rate_limited_total', "Requests rejected by the rate limiter."))
+CACHE_REQUESTS_TOTAL = REGISTRY.register(Counter(
+    'bioage_cache_requests_total', "Cache lookups by cache and result (hit or miss).",
+    labels=('cache', 'result')))
+RENDER_JOBS_TOTAL = REGISTRY.register(Counter(
+    'bioage_render_jobs_total', "Background plot rendering jobs by outcome "
+    "(submitted, rendered, failed, or caller_runs when the pool was saturated).",
+    labels=('result',)))
+REGISTRY.register(Gauge(
+    'bioage_process_resident_memory_bytes', "Resident memory of the worker process.",
+    lambda: {(('pid', str(os.getpid())),): resident_memory_bytes()}))
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Time the enclosed block as one stage of request handling."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """Count one lookup in the named cache."""
+    CACHE_REQUESTS_TOTAL.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def render() -> str:
+    """Render the default registry in the Prometheus text format."""
+    return REGISTRY.render()
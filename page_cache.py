@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-process cache of rendered pages with strong ETags.
+
+Pages whose output only changes between deploys (the questionnaire and the
+static informational pages) are rendered once per process and key, and served
+from memory afterwards. Every cached page carries a strong ETag computed from
+its body, so clients revalidating with If-None-Match get a 304 response
+without the page being rendered again. Compressed variants of each page are
+memoized too, so cached pages are never compressed twice.
+"""
+
+import hashlib
+import json
+import threading
+from typing import Callable, Dict, Hashable
+
+from compression import compress
+from metrics import record_cache
+
+
+class RenderedPage:
+    """Rendered page body, its strong ETag and its compressed variants."""
+    
+    __slots__ = ('body', 'etag', '_encoded')
+    
+    def __init__(self, body: bytes, etag: str):
+        self.body = body
+        self.etag = etag
+        self._encoded = {}
+    
+    def encoded(self, encoding: str) -> bytes:
+        """Body compressed with an encoding, compressed once and memoized."""
+        data = self._encoded.get(encoding)
+        if data is None:
+            data = self._encoded[encoding] = compress(self.body, encoding)
+        return data
+
+
+def content_hash(*parts, length: int = 16) -> str:
+    """Short stable hash of JSON-serializable data (e.g. the question table)."""
+    data = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()[:length]
+
+
+class PageCache:
+    """
+    Rendered pages keyed on everything that affects their output.
+    
+    Parameters:
+    -----------
+    name : str
+        Cache name reported in the hit/miss metrics
+    """
+    
+    def __init__(self, name: str = 'pages'):
+        self.name = name
+        self._pages: Dict[Hashable, RenderedPage] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable, render: Callable[[], str]) -> RenderedPage:
+        """
+        Return the cached page for a key, rendering it on the first request.
+        
+        Parameters:
+        -----------
+        key : hashable
+            Everything the rendered output depends on
+        render : callable
+            Returns the page HTML; only called on a cache miss
+        
+        Returns:
+        --------
+        RenderedPage
+            Encoded body and its strong ETag
+        """
+        page = self._pages.get(key)
+        record_cache(self.name, page is not None)
+        if page is None:
+            body = render().encode('utf-8')
+            page = RenderedPage(body, hashlib.sha256(body).hexdigest()[:32])
+            with self._lock:
+                page = self._pages.setdefault(key, page)
+        return page
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._pages.clear()
+    
+    def __len__(self) -> int:
+        return len(self._pages)
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Population percentiles of questionnaire results by age band and sex.
+
+PercentileIndex keeps the aging paces of a population in sorted arrays, one per
+age band and sex (plus one per age band for both sexes), so that "your aging
+pace is better than X% of people your age and sex" is answered with two
+binary searches. New results are inserted in place as they arrive, keeping the
+arrays sorted without recomputing anything.
+
+The population is built from the stored results (results/result_*.json) and
+an optional reference file of real results (CSV with age, sex and aging_pace
+columns). Each web worker process keeps its own index and adds the results it
+calculates. No percentile is reported for a group until it holds min_samples
+real results.
+
+A synthetic cohort (synthetic_cohort.py, answers drawn at random) can be
+added for load testing with PERCENTILE_REFERENCE_ROWS. It is not a reference
+population: its rows never count towards min_samples.
+
+Configuration (environment variables read by from_environment):
+    PERCENTILE_REFERENCE_FILE  CSV of real reference results (default: none)
+    PERCENTILE_REFERENCE_ROWS  Rows of a synthetic cohort, for load testing only (default: 0)
+    PERCENTILE_MIN_SAMPLES     Smallest group a percentile is reported for (default: 30)
+"""
+
+import csv
+import glob
+import json
+import logging
+import os
+import threading
+from bisect import bisect_left, bisect_right, insort
+from typing import Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Lower edges of the age bands (18-29, 30-39, ..., 80 and older)
+AGE_BANDS = (18, 30, 40, 50, 60, 70, 80)
+
+# Smallest group a percentile is reported for
+MIN_SAMPLES = 30
+
+# Values of the sex question; other values are treated as unknown
+SEXES = ('male', 'female')
+
+
+def age_band(age: float) -> int:
+    """Index of the age band of an age (ages under 18 fall in the first band)."""
+    return max(0, bisect_right(AGE_BANDS, age) - 1)
+
+
+def band_label(band: int) -> str:
+    """Readable age range of a band, e.g. '40-49' or '80+'."""
+    if band + 1 < len(AGE_BANDS):
+        return f"{AGE_BANDS[band]}-{AGE_BANDS[band + 1] - 1}"
+    return f"{AGE_BANDS[band]}+"
+
+
+class PercentileIndex:
+    """
+    Sorted aging paces per age band and sex, with incremental inserts.
+    
+    Parameters:
+    -----------
+    min_samples : int
+        Smallest group a percentile is reported for; smaller sex-specific
+        groups fall back to both sexes of the age band
+    """
+    
+    def __init__(self, min_samples: int = MIN_SAMPLES):
+        self.min_samples = min_samples
+        self._paces = {}  # (band, sex or None for both sexes) -> sorted list
+        self._real = {}  # (band, sex or None) -> number of real (not synthetic) results
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def from_environment(cls, results_dir: str = 'results') -> 'PercentileIndex':
+        """Index of the stored results and the references configured by PERCENTILE_*."""
+        index = cls(min_samples=int(os.environ.get('PERCENTILE_MIN_SAMPLES', MIN_SAMPLES)))
+        reference_file = os.environ.get('PERCENTILE_REFERENCE_FILE')
+        if reference_file:
+            index.add_reference_file(reference_file)
+        index.add_reference_cohort(int(os.environ.get('PERCENTILE_REFERENCE_ROWS', 0)))
+        index.add_results_dir(results_dir)
+        return index
+    
+    def _groups(self, age: float, sex: Optional[str]) -> Tuple[Tuple, ...]:
+        band = age_band(age)
+        return ((band, sex), (band, None)) if sex in SEXES else ((band, None),)
+    
+    def add(self, age: float, sex: Optional[str], aging_pace: float) -> None:
+        """Insert one result, keeping the arrays sorted (sex may be unknown)."""
+        with self._lock:
+            for group in self._groups(age, sex):
+                insort(self._paces.setdefault(group, []), aging_pace)
+                self._real[group] = self._real.get(group, 0) + 1
+    
+    def update(self, rows: Iterable[Tuple[float, Optional[str], float]], real: bool = True) -> int:
+        """
+        Insert many (age, sex, aging pace) rows, sorting each group once.
+        
+        Parameters:
+        -----------
+        rows : iterable of (age, sex, aging pace)
+            Results to insert
+        real : bool, default=True
+            False for synthetic rows, which don't count towards min_samples
+        
+        Returns:
+        --------
+        int
+            Number of rows inserted
+        """
+        added = {}
+        count = 0
+        for age, sex, aging_pace in rows:
+            for group in self._groups(age, sex):
+                added.setdefault(group, []).append(aging_pace)
+            count += 1
+        with self._lock:
+            for group, paces in added.items():
+                merged = self._paces.get(group, []) + paces
+                merged.sort()  # Timsort merges the two sorted runs in linear time
+                self._paces[group] = merged
+                if real:
+                    self._real[group] = self._real.get(group, 0) + len(paces)
+        return count
+    
+    def add_results_dir(self, directory: str) -> int:
+        """Insert the results stored by /calculate; returns the number inserted."""
+        def rows():
+            for path in glob.glob(os.path.join(directory, 'result_*.json')):
+                try:
+                    with open(path) as f:
+                        data = json.load(f)
+                    results = data['results']
+                    yield results['chronological_age'], data.get('sex'), results['aging_pace']
+                except (OSError, ValueError, KeyError, TypeError):
+                    logger.warning(f"Skipping unreadable result file {path}")
+        return self.update(rows())
+    
+    def add_reference_file(self, path: str) -> int:
+        """
+        Insert real reference results from a CSV file; returns the number inserted.
+        
+        The file has 'age', 'sex' ('male', 'female' or empty) and
+        'aging_pace' columns, one row per person.
+        """
+        def rows():
+            with open(path, newline='') as f:
+                for row in csv.DictReader(f):
+                    try:
+                        yield float(row['age']), row.get('sex') or None, float(row['aging_pace'])
+                    except (KeyError, TypeError, ValueError):
+                        logger.warning(f"Skipping invalid row {row} of {path}")
+        return self.update(rows())
+    
+    def add_reference_cohort(self, n_rows: int, seed: int = 42) -> int:
+        """
+        Insert the results of a synthetic cohort; returns the number inserted.
+        
+        The answers are drawn at random, so this is for load testing only:
+        the rows don't count towards min_samples.
+        """
+        if n_rows <= 0:
+            return 0
+        from questionnaire_bioage import QuestionnaireAgeCalculator
+        from synthetic_cohort import generate_chunk, questionnaire_responses
+        
+        calculator = QuestionnaireAgeCalculator(plot_pool_size=1)
+        responses = questionnaire_responses(generate_chunk(n_rows, seed, age_range=(AGE_BANDS[0], 90)))
+        return self.update(
+            ((r['age'], r['sex'], calculator.calculate_biological_age(r)['aging_pace'])
+             for r in responses),
+            real=False
+        )
+    
+    def count(self, age: float, sex: Optional[str] = None) -> int:
+        """Number of results of an age band and sex (both sexes if sex is None)."""
+        return len(self._paces.get((age_band(age), sex), ()))
+    
+    def better_than(self, age: float, sex: Optional[str], aging_pace: float) -> Optional[dict]:
+        """
+        Share of people of the same age band and sex with a higher (worse) aging pace.
+        
+        Parameters:
+        -----------
+        age : float
+            Chronological age
+        sex : str, optional
+            'male' or 'female'; other values compare with both sexes
+        aging_pace : float
+            Aging pace of the result
+        
+        Returns:
+        --------
+        dict or None
+            'percent' (0-100, rounded), 'age_band' label, 'sex' of the group
+            compared with (None for both sexes) and its 'size', or None if the
+            groups hold fewer than min_samples real results
+        """
+        for group in self._groups(age, sex):
+            with self._lock:
+                if self._real.get(group, 0) < self.min_samples:
+                    continue
+                paces = self._paces.get(group, ())
+                size = len(paces)
+                # Ties count as half better, half worse
+                below = bisect_left(paces, aging_pace)
+                above = size - bisect_right(paces, aging_pace)
+            ties = size - below - above
+            return {
+                "percent": round(100 * (above + ties / 2) / size),
+                "age_band": band_label(group[0]),
+                "sex": group[1],
+                "size": size
+            }
+        return None
+    
+    def __len__(self) -> int:
+        return sum(len(paces) for (_, sex), paces in self._paces.items() if sex is None)
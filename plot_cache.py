@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bounded cache of rendered plot images, addressed by a hash of their inputs.
+
+Plots are drawn deterministically from their inputs (the calculator results,
+the plotting code version), so the hash of the inputs identifies the image.
+Identical plots are rendered once and shared by every user who gets the same
+results, and the image URL never changes meaning, so it can be cached by
+browsers forever.
+
+Images are kept in an in-memory LRU bounded by total size and, optionally, in
+a directory shared by all worker processes on the host, so that the request
+for the image can be served by a different worker than the one that drew it.
+
+Configuration (environment variables read by from_environment):
+    PLOT_CACHE_MB     Memory budget of the LRU in megabytes (default: 64)
+    PLOT_CACHE_DIR    Shared directory (default: <tmp>/bioage_plots; empty disables)
+    PLOT_CACHE_FILES  Maximum number of images kept on disk (default: 20000)
+"""
+
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from metrics import record_cache
+from page_cache import content_hash
+
+# Keys are hex digests
+KEY_PATTERN = re.compile(r'^[0-9a-f]{16,64}$')
+
+
+class PlotCache:
+    """
+    Two-level (memory and disk) cache of PNG images.
+    
+    Parameters:
+    -----------
+    max_bytes : int
+        Memory budget of the LRU
+    directory : str, optional
+        Shared directory for the images, or None to keep them in memory only
+    max_files : int
+        Maximum number of images kept in the directory
+    """
+    
+    def __init__(self, max_bytes: int = 64 * 2**20, directory: Optional[str] = None,
+                 max_files: int = 20000):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_files = max_files
+        self._images = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._writes = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    
+    @classmethod
+    def from_environment(cls) -> 'PlotCache':
+        """Create a cache configured by the PLOT_CACHE_* environment variables."""
+        directory = os.environ.get('PLOT_CACHE_DIR',
+                                   os.path.join(tempfile.gettempdir(), 'bioage_plots'))
+        return cls(max_bytes=int(float(os.environ.get('PLOT_CACHE_MB', 64)) * 2**20),
+                   directory=directory or None,
+                   max_files=int(os.environ.get('PLOT_CACHE_FILES', 20000)))
+    
+    @staticmethod
+    def key(*inputs) -> str:
+        """Key of a plot drawn from JSON-serializable inputs."""
+        return content_hash(*inputs, length=32)
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.png")
+    
+    def _remember(self, key: str, image: bytes) -> None:
+        with self._lock:
+            if key in self._images:
+                self._images.move_to_end(key)
+                return
+            self._images[key] = image
+            self._size += len(image)
+            while self._size > self.max_bytes and len(self._images) > 1:
+                _, evicted = self._images.popitem(last=False)
+                self._size -= len(evicted)
+    
+    def get(self, key: str) -> Optional[bytes]:
+        """Image for a key, from memory or the shared directory, or None."""
+        if not KEY_PATTERN.match(key):
+            return None
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                return image
+        if self.directory:
+            try:
+                with open(self._path(key), 'rb') as f:
+                    image = f.read()
+            except OSError:
+                return None
+            self._remember(key, image)
+        return image
+    
+    def put(self, key: str, image: bytes) -> None:
+        """Store an image in memory and in the shared directory."""
+        self._remember(key, image)
+        if not self.directory:
+            return
+        # Write to a temporary file and rename, so readers never see partial images
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(image)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._prune()
+    
+    def _prune(self) -> None:
+        """Remove the oldest images when the directory holds too many."""
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.name.endswith('.png')]
+        except OSError:
+            return
+        if len(entries) <= self.max_files:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_files]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass  # Removed by another worker
+    
+    def get_or_render(self, key: str, render: Callable[[], bytes]) -> bytes:
+        """
+        Return the cached image for a key, rendering and storing it on a miss.
+        
+        Parameters:
+        -----------
+        key : str
+            Key from PlotCache.key()
+        render : callable
+            Draws the plot and returns the PNG bytes; only called on a miss
+        
+        Returns:
+        --------
+        bytes
+            PNG image
+        """
+        image = self.get(key)
+        record_cache('plots', image is not None)
+        if image is None:
+            image = render()
+            self.put(key, image)
+        return image
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache of biological age predictions, keyed on the model and the data.
+
+Repeated analyses of the same cohort (plots, notebook re-runs) predict the
+same ages over and over. PredictionCache keeps predictions in a bounded
+in-memory LRU and, optionally, in a directory of .npy files, so that they
+survive the process and are memory-mapped back instead of being recomputed.
+The directory is bounded too: after each write, the least recently used files
+(oldest modification time; reads refresh it) are removed beyond max_disk_bytes.
+
+Keys combine a fingerprint of the data (columnar.data_fingerprint of the
+columns the prediction reads), a version of the fitted model parameters and
+the prediction options, so refitting the model or changing the data never
+returns a stale prediction. Cached arrays are read-only.
+
+Example:
+    kd.enable_prediction_cache(directory='~/.cache/bioage')
+    ages = kd.predict(cohort)   # Scored and cached
+    ages = kd.predict(cohort)   # Served from the cache
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+
+class PredictionCache:
+    """
+    LRU of prediction arrays with optional persistence.
+    
+    Parameters:
+    -----------
+    max_entries : int
+        Predictions kept in memory
+    max_bytes : int
+        Memory budget of the predictions kept in memory
+    directory : str, optional
+        Directory the predictions are also written to (and read back from
+        in later processes), or None to keep them in memory only
+    max_disk_bytes : int
+        Size budget of the prediction files in the directory
+    """
+    
+    def __init__(self, max_entries: int = 16, max_bytes: int = 512 * 2**20,
+                 directory: Optional[str] = None, max_disk_bytes: int = 2 * 2**30):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.directory = os.path.expanduser(directory) if directory else None
+        self.hits = 0
+        self.misses = 0
+        self._arrays = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+    
+    def __getstate__(self):
+        # Models are pickled into worker processes: send the configuration only
+        return {'max_entries': self.max_entries, 'max_bytes': self.max_bytes,
+                'directory': self.directory, 'max_disk_bytes': self.max_disk_bytes}
+    
+    def __setstate__(self, state):
+        self.__init__(**state)
+    
+    @staticmethod
+    def key(*parts) -> str:
+        """Key of a prediction from its inputs (fingerprints, versions, options)."""
+        return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()[:32]
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.npy")
+    
+    def _remember(self, key: str, array: np.ndarray) -> None:
+        with self._lock:
+            if key in self._arrays:
+                self._arrays.move_to_end(key)
+                return
+            self._arrays[key] = array
+            self._size += array.nbytes
+            while self._arrays and (len(self._arrays) > self.max_entries or self._size > self.max_bytes):
+                _, evicted = self._arrays.popitem(last=False)
+                self._size -= evicted.nbytes
+    
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Cached prediction for a key (memory-mapped from disk if needed), or None."""
+        with self._lock:
+            array = self._arrays.get(key)
+            if array is not None:
+                self._arrays.move_to_end(key)
+                self.hits += 1
+                return array
+        if self.directory:
+            try:
+                array = np.load(self._path(key), mmap_mode='r')
+            except (OSError, ValueError):
+                array = None
+            if array is not None:
+                try:
+                    os.utime(self._path(key))  # Recently used: pruned last
+                except OSError:
+                    pass
+                self._remember(key, array)
+                self.hits += 1
+                return array
+        self.misses += 1
+        return None
+    
+    def put(self, key: str, array: np.ndarray) -> np.ndarray:
+        """
+        Store a prediction; returns it read-only, as it's now shared.
+        """
+        array.setflags(write=False)
+        self._remember(key, array)
+        if self.directory:
+            # Write to a temporary file and rename, so readers never see partial files
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    np.save(f, array)
+                os.replace(tmp_path, self._path(key))
+            except OSError:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+            self._prune()
+        return array
+    
+    def _prune(self) -> None:
+        """Remove the least recently used files while the directory exceeds max_disk_bytes."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.npy'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        # Memory-mapped readers keep their data when a file is removed
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+    
+    def clear(self, disk: bool = False) -> None:
+        """Drop the predictions held in memory, and the files too if disk is set."""
+        with self._lock:
+            self._arrays.clear()
+            self._size = 0
+        if disk and self.directory:
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.npy'):
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+    
+    def __len__(self) -> int:
+        return len(self._arrays)
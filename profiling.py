@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Opt-in sampling profiler for production requests.
+
+A RequestProfiler runs cProfile on a random fraction of requests (for example
+1 in 1000) and writes one .prof file per sampled request to a local directory
+that is rotated to keep only the newest dumps. Requests that aren't sampled
+only pay for one random number, and nothing at all when sampling is off.
+
+The collected dumps can be aggregated with top_functions() or inspected with
+the standard tools (python -m pstats, snakeviz, ...).
+
+Configuration (environment variables read by from_environment):
+    PROFILE_SAMPLE_RATE  Fraction of requests to profile (default: 0, disabled)
+    PROFILE_DIR          Directory of the dumps (default: profiles)
+    PROFILE_MAX_FILES    Number of dumps to keep (default: 200)
+"""
+
+import cProfile
+import os
+import pstats
+import random
+import re
+import time
+from typing import Dict, List, Optional
+
+
+class RequestProfiler:
+    """
+    Profiles a random sample of requests with cProfile.
+    
+    Parameters:
+    -----------
+    sample_rate : float
+        Fraction of requests to profile, between 0 (off) and 1 (all)
+    directory : str
+        Directory where the dumps are written
+    max_files : int
+        Number of most recent dumps to keep
+    """
+    
+    def __init__(self, sample_rate: float = 0.0, directory: str = 'profiles', max_files: int = 200):
+        if not 0 <= sample_rate <= 1:
+            raise ValueError("sample_rate must be between 0 and 1")
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self.max_files = max_files
+    
+    @classmethod
+    def from_environment(cls) -> 'RequestProfiler':
+        """Create a profiler configured by the PROFILE_* environment variables."""
+        return cls(sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0)),
+                   directory=os.environ.get('PROFILE_DIR', 'profiles'),
+                   max_files=int(os.environ.get('PROFILE_MAX_FILES', 200)))
+    
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+    
+    def start(self) -> Optional[cProfile.Profile]:
+        """
+        Decide whether to sample the current request and start profiling it.
+        
+        Returns:
+        --------
+        cProfile.Profile or None
+            The running profiler, or None if the request isn't sampled
+        """
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return None  # Another profiler is already active
+        return profile
+    
+    def stop(self, profile: cProfile.Profile, label: str = 'request') -> str:
+        """
+        Stop a profiler returned by start() and write its dump.
+        
+        Parameters:
+        -----------
+        profile : cProfile.Profile
+            Running profiler
+        label : str
+            Short description included in the file name (e.g. the endpoint)
+        
+        Returns:
+        --------
+        str
+            Path of the written dump
+        """
+        profile.disable()
+        os.makedirs(self.directory, exist_ok=True)
+        label = re.sub(r'[^A-Za-z0-9_.-]', '_', label)[:50]
+        path = os.path.join(self.directory,
+                            f"{time.time_ns()}_{os.getpid()}_{label}.prof")
+        profile.dump_stats(path)
+        self._rotate()
+        return path
+    
+    def dump_paths(self) -> List[str]:
+        """Paths of the collected dumps, oldest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        # File names start with a nanosecond timestamp
+        names = sorted(f for f in os.listdir(self.directory) if f.endswith('.prof'))
+        return [os.path.join(self.directory, name) for name in names]
+    
+    def _rotate(self) -> None:
+        paths = self.dump_paths()
+        for path in paths[:max(0, len(paths) - self.max_files)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # Removed by another worker
+    
+    def top_functions(self, limit: int = 30, sort: str = 'cumulative') -> Dict:
+        """
+        Aggregate the collected dumps and list the most expensive functions.
+        
+        Parameters:
+        -----------
+        limit : int, default=30
+            Number of functions to return
+        sort : str, default='cumulative'
+            'cumulative' (time including callees) or 'tottime' (own time)
+        
+        Returns:
+        --------
+        dict
+            Number of samples and a list of functions with their call count,
+            own time, cumulative time and cumulative time per sample
+        """
+        if sort not in ('cumulative', 'tottime'):
+            raise ValueError("sort must be 'cumulative' or 'tottime'")
+        
+        stats = None
+        n_samples = 0
+        for path in self.dump_paths():
+            try:
+                if stats is None:
+                    stats = pstats.Stats(path)
+                else:
+                    stats.add(path)
+                n_samples += 1
+            except (OSError, EOFError, TypeError, ValueError):
+                continue  # Dump being written or rotated away
+        if stats is None:
+            return {'samples': 0, 'functions': []}
+        
+        functions = []
+        for (filename, line, name), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+            functions.append({
+                'function': name if filename == '~' else f"{os.path.basename(filename)}:{line}({name})",
+                'ncalls': ncalls,
+                'tottime': tottime,
+                'cumtime': cumtime,
+                'cumtime_per_sample': cumtime / n_samples
+            })
+        key = 'cumtime' if sort == 'cumulative' else 'tottime'
+        functions.sort(key=lambda f: f[key], reverse=True)
+        return {'samples': n_samples, 'functions': functions[:limit]}
@@ -13,9 +13,124 @@ can provide a rough estimate of biological age and aging pace based on self-repo
 information.
 """
 
+import io
+from types import MappingProxyType
+
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
+from PIL import Image
+
+from rendering import CanvasPool, figure_png, new_figure
+
+# Gauge of the aging pace plot: range and colored sections
+GAUGE_MIN = -15
+GAUGE_MAX = 15
+GAUGE_SECTIONS = [
+    (GAUGE_MIN, -8, '#009900'),  # Dark green: Significantly younger
+    (-8, -4, '#66CC00'),         # Light green: Moderately younger
+    (-4, -1, '#99FF66'),         # Very light green: Slightly younger
+    (-1, 1, '#FFFF66'),          # Yellow: Approximately equal
+    (1, 4, '#FFCC66'),           # Light orange: Slightly older
+    (4, 8, '#FF9933'),           # Orange: Moderately older
+    (8, GAUGE_MAX, '#FF5050')    # Red: Significantly older
+]
+_MARKER_Y = [0, 0.5, 0]
+
+# Resolution of the fast plot rendering (the full rendering uses matplotlib's default of 100)
+FAST_PLOT_DPI = 64
+# zlib level of the fast rendering's PNGs: much faster than the default for slightly larger files
+PNG_COMPRESS_LEVEL = 1
+
+
+def _marker_x(pace):
+    return [pace, pace + 0.8, pace - 0.8]
+
+
+def _draw_gauge(ax):
+    """Draw the static parts of the aging pace gauge: sections, scale labels and limits."""
+    ax.axis('off')
+    
+    # Background gauge (gray)
+    ax.barh(0, GAUGE_MAX - GAUGE_MIN, left=GAUGE_MIN, height=0.5, color='#EEEEEE')
+    
+    # Colored sections
+    for start, end, color in GAUGE_SECTIONS:
+        ax.barh(0, end - start, left=start, height=0.5, color=color)
+    
+    # Add text annotations for the scale
+    ax.text(GAUGE_MIN, -0.5, 'Significativamente Más Joven', ha='left', va='top', fontsize=10)
+    ax.text(0, -0.5, 'Igual', ha='center', va='top', fontsize=10)
+    ax.text(GAUGE_MAX, -0.5, 'Significativamente Mayor', ha='right', va='top', fontsize=10)
+    
+    # Set gauge limits
+    ax.set_xlim(GAUGE_MIN - 2, GAUGE_MAX + 2)
+    ax.set_ylim(-1, 2)
+
+
+# Answers the improvement search never suggests changing (age is never changed)
+FIXED_QUESTIONS = ('sex', 'longevity_family')
+
+
+# Recommendations for the categories that add the most years, compiled once into
+# immutable tables (see QuestionnaireAgeCalculator.generate_recommendations)
+RECOMMENDATION_CATALOG = MappingProxyType({
+    'physical': (
+        "Intenta realizar al menos 150 minutos de actividad aeróbica de intensidad moderada por semana",
+        "Incorpora ejercicios de fortalecimiento muscular al menos dos veces por semana",
+        "Reduce el tiempo sedentario tomando descansos para ponerte de pie o caminar cada hora",
+        "Considera actividades que mejoren el equilibrio y la flexibilidad, como yoga o tai chi",
+        "Comienza poco a poco si actualmente eres inactivo - incluso 10 minutos de actividad son beneficiosos",
+    ),
+    'nutrition': (
+        "Aumenta el consumo de frutas y verduras a al menos 5 porciones diarias",
+        "Elige granos integrales en lugar de granos refinados",
+        "Limita los alimentos procesados, azúcares añadidos y grasas poco saludables",
+        "Mantente hidratado bebiendo suficiente agua a lo largo del día",
+        "Considera un patrón de dieta mediterránea o DASH, que se han asociado con mayor longevidad",
+    ),
+    'lifestyle': (
+        "Prioriza el sueño buscando 7-8 horas de sueño de calidad cada noche",
+        "Si fumas, busca ayuda para dejarlo - los beneficios comienzan en cuestión de horas",
+        "Limita el consumo de alcohol a niveles moderados o menos",
+        "Participa en actividades mentalmente estimulantes a diario",
+        "Establece una rutina regular para dormir, comer y realizar actividad física",
+    ),
+    'psychology': (
+        "Practica técnicas de manejo del estrés como meditación, respiración profunda o mindfulness",
+        "Busca ayuda profesional si experimentas estado de ánimo bajo o ansiedad persistente",
+        "Dedica tiempo a actividades que te brinden alegría y satisfacción",
+        "Practica la gratitud anotando regularmente cosas que aprecias",
+        "Establece metas realistas y celebra los logros, por pequeños que sean",
+    ),
+    'medical': (
+        "Programa chequeos regulares con profesionales de la salud",
+        "Sigue los planes de tratamiento para cualquier condición de salud existente",
+        "Monitorea tu presión arterial regularmente",
+        "Mantente al día con las evaluaciones de salud recomendadas",
+        "Consulta con tu médico formas de optimizar tu régimen de medicamentos si corresponde",
+    ),
+    'social': (
+        "Fortalece las relaciones existentes a través del contacto regular",
+        "Únete a clubes, clases u oportunidades de voluntariado para conocer gente nueva",
+        "Considera herramientas digitales para mantenerte conectado con amigos y familiares distantes",
+        "Equilibra la soledad con la interacción social según tus necesidades personales",
+        "Busca comunidades de apoyo alineadas con tus intereses o valores",
+    ),
+})
+
+# Shown when no category adds years
+GENERAL_RECOMMENDATIONS = {
+    "category": "Bienestar General",
+    "suggestions": (
+        "Continúa con tus hábitos saludables mientras buscas nuevas formas de optimizar tu bienestar",
+        "Comparte tu conocimiento y hábitos con otros que podrían beneficiarse",
+        "Mantente informado sobre los avances en la ciencia de la longevidad",
+        "Considera reevaluar periódicamente tu edad biológica para rastrear cambios a lo largo del tiempo",
+        "Concéntrate en mantener el equilibrio que has logrado en diferentes dominios de la salud",
+    )
+}
+
+RECOMMENDATIONS_NOTE = "Estas recomendaciones se basan en tus respuestas al cuestionario y deben considerarse en consulta con profesionales de la salud. No pretenden reemplazar el consejo médico profesional."
 
 class QuestionnaireAgeCalculator:
     """
@@ -26,8 +141,16 @@ class QuestionnaireAgeCalculator:
     scientific literature.
     """
     
-    def __init__(self):
-        """Initialize the calculator with question weights and categories."""
+    def __init__(self, plot_pool_size=4):
+        """
+        Initialize the calculator with question weights and categories.
+        
+        Parameters:
+        -----------
+        plot_pool_size : int, default=4
+            Maximum number of figure templates for fast plot rendering, i.e. of
+            fast plots rendered concurrently by different threads
+        """
         # Categories of questions
         self.categories = {
             'personal': 'Características Personales',
@@ -295,6 +418,49 @@ class QuestionnaireAgeCalculator:
                 'category': 'personal'
             }
         ]
+        
+        # Controls how much the impacts affect the biological age
+        self.scaling_factor = 0.8
+        
+        # Category and option impacts of every scored question, so that scoring
+        # an answer is a dictionary lookup (the first option wins for duplicate values)
+        self._impact_table = {}
+        for question in self.questions:
+            if question['id'] == 'age':
+                continue  # Reference only, no impact
+            option_impacts = {}
+            if question['type'] == 'choice':
+                for option in question['options']:
+                    option_impacts.setdefault(option['value'], option['impact'])
+            self._impact_table[question['id']] = (question['category'], option_impacts)
+        
+        # The same impacts as a matrix (one row per question, one column per option,
+        # NaN padding) for the vectorized improvement search, with the row and column
+        # of every answer and the texts of the questions and options
+        self._question_ids = list(self._impact_table)
+        self._question_rows = {question_id: row for row, question_id in enumerate(self._question_ids)}
+        self._option_values = [list(option_impacts) for _, option_impacts in self._impact_table.values()]
+        self._option_columns = [{value: column for column, value in enumerate(values)}
+                                for values in self._option_values]
+        self._impact_matrix = np.full((len(self._question_ids), max(map(len, self._option_values))), np.nan)
+        for row, (_, option_impacts) in enumerate(self._impact_table.values()):
+            self._impact_matrix[row, :len(option_impacts)] = list(option_impacts.values())
+        self._question_texts = {question['id']: question['text'] for question in self.questions}
+        self._option_texts = {
+            question['id']: {option['value']: option['text'] for option in reversed(question.get('options', []))}
+            for question in self.questions
+        }
+        
+        # Recommendation entries of each category, and the recommendations
+        # memoized by the ordered tuple of top categories (a few hundred at most)
+        self._recommendation_entries = MappingProxyType({
+            cat: {"category": self.categories[cat], "suggestions": suggestions}
+            for cat, suggestions in RECOMMENDATION_CATALOG.items()
+        })
+        self._recommendation_memo = {}
+        
+        # Figure templates for fast plot rendering, built on first use
+        self.plot_templates = CanvasPool(lambda: ResultsPlotTemplate(self.categories), plot_pool_size)
     
     def get_questions(self):
         """Return the list of questions for the questionnaire."""
@@ -318,42 +484,40 @@ class QuestionnaireAgeCalculator:
         dict
             Dictionary containing biological age estimate and category breakdowns
         """
-        if 'age' not in responses:
-            raise ValueError("Chronological age is required")
-        
-        chronological_age = float(responses['age'])
-        if chronological_age < 18:
-            raise ValueError("This calculator is designed for adults 18 and older")
+        chronological_age = self._chronological_age(responses)
         
         # Calculate the total impact from all responses
         total_impact = 0
         category_impacts = {category: 0 for category in self.categories}
         category_counts = {category: 0 for category in self.categories}
         
-        for question in self.questions:
-            question_id = question['id']
-            if question_id == 'age':
-                continue  # Skip the age question in impact calculation
-                
+        for question_id, (category, option_impacts) in self._impact_table.items():
             if question_id not in responses:
                 continue  # Skip questions without responses
-                
-            response_value = responses[question_id]
-            impact = 0
             
-            # Find the selected option and its impact
-            if question['type'] == 'choice':
-                for option in question['options']:
-                    if option['value'] == response_value:
-                        impact = option['impact']
-                        break
+            # Impact of the selected option (0 for unknown answers)
+            impact = option_impacts.get(responses[question_id], 0)
             
             # Add to total and category impacts
             total_impact += impact
-            category = question['category']
             category_impacts[category] += impact
             category_counts[category] += 1
         
+        return self._build_result(chronological_age, total_impact, category_impacts, category_counts)
+    
+    @staticmethod
+    def _chronological_age(responses):
+        """Validated chronological age of a set of responses."""
+        if 'age' not in responses:
+            raise ValueError("Chronological age is required")
+        
+        chronological_age = float(responses['age'])
+        if chronological_age < 18:
+            raise ValueError("This calculator is designed for adults 18 and older")
+        return chronological_age
+    
+    def _build_result(self, chronological_age, total_impact, category_impacts, category_counts):
+        """Result of calculate_biological_age from the impact totals of the answers."""
         # Calculate the average impact per answered question
         answered_questions = sum(category_counts.values())
         if answered_questions == 0:
@@ -372,8 +536,7 @@ class QuestionnaireAgeCalculator:
         # We use a formula that adjusts chronological age based on the total impact:
         # - Positive impact adds to chronological age (accelerated aging)
         # - Negative impact subtracts from chronological age (decelerated aging)
-        scaling_factor = 0.8  # Controls how much the impacts affect the biological age
-        biological_age = chronological_age + (total_impact * scaling_factor)
+        biological_age = chronological_age + (total_impact * self.scaling_factor)
         
         # Cap biological age to reasonable limits
         biological_age = max(18, min(120, biological_age))
@@ -406,6 +569,44 @@ class QuestionnaireAgeCalculator:
             "total_impact": total_impact
         }
     
+    def what_if(self, responses):
+        """
+        Score a base profile once for incremental what-if evaluation.
+        
+        Parameters:
+        -----------
+        responses : dict
+            Base responses, as accepted by calculate_biological_age
+        
+        Returns:
+        --------
+        WhatIfProfile
+            Profile evaluating changed answers without rescoring the others
+        """
+        return WhatIfProfile(self, responses)
+    
+    def suggest_improvements(self, responses, k=3, top=5, fixed=FIXED_QUESTIONS):
+        """
+        Rank the answer changes that lower the biological age the most.
+        
+        Parameters:
+        -----------
+        responses : dict
+            Responses, as accepted by calculate_biological_age
+        k : int
+            Largest number of changes combined
+        top : int
+            Number of single changes returned
+        fixed : iterable of str
+            Questions whose answers can't be changed (e.g. sex, family history)
+        
+        Returns:
+        --------
+        dict
+            See WhatIfProfile.improvements
+        """
+        return self.what_if(responses).improvements(k=k, top=top, fixed=fixed)
+    
     def generate_recommendations(self, results):
         """
         Generate personalized recommendations based on questionnaire results.
@@ -418,106 +619,35 @@ class QuestionnaireAgeCalculator:
         Returns:
         --------
         dict
-            Dictionary containing personalized recommendations
+            Dictionary containing personalized recommendations. It is shared by
+            all calls with the same top categories and must not be modified.
         """
         category_scores = results['category_scores']
-        recommendations = []
         
-        # Sort categories by impact (highest positive impact first)
+        # Sort categories by impact (highest positive impact first); the top 3
+        # categories with positive impact select the recommendations. A category
+        # without recommendations (personal characteristics) still takes a slot.
         sorted_categories = sorted(
             category_scores.items(), 
             key=lambda x: x[1], 
             reverse=True
         )
+        top_categories = tuple([cat for cat, score in sorted_categories if score > 0][:3])
         
-        # Generate recommendations for the top 3 categories with positive impact
-        top_categories = [cat for cat, score in sorted_categories if score > 0][:3]
-        
-        for category in top_categories:
-            if category == 'physical':
-                recommendations.append({
-                    "category": self.categories[category],
-                    "suggestions": [
-                        "Intenta realizar al menos 150 minutos de actividad aeróbica de intensidad moderada por semana",
-                        "Incorpora ejercicios de fortalecimiento muscular al menos dos veces por semana",
-                        "Reduce el tiempo sedentario tomando descansos para ponerte de pie o caminar cada hora",
-                        "Considera actividades que mejoren el equilibrio y la flexibilidad, como yoga o tai chi",
-                        "Comienza poco a poco si actualmente eres inactivo - incluso 10 minutos de actividad son beneficiosos"
-                    ]
-                })
-            elif category == 'nutrition':
-                recommendations.append({
-                    "category": self.categories[category],
-                    "suggestions": [
-                        "Aumenta el consumo de frutas y verduras a al menos 5 porciones diarias",
-                        "Elige granos integrales en lugar de granos refinados",
-                        "Limita los alimentos procesados, azúcares añadidos y grasas poco saludables",
-                        "Mantente hidratado bebiendo suficiente agua a lo largo del día",
-                        "Considera un patrón de dieta mediterránea o DASH, que se han asociado con mayor longevidad"
-                    ]
-                })
-            elif category == 'lifestyle':
-                recommendations.append({
-                    "category": self.categories[category],
-                    "suggestions": [
-                        "Prioriza el sueño buscando 7-8 horas de sueño de calidad cada noche",
-                        "Si fumas, busca ayuda para dejarlo - los beneficios comienzan en cuestión de horas",
-                        "Limita el consumo de alcohol a niveles moderados o menos",
-                        "Participa en actividades mentalmente estimulantes a diario",
-                        "Establece una rutina regular para dormir, comer y realizar actividad física"
-                    ]
-                })
-            elif category == 'psychology':
-                recommendations.append({
-                    "category": self.categories[category],
-                    "suggestions": [
-                        "Practica técnicas de manejo del estrés como meditación, respiración profunda o mindfulness",
-                        "Busca ayuda profesional si experimentas estado de ánimo bajo o ansiedad persistente",
-                        "Dedica tiempo a actividades que te brinden alegría y satisfacción",
-                        "Practica la gratitud anotando regularmente cosas que aprecias",
-                        "Establece metas realistas y celebra los logros, por pequeños que sean"
-                    ]
-                })
-            elif category == 'medical':
-                recommendations.append({
-                    "category": self.categories[category],
-                    "suggestions": [
-                        "Programa chequeos regulares con profesionales de la salud",
-                        "Sigue los planes de tratamiento para cualquier condición de salud existente",
-                        "Monitorea tu presión arterial regularmente",
-                        "Mantente al día con las evaluaciones de salud recomendadas",
-                        "Consulta con tu médico formas de optimizar tu régimen de medicamentos si corresponde"
-                    ]
-                })
-            elif category == 'social':
-                recommendations.append({
-                    "category": self.categories[category],
-                    "suggestions": [
-                        "Fortalece las relaciones existentes a través del contacto regular",
-                        "Únete a clubes, clases u oportunidades de voluntariado para conocer gente nueva",
-                        "Considera herramientas digitales para mantenerte conectado con amigos y familiares distantes",
-                        "Equilibra la soledad con la interacción social según tus necesidades personales",
-                        "Busca comunidades de apoyo alineadas con tus intereses o valores"
-                    ]
-                })
-        
-        # If there aren't any categories with positive impact, provide general recommendations
-        if not recommendations:
-            recommendations.append({
-                "category": "Bienestar General",
-                "suggestions": [
-                    "Continúa con tus hábitos saludables mientras buscas nuevas formas de optimizar tu bienestar",
-                    "Comparte tu conocimiento y hábitos con otros que podrían beneficiarse",
-                    "Mantente informado sobre los avances en la ciencia de la longevidad",
-                    "Considera reevaluar periódicamente tu edad biológica para rastrear cambios a lo largo del tiempo",
-                    "Concéntrate en mantener el equilibrio que has logrado en diferentes dominios de la salud"
-                ]
+        output = self._recommendation_memo.get(top_categories)
+        if output is None:
+            recommendations = [self._recommendation_entries[cat] for cat in top_categories
+                               if cat in self._recommendation_entries]
+            
+            # If there aren't any categories with positive impact, provide general recommendations
+            if not recommendations:
+                recommendations.append(GENERAL_RECOMMENDATIONS)
+            
+            output = self._recommendation_memo.setdefault(top_categories, {
+                "recommendations": recommendations,
+                "general_note": RECOMMENDATIONS_NOTE
             })
-        
-        return {
-            "recommendations": recommendations,
-            "general_note": "Estas recomendaciones se basan en tus respuestas al cuestionario y deben considerarse en consulta con profesionales de la salud. No pretenden reemplazar el consejo médico profesional."
-        }
+        return output
     
     def plot_results(self, results):
         """
@@ -531,12 +661,15 @@ class QuestionnaireAgeCalculator:
         Returns:
         --------
         matplotlib.figure.Figure
-            Figure containing the visualizations
+            Figure containing the visualizations. It has its own Agg canvas and
+            is not managed by pyplot, so figures can be drawn concurrently
+            by several threads; save it with fig.savefig().
         """
-        fig = plt.figure(figsize=(15, 10))
+        fig = new_figure(figsize=(15, 10))
+        grid = fig.add_gridspec(2, 2)
         
         # 1. Age comparison plot
-        ax1 = plt.subplot2grid((2, 2), (0, 0))
+        ax1 = fig.add_subplot(grid[0, 0])
         ages = [results['chronological_age'], results['biological_age']]
         bars = ax1.bar(['Edad Cronológica', 'Edad Biológica'], ages, color=['#72B7B2', '#F15854'])
         ax1.set_title('Comparación de Edad', fontsize=14)
@@ -551,7 +684,7 @@ class QuestionnaireAgeCalculator:
                      ha='center', va='bottom')
         
         # 2. Category impact plot
-        ax2 = plt.subplot2grid((2, 2), (0, 1))
+        ax2 = fig.add_subplot(grid[0, 1])
         categories = list(self.categories.values())
         impacts = [results['category_scores'].get(cat_id, 0) for cat_id in self.categories.keys()]
         
@@ -568,56 +701,380 @@ class QuestionnaireAgeCalculator:
         ax2.axvline(x=0, color='k', linestyle='-', alpha=0.3)
         
         # 3. Aging pace interpretation
-        ax3 = plt.subplot2grid((2, 2), (1, 0), colspan=2)
-        ax3.axis('off')
+        ax3 = fig.add_subplot(grid[1, :])
         pace = results['aging_pace']
         
-        # Create a horizontal gauge chart
-        gauge_min = -15
-        gauge_max = 15
-        gauge_width = gauge_max - gauge_min
-        
-        # Background gauge (gray)
-        ax3.barh(0, gauge_width, left=gauge_min, height=0.5, color='#EEEEEE')
-        
-        # Colored sections
-        sections = [
-            (gauge_min, -8, '#009900'),  # Dark green: Significantly younger
-            (-8, -4, '#66CC00'),         # Light green: Moderately younger
-            (-4, -1, '#99FF66'),         # Very light green: Slightly younger
-            (-1, 1, '#FFFF66'),          # Yellow: Approximately equal
-            (1, 4, '#FFCC66'),           # Light orange: Slightly older
-            (4, 8, '#FF9933'),           # Orange: Moderately older
-            (8, gauge_max, '#FF5050')    # Red: Significantly older
-        ]
-        
-        for start, end, color in sections:
-            width = end - start
-            ax3.barh(0, width, left=start, height=0.5, color=color)
-        
-        # Pace marker (black triangle)
-        marker_y = [0, 0.5, 0]
-        marker_x = [pace, pace+0.8, pace-0.8]
-        ax3.fill(marker_x, marker_y, 'black')
-        
-        # Add text annotations for the scale
-        ax3.text(gauge_min, -0.5, 'Significativamente Más Joven', ha='left', va='top', fontsize=10)
-        ax3.text(0, -0.5, 'Igual', ha='center', va='top', fontsize=10)
-        ax3.text(gauge_max, -0.5, 'Significativamente Mayor', ha='right', va='top', fontsize=10)
+        # Create a horizontal gauge chart with a black triangle marking the pace
+        _draw_gauge(ax3)
+        ax3.fill(_marker_x(pace), _MARKER_Y, 'black')
         
         # Add value and interpretation
         ax3.text(0, 1.2, f'Ritmo de Envejecimiento: {pace:+.1f} años', ha='center', va='bottom', fontsize=14, fontweight='bold')
         ax3.text(0, 0.8, results['qualitative_rating'], ha='center', va='bottom', fontsize=12)
         
-        # Set gauge limits
-        ax3.set_xlim(gauge_min - 2, gauge_max + 2)
-        ax3.set_ylim(-1, 2)
-        
         # Add overall title
-        plt.suptitle('Resultados de la Evaluación de Edad Biológica', fontsize=16, fontweight='bold')
+        fig.suptitle('Resultados de la Evaluación de Edad Biológica', fontsize=16, fontweight='bold')
         
-        plt.tight_layout(rect=[0, 0, 1, 0.95])
+        fig.tight_layout(rect=[0, 0, 1, 0.95])
         return fig
+    
+    def plot_results_png(self, results, fast=False, dpi=FAST_PLOT_DPI):
+        """
+        Render the results visualization as a PNG image.
+        
+        Parameters:
+        -----------
+        results : dict
+            Results from calculate_biological_age method
+        fast : bool, default=False
+            Update a pre-built figure template in place instead of drawing a
+            new figure, skip the tight bounding box and render at a fixed,
+            reduced resolution. Several times faster than the full rendering.
+            Waits for a free template when plot_pool_size threads are
+            already rendering.
+        dpi : float, default=FAST_PLOT_DPI
+            Resolution of the fast rendering
+        
+        Returns:
+        --------
+        bytes
+            PNG image
+        """
+        if not fast:
+            return figure_png(self.plot_results(results), bbox_inches='tight')
+        
+        with self.plot_templates.acquire() as template:
+            return template.render(results, dpi)
+
+
+class WhatIfProfile:
+    """
+    Base profile scored once, evaluating answer changes incrementally.
+    
+    The impact of every base answer and the total and per-category sums are
+    kept, so a variant with k changed answers is scored in O(k) by
+    substituting their impacts, instead of copying the responses and rescoring
+    every question. Results are identical to calculate_biological_age on the
+    changed responses.
+    
+    Changes are dictionaries of question ids and new option values; 'age'
+    changes the chronological age, a value of None removes the answer and
+    unknown question ids are ignored.
+    
+    Parameters:
+    -----------
+    calculator : QuestionnaireAgeCalculator
+        Calculator whose questions score the answers
+    responses : dict
+        Base responses, as accepted by calculate_biological_age
+    """
+    
+    def __init__(self, calculator, responses):
+        self.calculator = calculator
+        self.responses = dict(responses)
+        self.chronological_age = calculator._chronological_age(self.responses)
+        self.total_impact = 0
+        self.category_impacts = {category: 0 for category in calculator.categories}
+        self.category_counts = {category: 0 for category in calculator.categories}
+        
+        # Impact of every answered question
+        self._impacts = {}
+        for question_id, (category, option_impacts) in calculator._impact_table.items():
+            if question_id in self.responses:
+                impact = option_impacts.get(self.responses[question_id], 0)
+                self._impacts[question_id] = impact
+                self.total_impact += impact
+                self.category_impacts[category] += impact
+                self.category_counts[category] += 1
+    
+    def _apply(self, changes, category_impacts, category_counts):
+        """Apply changes to the category sums in place; return the chronological age and total impact."""
+        chronological_age = self.chronological_age
+        total_impact = self.total_impact
+        impact_table = self.calculator._impact_table
+        for question_id, value in changes.items():
+            if question_id == 'age':
+                chronological_age = self.calculator._chronological_age({} if value is None else {'age': value})
+                continue
+            entry = impact_table.get(question_id)
+            if entry is None:
+                continue
+            category, option_impacts = entry
+            
+            # Remove the base answer, then add the new one
+            old_impact = self._impacts.get(question_id)
+            if old_impact is not None:
+                total_impact -= old_impact
+                category_impacts[category] -= old_impact
+                category_counts[category] -= 1
+            if value is not None:
+                impact = option_impacts.get(value, 0)
+                total_impact += impact
+                category_impacts[category] += impact
+                category_counts[category] += 1
+        return chronological_age, total_impact
+    
+    def evaluate(self, changes=None):
+        """
+        Results of the base profile with some answers changed.
+        
+        Parameters:
+        -----------
+        changes : dict, optional
+            Question ids and new option values (None removes an answer)
+        
+        Returns:
+        --------
+        dict
+            Results as returned by calculate_biological_age
+        """
+        category_impacts = dict(self.category_impacts)
+        category_counts = dict(self.category_counts)
+        chronological_age, total_impact = self._apply(changes or {}, category_impacts, category_counts)
+        return self.calculator._build_result(chronological_age, total_impact,
+                                             category_impacts, category_counts)
+    
+    def evaluate_many(self, variants):
+        """Results of several named variants ({name: changes}), keyed by name."""
+        return {name: self.evaluate(changes) for name, changes in variants.items()}
+    
+    def alternatives(self, question_id):
+        """
+        Results for every option of a question, e.g. to drive a what-if slider.
+        
+        Returns:
+        --------
+        dict
+            Option values and the results of answering them, in question order
+        """
+        _, option_impacts = self.calculator._impact_table[question_id]
+        return {value: self.evaluate({question_id: value}) for value in option_impacts}
+    
+    def update(self, changes):
+        """Make changes part of the base profile, in O(changed answers)."""
+        self.chronological_age, self.total_impact = self._apply(
+            changes, self.category_impacts, self.category_counts)
+        impact_table = self.calculator._impact_table
+        for question_id, value in changes.items():
+            if value is None:
+                self.responses.pop(question_id, None)
+                self._impacts.pop(question_id, None)
+                continue
+            self.responses[question_id] = value
+            if question_id in impact_table:
+                self._impacts[question_id] = impact_table[question_id][1].get(value, 0)
+    
+    def results(self):
+        """Results of the base profile."""
+        return self.evaluate()
+    
+    def improvements(self, k=3, top=5, fixed=FIXED_QUESTIONS):
+        """
+        Search all alternative answers for the changes that help the most.
+        
+        Every alternative of every answered, changeable question is ranked at
+        once on the impact matrix. The impacts add up, so the best combination
+        of j changes is the j questions with the best single changes, which
+        makes the combination search exact without enumerating combinations.
+        Only the returned suggestions are scored in full.
+        
+        Parameters:
+        -----------
+        k : int
+            Largest number of changes combined
+        top : int
+            Number of single changes returned
+        fixed : iterable of str
+            Questions whose answers can't be changed
+        
+        Returns:
+        --------
+        dict
+            'single_changes': up to top changes, best first, and 'combinations':
+            the best combination of 1, 2, ... up to k changes. Each entry holds
+            the 'changes' (question id, question and option texts, new value and
+            impact change), the resulting 'biological_age' and the 'years' it
+            changes the biological age by (negative is better).
+        """
+        calculator = self.calculator
+        
+        # Current impact of every changeable answer; unanswered and fixed questions
+        # and answers that aren't options have no alternatives
+        rows, columns = [], []
+        for question_id, value in self.responses.items():
+            row = calculator._question_rows.get(question_id)
+            if row is None or question_id in fixed:
+                continue
+            column = calculator._option_columns[row].get(value)
+            if column is not None:
+                rows.append(row)
+                columns.append(column)
+        if not rows:
+            return {"single_changes": [], "combinations": []}
+        matrix = calculator._impact_matrix[rows]
+        deltas = matrix - matrix[np.arange(len(rows)), columns][:, None]
+        deltas[~(deltas < 0)] = np.inf  # Only improvements (NaN padding included)
+        
+        base_age = self.evaluate()['biological_age']
+        
+        def suggestion(cells):
+            changes = {}
+            details = []
+            for index, column in cells:
+                question_id = calculator._question_ids[rows[index]]
+                value = calculator._option_values[rows[index]][column]
+                changes[question_id] = value
+                details.append({
+                    "question_id": question_id,
+                    "question": calculator._question_texts[question_id],
+                    "current": calculator._option_texts[question_id].get(self.responses[question_id]),
+                    "suggested": calculator._option_texts[question_id].get(value),
+                    "value": value,
+                    "impact_change": float(deltas[index, column])
+                })
+            biological_age = self.evaluate(changes)['biological_age']
+            return {
+                "changes": details,
+                "biological_age": biological_age,
+                "years": round(biological_age - base_age, 1)
+            }
+        
+        # Single changes, best first (stable, so ties keep the question order)
+        order = np.argsort(deltas, axis=None, kind='stable')
+        order = order[np.isfinite(deltas.ravel()[order])][:top]
+        single_changes = [suggestion([divmod(int(cell), deltas.shape[1])]) for cell in order]
+        
+        # Best alternative per question, and the best questions to combine
+        best_columns = deltas.argmin(axis=1)
+        best_deltas = deltas[np.arange(len(rows)), best_columns]
+        best_questions = np.argsort(best_deltas, kind='stable')
+        best_questions = best_questions[np.isfinite(best_deltas[best_questions])][:k]
+        combinations = [
+            suggestion([(int(index), int(best_columns[index])) for index in best_questions[:size]])
+            for size in range(1, len(best_questions) + 1)
+        ]
+        
+        return {"single_changes": single_changes, "combinations": combinations}
+
+
+class ResultsPlotTemplate:
+    """
+    Pre-built results figure for fast rendering.
+    
+    The figure, axes, gauge and labels are created and laid out once, and the
+    parts that never change are rendered once into a background image. render()
+    only updates the bars, the gauge marker and the texts, rescales the axes
+    and redraws the changed artists over the background at a fixed DPI, without
+    a tight bounding box. The figure is not registered with pyplot; a template
+    must only be used by one thread at a time (see rendering.CanvasPool).
+    
+    Parameters:
+    -----------
+    categories : dict
+        Category ids and display names, in plotting order
+    """
+    
+    def __init__(self, categories):
+        self.category_ids = list(categories)
+        self.figure = fig = new_figure(figsize=(15, 10))
+        self.canvas = fig.canvas
+        grid = fig.add_gridspec(2, 2)
+        
+        # 1. Age comparison plot
+        self.ax_ages = ax1 = fig.add_subplot(grid[0, 0])
+        self.age_bars = ax1.bar(['Edad Cronológica', 'Edad Biológica'], [50, 50], color=['#72B7B2', '#F15854'])
+        ax1.set_title('Comparación de Edad', fontsize=14, y=1.0)
+        ax1.set_ylabel('Edad (años)')
+        ax1.yaxis.set_label_coords(-0.07, 0.5)
+        ax1.grid(axis='y', linestyle='--', alpha=0.7)
+        self.age_labels = [ax1.text(bar.get_x() + bar.get_width()/2., 50.5, '', ha='center', va='bottom')
+                           for bar in self.age_bars]
+        
+        # 2. Category impact plot
+        self.ax_impacts = ax2 = fig.add_subplot(grid[0, 1])
+        y_pos = np.arange(len(categories))
+        self.impact_bars = ax2.barh(y_pos, np.ones(len(categories)), color='#F15854')
+        ax2.set_yticks(y_pos)
+        ax2.set_yticklabels(list(categories.values()))
+        ax2.set_xlabel('Puntuación de Impacto (negativo es mejor)')
+        ax2.xaxis.set_label_coords(0.5, -0.1)
+        ax2.set_title('Impactos por Categoría', fontsize=14, y=1.0)
+        ax2.grid(axis='x', linestyle='--', alpha=0.7)
+        ax2.axvline(x=0, color='k', linestyle='-', alpha=0.3)
+        
+        # 3. Aging pace interpretation
+        ax3 = fig.add_subplot(grid[1, :])
+        _draw_gauge(ax3)
+        self.marker, = ax3.fill(_marker_x(0), _MARKER_Y, 'black')
+        self.pace_text = ax3.text(0, 1.2, '', ha='center', va='bottom', fontsize=14, fontweight='bold')
+        self.rating_text = ax3.text(0, 0.8, '', ha='center', va='bottom', fontsize=12)
+        
+        fig.suptitle('Resultados de la Evaluación de Edad Biológica', fontsize=16, fontweight='bold')
+        
+        # Lay out once; the tick labels that vary between results are short
+        fig.tight_layout(rect=[0, 0, 1, 0.95])
+        
+        # Parts that never change are drawn once into a background image; the
+        # axes are redrawn on top of it without them
+        self._static_parts = [ax1.xaxis, ax1.title, ax2.yaxis, ax2.title]
+        self._dynamic_parts = [ax1.yaxis, ax2.xaxis, *self.age_labels,
+                               self.marker, self.pace_text, self.rating_text]
+        self._redrawn = [ax1, ax2, self.marker, self.pace_text, self.rating_text]
+        self._background = None
+    
+    def update(self, results):
+        """Update the data artists for a set of results."""
+        ages = [results['chronological_age'], results['biological_age']]
+        for bar, label, age in zip(self.age_bars, self.age_labels, ages):
+            bar.set_height(age)
+            label.set_y(age + 0.5)
+            label.set_text(f'{age:.1f}')
+        
+        for bar, cat_id in zip(self.impact_bars, self.category_ids):
+            impact = results['category_scores'].get(cat_id, 0)
+            bar.set_width(impact)
+            # Color bars based on impact (negative=good, positive=bad)
+            bar.set_color('#72B7B2' if impact <= 0 else '#F15854')
+        
+        for ax in (self.ax_ages, self.ax_impacts):
+            ax.relim()
+            ax.autoscale_view()
+        
+        pace = results['aging_pace']
+        self.marker.set_xy(np.column_stack([_marker_x(pace), _MARKER_Y]))
+        self.pace_text.set_text(f'Ritmo de Envejecimiento: {pace:+.1f} años')
+        self.rating_text.set_text(results['qualitative_rating'])
+    
+    def _draw_background(self):
+        """Render the static parts (gauge, titles, category labels) once."""
+        for artist in self._static_parts:
+            artist.set_visible(True)
+        for artist in self._dynamic_parts:
+            artist.set_visible(False)
+        self.canvas.draw()
+        self._background = self.canvas.copy_from_bbox(self.figure.bbox)
+        for artist in self._static_parts:
+            artist.set_visible(False)
+        for artist in self._dynamic_parts:
+            artist.set_visible(True)
+    
+    def render(self, results, dpi=FAST_PLOT_DPI):
+        """Update the figure for a set of results and return it as PNG bytes."""
+        if self._background is None or self.figure.dpi != dpi:
+            self.figure.set_dpi(dpi)
+            self._draw_background()
+        self.update(results)
+        
+        self.canvas.restore_region(self._background)
+        for artist in self._redrawn:
+            self.figure.draw_artist(artist)
+        # The canvas is opaque: store it as RGB
+        rgba = np.asarray(self.canvas.buffer_rgba())
+        height, width, _ = rgba.shape
+        image = Image.frombuffer('RGBA', (width, height), rgba, 'raw', 'RGBA', 0, 1).convert('RGB')
+        img_data = io.BytesIO()
+        image.save(img_data, 'PNG', compress_level=PNG_COMPRESS_LEVEL)
+        return img_data.getvalue()
 
 def main():
     """
@@ -672,10 +1129,8 @@ def main():
     
     # Create and save visualizations
     fig = calculator.plot_results(results)
-    plt.savefig('biological_age_results.png')
+    fig.savefig('biological_age_results.png')
     print("\nResults visualization saved as 'biological_age_results.png'")
-    
-    plt.close(fig)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -53,9 +53,8 @@ def run_example_case():
     
     # Create and save visualizations
     fig = calculator.plot_results(results)
-    plt.savefig('example_bioage_results.png')
+    fig.savefig('example_bioage_results.png')
     print("\nResults visualization saved as 'example_bioage_results.png'")
-    plt.close(fig)
     
     return results
 
@@ -163,9 +162,8 @@ def run_interactive_mode():
     
     # Create and save visualizations
     fig = calculator.plot_results(results)
-    plt.savefig('my_bioage_results.png')
+    fig.savefig('my_bioage_results.png')
     print("\nResults visualization saved as 'my_bioage_results.png'")
-    plt.close(fig)
     
     return results
 
@@ -197,21 +195,19 @@ def compare_scenarios():
         'longevity_family': 'moderate'
     }
     
-    # Scenarios to compare
+    # Answers changed by each scenario
     scenarios = {
-        "Base Case": base_responses.copy(),
-        "Poor Sleep": {**base_responses.copy(), 'sleep': '<5'},
-        "Active Lifestyle": {**base_responses.copy(), 'exercise': 'very_active', 'strength_training': 'very_often', 'sedentary': '4-6'},
-        "Poor Health Habits": {**base_responses.copy(), 'smoking': 'current_light', 'alcohol': 'heavy', 'diet': 'poor', 'exercise': 'none'},
-        "Optimal Lifestyle": {**base_responses.copy(), 'sleep': '7-8', 'exercise': 'very_active', 'strength_training': 'very_often', 
+        "Base Case": {},
+        "Poor Sleep": {'sleep': '<5'},
+        "Active Lifestyle": {'exercise': 'very_active', 'strength_training': 'very_often', 'sedentary': '4-6'},
+        "Poor Health Habits": {'smoking': 'current_light', 'alcohol': 'heavy', 'diet': 'poor', 'exercise': 'none'},
+        "Optimal Lifestyle": {'sleep': '7-8', 'exercise': 'very_active', 'strength_training': 'very_often', 
                              'diet': 'excellent', 'fruits_veggies': '6+', 'stress': 'low', 'happiness': 'very_happy', 
                              'social_connections': 'excellent', 'mental_activity': 'daily'}
     }
     
-    # Calculate biological age for each scenario
-    results = {}
-    for name, responses in scenarios.items():
-        results[name] = calculator.calculate_biological_age(responses)
+    # Score the base case once, then only the answers each scenario changes
+    results = calculator.what_if(base_responses).evaluate_many(scenarios)
     
     # Create comparison visualization
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 7))
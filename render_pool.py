@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Background process pool rendering plots off the request threads.
+
+/calculate submits the results plot to a bounded pool of worker processes and
+returns the page with the numeric results at once; the page polls
+/plots/<key>/status and swaps the image in when it's ready. Finished images are
+stored in the plot cache (whose directory is shared by the web workers), so
+any web worker can answer the polling and serve the image.
+
+Keys are reported 'missing' when they aren't cached, this pool never
+submitted them and no other web worker is rendering them (with a shared
+PLOT_CACHE_DIR, a <key>.rendering marker file is kept there while a plot
+renders), so clients polling for an unknown or expired key stop at once.
+
+Backpressure: at most max_pending plots are queued or rendering. Beyond that,
+submit() declines and the request thread renders the plot itself, which slows
+down the clients of a saturated worker instead of letting the queue (and
+the time to deliver each image) grow without bound.
+
+Configuration (environment variables read by from_environment):
+    RENDER_WORKERS      Rendering processes per web worker (default: 0, disabled)
+    RENDER_MAX_PENDING  Plots queued or rendering before requests render
+                        themselves (default: 2 x RENDER_WORKERS)
+"""
+
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+from metrics import RENDER_JOBS_TOTAL, record_cache
+from plot_cache import KEY_PATTERN
+
+logger = logging.getLogger(__name__)
+
+# Failed keys remembered so that polling clients stop waiting for them
+MAX_FAILED = 1000
+
+# Age after which the rendering marker of another web worker is considered
+# stale (e.g. the worker died), in seconds
+MAX_RENDER_SECONDS = 120
+
+# Calculator of a pool process, created by the first job
+_calculator = None
+
+
+def _process_calculator():
+    global _calculator
+    if _calculator is None:
+        from questionnaire_bioage import QuestionnaireAgeCalculator
+        _calculator = QuestionnaireAgeCalculator(plot_pool_size=1)
+    return _calculator
+
+
+def render_results_plot(results, fast):
+    """Render the results plot as PNG bytes in a pool process."""
+    return _process_calculator().plot_results_png(results, fast=fast)
+
+
+def warm_up_process(fast):
+    """Import the plotting code and build the figure template of a pool process."""
+    if fast:
+        _process_calculator().plot_templates.fill()
+
+
+class RenderPool:
+    """
+    Bounded background rendering into a PlotCache.
+    
+    Parameters:
+    -----------
+    plot_cache : plot_cache.PlotCache
+        Cache receiving the rendered images
+    workers : int
+        Number of rendering processes
+    max_pending : int, optional
+        Plots queued or rendering before submit() declines (default: 2 x workers)
+    """
+    
+    def __init__(self, plot_cache, workers: int = 2, max_pending: Optional[int] = None):
+        self.plot_cache = plot_cache
+        self.workers = workers
+        self.max_pending = max_pending or 2 * workers
+        self._executor = None
+        self._pending = {}
+        self._failed = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def from_environment(cls, plot_cache) -> Optional['RenderPool']:
+        """Pool configured by RENDER_WORKERS and RENDER_MAX_PENDING, or None if disabled."""
+        workers = int(os.environ.get('RENDER_WORKERS', 0))
+        if workers <= 0:
+            return None
+        max_pending = int(os.environ.get('RENDER_MAX_PENDING', 0)) or None
+        return cls(plot_cache, workers=workers, max_pending=max_pending)
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created on first use, i.e. in the web worker process rather than a
+        # gunicorn master that forks it. Pool processes are started from a
+        # clean forkserver (or spawned), never forked from a threaded worker.
+        if self._executor is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=context)
+            atexit.register(self.shutdown)
+        return self._executor
+    
+    def start(self, fast: bool = True) -> None:
+        """Start the pool processes and build their figure templates ahead of requests."""
+        with self._lock:
+            executor = self._get_executor()
+            for _ in range(self.workers):
+                executor.submit(warm_up_process, fast)
+    
+    @property
+    def pending(self) -> int:
+        """Number of plots queued or rendering."""
+        return len(self._pending)
+    
+    def submit(self, key: str, render: Callable[..., bytes], *args) -> bool:
+        """
+        Render an image in the background unless it's cached or the pool is saturated.
+        
+        Parameters:
+        -----------
+        key : str
+            Plot cache key of the image
+        render : callable
+            Picklable module-level function returning the PNG bytes
+        *args
+            Picklable arguments of render
+        
+        Returns:
+        --------
+        bool
+            True if the image will be delivered to the plot cache by the pool
+            (now or by an earlier submission of the same key). False if it is
+            already cached or the pool is saturated; the caller then gets or
+            renders the image itself.
+        """
+        if self.plot_cache.get(key) is not None:
+            return False
+        with self._lock:
+            if key in self._pending:
+                record_cache('plots', False)
+                return True
+            if len(self._pending) >= self.max_pending:
+                RENDER_JOBS_TOTAL.inc(result='caller_runs')
+                return False
+            self._failed.pop(key, None)
+            try:
+                future = self._get_executor().submit(render, *args)
+            except BrokenProcessPool:
+                # A pool process died; start a new pool for the next requests
+                logger.error("Render pool broken, restarting it")
+                self._executor = None
+                RENDER_JOBS_TOTAL.inc(result='caller_runs')
+                return False
+            self._pending[key] = future
+        self._mark_rendering(key)
+        record_cache('plots', False)
+        RENDER_JOBS_TOTAL.inc(result='submitted')
+        future.add_done_callback(lambda f: self._finished(key, f))
+        return True
+    
+    def _finished(self, key: str, future) -> None:
+        try:
+            self.plot_cache.put(key, future.result())
+            RENDER_JOBS_TOTAL.inc(result='rendered')
+        except Exception:
+            logger.exception(f"Background rendering of plot {key} failed")
+            RENDER_JOBS_TOTAL.inc(result='failed')
+            with self._lock:
+                self._failed[key] = True
+                while len(self._failed) > MAX_FAILED:
+                    self._failed.popitem(last=False)
+        # Removed only once the image is cached, so it's never reported missing
+        with self._lock:
+            self._pending.pop(key, None)
+        self._unmark_rendering(key)
+    
+    def _marker_path(self, key: str) -> Optional[str]:
+        directory = getattr(self.plot_cache, 'directory', None)
+        if not directory or not KEY_PATTERN.match(key):  # Keys come from URLs
+            return None
+        return os.path.join(directory, f"{key}.rendering")
+    
+    def _mark_rendering(self, key: str) -> None:
+        # Tells the other web workers sharing the cache directory that the key is coming
+        path = self._marker_path(key)
+        if path is not None:
+            try:
+                with open(path, 'w'):
+                    pass
+            except OSError:
+                pass
+    
+    def _unmark_rendering(self, key: str) -> None:
+        path = self._marker_path(key)
+        if path is not None:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    
+    def _rendering_elsewhere(self, key: str) -> bool:
+        path = self._marker_path(key)
+        if path is None:
+            return False
+        try:
+            return time.time() - os.path.getmtime(path) < MAX_RENDER_SECONDS
+        except OSError:
+            return False
+    
+    def status(self, key: str) -> str:
+        """
+        'ready', 'failed', 'pending' (submitted here or being rendered by another
+        web worker sharing the cache directory) or 'missing' (unknown or expired).
+        """
+        if self.plot_cache.get(key) is not None:
+            return 'ready'
+        if key in self._failed:
+            return 'failed'
+        if key in self._pending or self._rendering_elsewhere(key):
+            return 'pending'
+        return 'missing'
+    
+    def wait(self, key: str, timeout: float) -> str:
+        """
+        Wait up to timeout seconds for an image to be rendered (long polling).
+        
+        Returns:
+        --------
+        str
+            Status of the image at the end of the wait, as returned by status()
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            status = self.status(key)
+            remaining = deadline - time.monotonic()
+            if status != 'pending' or remaining <= 0:
+                return status
+            future = self._pending.get(key)
+            if future is not None:
+                wait([future], timeout=remaining)
+                # The image is cached just after the future completes
+                time.sleep(0.01)
+            else:
+                # Rendered by another web worker: watch the shared cache
+                time.sleep(min(0.25, remaining))
+    
+    def shutdown(self) -> None:
+        """Stop the pool processes, dropping plots that haven't started rendering."""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
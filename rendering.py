@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Thread-safe matplotlib rendering for the web app.
+
+pyplot keeps global state (the current figure and axes, the figure manager),
+so concurrent requests drawing through it interfere with each other. The
+helpers here use the object-oriented API instead: every figure is a
+matplotlib.figure.Figure attached to its own Agg canvas, never registered with
+pyplot, so any number of threads can draw at the same time as long as each
+figure is used by one thread at a time.
+
+CanvasPool hands out reusable, pre-initialised figures (such as the results
+plot template of questionnaire_bioage) to one thread at a time, bounding the
+number of figures (and their memory) per process.
+"""
+
+import io
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+
+
+def new_figure(**kwargs):
+    """
+    Create a figure with its own Agg canvas, outside pyplot.
+    
+    Parameters:
+    -----------
+    **kwargs
+        Arguments of matplotlib.figure.Figure (figsize, dpi, ...)
+    
+    Returns:
+    --------
+    matplotlib.figure.Figure
+        Figure whose savefig() and canvas work without pyplot
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    
+    fig = Figure(**kwargs)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def figure_png(fig, **savefig_kwargs) -> bytes:
+    """Encode a figure as PNG (savefig arguments such as bbox_inches pass through)."""
+    img_data = io.BytesIO()
+    fig.savefig(img_data, format='png', **savefig_kwargs)
+    return img_data.getvalue()
+
+
+class CanvasPool:
+    """
+    Bounded pool of reusable figures, each lent to one thread at a time.
+    
+    Objects are created by the factory on demand, up to size; once that many
+    are in use, acquire() waits for one to be returned.
+    
+    Parameters:
+    -----------
+    factory : callable
+        Creates a new pooled object (e.g. a pre-built figure template)
+    size : int
+        Maximum number of objects
+    """
+    
+    def __init__(self, factory: Callable[[], Any], size: int = 4):
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self.factory = factory
+        self.size = size
+        self._idle = queue.LifoQueue()  # Most recently used first, its caches are warm
+        self._created = 0
+        self._lock = threading.Lock()
+    
+    def _create(self) -> Any:
+        """Create an object if the pool isn't full yet, else return None."""
+        with self._lock:
+            if self._created >= self.size:
+                return None
+            self._created += 1
+        try:
+            return self.factory()
+        except BaseException:
+            with self._lock:
+                self._created -= 1
+            raise
+    
+    def fill(self, count: Optional[int] = None) -> None:
+        """Pre-initialise objects (all of them by default), e.g. before serving requests."""
+        count = self.size if count is None else count
+        while self._idle.qsize() < count:
+            item = self._create()
+            if item is None:
+                break
+            self._idle.put(item)
+    
+    @contextmanager
+    def acquire(self, timeout: Optional[float] = None):
+        """
+        Borrow an object for the duration of the block.
+        
+        Parameters:
+        -----------
+        timeout : float, optional
+            Seconds to wait for an object when all are in use (default: forever)
+        
+        Yields:
+        -------
+        object
+            Object created by the factory
+        
+        Raises:
+        -------
+        TimeoutError
+            If no object became available within the timeout
+        """
+        try:
+            item = self._idle.get_nowait()
+        except queue.Empty:
+            item = self._create()
+            if item is None:
+                try:
+                    item = self._idle.get(timeout=timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"No figure available after {timeout} s") from None
+        try:
+            yield item
+        finally:
+            self._idle.put(item)
+    
+    @property
+    def created(self) -> int:
+        """Number of objects created so far."""
+        return self._created
@@ -125,6 +125,52 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    // Plots rendered in the background: long-poll their status and swap the image in
+    const pendingPlots = document.querySelectorAll('[data-plot-status]');
+    pendingPlots.forEach(container => {
+        const statusUrl = container.getAttribute('data-plot-status');
+        const deadline = Date.now() + 60000;
+        
+        function showError(message) {
+            container.querySelector('.spinner-border').remove();
+            container.querySelector('.plot-message').textContent = message ||
+                'No se pudo generar el gráfico. Recarga la página para intentarlo de nuevo.';
+        }
+        
+        function poll() {
+            fetch(statusUrl + '?wait=10', { cache: 'no-store' })
+                .then(response => response.json())
+                .then(data => {
+                    if (data.status === 'ready') {
+                        const image = container.querySelector('img');
+                        image.addEventListener('load', () => {
+                            image.classList.remove('d-none');
+                            container.querySelector('.spinner-border').remove();
+                            container.querySelector('.plot-message').remove();
+                        });
+                        image.src = data.url;
+                    } else if (data.status === 'pending' && Date.now() < deadline) {
+                        poll();
+                    } else if (data.status === 'missing') {
+                        // Unknown or expired plot: it will never be ready, stop polling
+                        showError('El gráfico ya no está disponible. Vuelve a calcular tus resultados para verlo.');
+                    } else {
+                        showError();
+                    }
+                })
+                .catch(() => {
+                    // Network error: retry after a pause
+                    if (Date.now() < deadline) {
+                        setTimeout(poll, 2000);
+                    } else {
+                        showError();
+                    }
+                });
+        }
+        
+        poll();
+    });
+    
     // Category breakdown visualization
     const categoryBars = document.querySelectorAll('.category-bar');
     if (categoryBars.length > 0) {
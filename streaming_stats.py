@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Mergeable streaming aggregates of scored cohorts.
+
+Summaries of batch scoring outputs are computed chunk by chunk, alongside the
+scorers, instead of loading the scored cohort into pandas. Every aggregate uses
+constant memory whatever the number of rows and can be merged with the
+aggregate of other chunks (e.g. computed by parallel workers), giving the same
+result as a single pass over all the rows:
+
+- RunningMoments: count, mean, variance, min and max (Chan et al. parallel
+  update of the mean and sum of squared deviations)
+- FixedHistogram: counts in fixed-width bins, with quantiles interpolated
+  within a bin (exact to the bin width)
+- PaceAggregates: both of them for every aging pace column and age band
+  (percentiles.AGE_BANDS), plus all ages
+
+Example:
+    aggregates = PaceAggregates()
+    for chunk in chunks:
+        aggregates.update(chunk['age'], scored(chunk))
+    print(aggregates.to_frame())
+"""
+
+from typing import Dict, Mapping, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from percentiles import AGE_BANDS, band_label
+
+# Histogram range and bin width of aging paces, in years
+PACE_RANGE = (-100.0, 100.0)
+PACE_BIN_WIDTH = 0.1
+
+# Quantiles reported by the summaries
+SUMMARY_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+class RunningMoments:
+    """Count, mean, variance, min and max of a stream of values."""
+    
+    __slots__ = ('count', 'mean', 'm2', 'min', 'max')
+    
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # Sum of squared deviations from the mean
+        self.min = np.inf
+        self.max = -np.inf
+    
+    def update(self, values) -> 'RunningMoments':
+        """Add an array of values (NaNs are ignored)."""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if values.size:
+            chunk = RunningMoments()
+            chunk.count = values.size
+            chunk.mean = float(values.mean())
+            chunk.m2 = float(np.square(values - chunk.mean).sum())
+            chunk.min = float(values.min())
+            chunk.max = float(values.max())
+            self.merge(chunk)
+        return self
+    
+    def merge(self, other: 'RunningMoments') -> 'RunningMoments':
+        """Combine with the moments of other values, in place."""
+        if other.count == 0:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+    
+    @property
+    def variance(self) -> float:
+        """Sample variance (NaN for fewer than two values)."""
+        return self.m2 / (self.count - 1) if self.count > 1 else float('nan')
+    
+    @property
+    def std(self) -> float:
+        """Sample standard deviation."""
+        return float(np.sqrt(self.variance))
+    
+    def to_dict(self) -> Dict:
+        empty = self.count == 0
+        return {
+            'count': self.count,
+            'mean': float('nan') if empty else self.mean,
+            'std': self.std,
+            'min': float('nan') if empty else self.min,
+            'max': float('nan') if empty else self.max
+        }
+
+
+class FixedHistogram:
+    """
+    Counts of a stream of values in fixed-width bins.
+    
+    Values below or above the range are counted in an underflow and an
+    overflow bin; quantiles falling there are reported as the range limits.
+    
+    Parameters:
+    -----------
+    low, high : float
+        Range of the bins
+    bins : int
+        Number of bins
+    """
+    
+    __slots__ = ('low', 'high', 'counts')
+    
+    def __init__(self, low: float, high: float, bins: int):
+        if not high > low or bins < 1:
+            raise ValueError("The histogram needs high > low and at least one bin")
+        self.low = float(low)
+        self.high = float(high)
+        # Underflow, the bins, overflow
+        self.counts = np.zeros(bins + 2, dtype=np.int64)
+    
+    @property
+    def bins(self) -> int:
+        return len(self.counts) - 2
+    
+    @property
+    def edges(self) -> np.ndarray:
+        """Edges of the bins (bins + 1 values)."""
+        return np.linspace(self.low, self.high, self.bins + 1)
+    
+    @property
+    def count(self) -> int:
+        return int(self.counts.sum())
+    
+    def update(self, values) -> 'FixedHistogram':
+        """Add an array of values (NaNs are ignored)."""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        scale = self.bins / (self.high - self.low)
+        # Index 0 is the underflow bin, bins + 1 the overflow bin
+        index = np.floor((values - self.low) * scale) + 1
+        np.clip(index, 0, self.bins + 1, out=index)
+        self.counts += np.bincount(index.astype(np.intp), minlength=len(self.counts))
+        return self
+    
+    def merge(self, other: 'FixedHistogram') -> 'FixedHistogram':
+        """Add the counts of a histogram with the same bins, in place."""
+        if (other.low, other.high, other.bins) != (self.low, self.high, self.bins):
+            raise ValueError("Only histograms with the same bins can be merged")
+        self.counts += other.counts
+        return self
+    
+    def quantiles(self, qs: Sequence[float]) -> np.ndarray:
+        """Quantiles of the values, interpolated linearly within their bin."""
+        total = self.count
+        if total == 0:
+            return np.full(len(qs), np.nan)
+        cumulative = np.cumsum(self.counts)
+        targets = np.asarray(qs, dtype=np.float64) * total
+        # Bin of every quantile, and the share of its count below the quantile
+        index = np.searchsorted(cumulative, targets, side='left')
+        index = np.clip(index, 0, len(self.counts) - 1)
+        below = np.where(index > 0, cumulative[index - 1], 0)
+        within = (targets - below) / np.maximum(self.counts[index], 1)
+        width = (self.high - self.low) / self.bins
+        values = self.low + (index - 1 + np.clip(within, 0, 1)) * width
+        return np.clip(values, self.low, self.high)
+
+
+class PaceAggregates:
+    """
+    Moments and histograms of aging paces per column and age band.
+    
+    Parameters:
+    -----------
+    pace_range : tuple of float
+        Histogram range of the aging paces, in years
+    bin_width : float
+        Histogram bin width, in years
+    """
+    
+    def __init__(self, pace_range=PACE_RANGE, bin_width: float = PACE_BIN_WIDTH):
+        self.pace_range = tuple(pace_range)
+        self.bin_width = bin_width
+        self.bins = int(round((pace_range[1] - pace_range[0]) / bin_width))
+        # (column, band index or None for all ages) -> (RunningMoments, FixedHistogram)
+        self._aggregates = {}
+    
+    def _get(self, column: str, band: Optional[int]):
+        aggregate = self._aggregates.get((column, band))
+        if aggregate is None:
+            aggregate = self._aggregates[(column, band)] = (
+                RunningMoments(), FixedHistogram(*self.pace_range, self.bins))
+        return aggregate
+    
+    def update(self, age, paces: Mapping[str, np.ndarray]) -> 'PaceAggregates':
+        """
+        Add a chunk of rows.
+        
+        Parameters:
+        -----------
+        age : array-like
+            Chronological ages of the rows
+        paces : mapping
+            Aging pace columns of the rows (e.g. the aging_pace_* columns of
+            CohortScorer.score), by name
+        """
+        age = np.asarray(age, dtype=np.float64)
+        bands = np.maximum(np.searchsorted(AGE_BANDS, age, side='right') - 1, 0)
+        # Rows of every band, sorted once for all the columns
+        order = np.argsort(bands, kind='stable')
+        present, starts = np.unique(bands[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+        for column, values in paces.items():
+            values = np.asarray(values, dtype=np.float64)
+            for aggregate in self._get(column, None):
+                aggregate.update(values)
+            sorted_values = values[order]
+            for band, start, end in zip(present, starts, ends):
+                for aggregate in self._get(column, int(band)):
+                    aggregate.update(sorted_values[start:end])
+        return self
+    
+    def merge(self, other: 'PaceAggregates') -> 'PaceAggregates':
+        """Add the aggregates of other rows (e.g. of another worker), in place."""
+        for (column, band), (moments, histogram) in other._aggregates.items():
+            own_moments, own_histogram = self._get(column, band)
+            own_moments.merge(moments)
+            own_histogram.merge(histogram)
+        return self
+    
+    @property
+    def columns(self):
+        return list(dict.fromkeys(column for column, _ in self._aggregates))
+    
+    def histogram(self, column: str, band: Optional[int] = None) -> FixedHistogram:
+        """Histogram of a column for an age band index (None for all ages)."""
+        return self._aggregates[(column, band)][1]
+    
+    def moments(self, column: str, band: Optional[int] = None) -> RunningMoments:
+        """Moments of a column for an age band index (None for all ages)."""
+        return self._aggregates[(column, band)][0]
+    
+    def to_frame(self, quantiles: Sequence[float] = SUMMARY_QUANTILES) -> pd.DataFrame:
+        """
+        Distribution summary per column and age band.
+        
+        Returns:
+        --------
+        pd.DataFrame
+            One row per column and age band ('all' first), with the count,
+            mean, std, min, max and the quantiles (p5, p25, ...)
+        """
+        rows = []
+        for column in self.columns:
+            bands = sorted(band for c, band in self._aggregates if c == column and band is not None)
+            for band in [None] + bands:
+                moments, histogram = self._aggregates[(column, band)]
+                row = {'column': column, 'age_band': 'all' if band is None else band_label(band)}
+                row.update(moments.to_dict())
+                for q, value in zip(quantiles, histogram.quantiles(quantiles)):
+                    row[f"p{q * 100:g}"] = float(value)
+                rows.append(row)
+        return pd.DataFrame(rows)
+    
+    def to_dict(self, quantiles: Sequence[float] = SUMMARY_QUANTILES) -> Dict:
+        """JSON-serializable summary: {column: {age band: statistics}}."""
+        summary = {}
+        for row in self.to_frame(quantiles).to_dict('records'):
+            column = row.pop('column')
+            summary.setdefault(column, {})[row.pop('age_band')] = row
+        return summary
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+High-volume synthetic cohort generator for load and scale testing.
+
+Generates cohorts with every biomarker used by the NHANES III reference
+weights and PhenoAge (same distributions as bioage_example.generate_simulated_data)
+plus answers to every question of the questionnaire calculator. Rows are
+generated in fixed-size chunks, each with its own seed spawned from a single
+root seed with np.random.SeedSequence, so:
+
+- chunk i is the same whatever the number of workers or the total row count
+- chunks can be generated in parallel worker processes
+- the output is streamed to CSV or Parquet chunk by chunk, so row counts far
+  larger than memory (e.g. 100M rows) can be written
+
+Example:
+    python synthetic_cohort.py cohort.parquet --rows 100000000 --workers 8
+    python synthetic_cohort.py cohort.csv --rows 1000000 --seed 7 --no-questionnaire
+"""
+
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from batch_scoring import ChunkWriter
+from questionnaire_bioage import QuestionnaireAgeCalculator
+
+DEFAULT_CHUNK_ROWS = 1000000
+
+# Prefix of the questionnaire answer columns. The 'age' and 'sex' questions are
+# answered by the cohort's own 'age' and 'sex_label' columns.
+QUESTION_PREFIX = 'q_'
+
+
+def _choice_questions() -> List[Tuple[str, List[str]]]:
+    """(question id, option values) for every choice question except sex."""
+    return [
+        (question['id'], [option['value'] for option in question['options']])
+        for question in QuestionnaireAgeCalculator().get_questions()
+        if question['type'] == 'choice' and question['id'] != 'sex'
+    ]
+
+
+def generate_chunk(n_rows: int,
+                   seed,
+                   questionnaire: bool = True,
+                   age_range: Tuple[float, float] = (30, 80),
+                   start_id: int = 0) -> pd.DataFrame:
+    """
+    Generate one chunk of a synthetic cohort.
+    
+    Parameters:
+    -----------
+    n_rows : int
+        Number of rows
+    seed : int or np.random.SeedSequence
+        Seed of the chunk's random generator
+    questionnaire : bool, default=True
+        Whether to add questionnaire answer columns (q_<question id>)
+    age_range : Tuple[float, float], default=(30, 80)
+        Range of the uniformly distributed chronological ages
+    start_id : int, default=0
+        Identifier of the first row
+    
+    Returns:
+    --------
+    pd.DataFrame
+        Chunk with an 'id' column, 'age', 'sex', 'sex_label', the biomarker
+        columns and optionally the questionnaire answers
+    """
+    rng = np.random.default_rng(seed)
+    
+    def noise(scale):
+        return rng.normal(0, scale, n_rows)
+    
+    ages = rng.uniform(age_range[0], age_range[1], n_rows)
+    sex = rng.binomial(1, 0.5, n_rows)  # 0=male, 1=female
+    male = 1 - sex
+    
+    c_reactive_protein = np.maximum(0.1, 0.1 + 0.01 * ages + noise(0.3))
+    
+    data = {
+        'id': np.arange(start_id, start_id + n_rows, dtype=np.int64),
+        'age': ages,
+        'sex': sex,
+        'sex_label': np.where(sex == 0, 'male', 'female').astype(object),
+        'c_reactive_protein': c_reactive_protein,
+        'glycated_hemoglobin': 5.0 + 0.02 * ages + noise(0.4),
+        'serum_albumin': 4.5 - 0.005 * ages + noise(0.2),
+        'alkaline_phosphatase': 60 + 0.5 * ages + noise(15),
+        'forced_expiratory_volume': 4000 - 20 * ages + 500 * male + noise(400),
+        'systolic_blood_pressure': 100 + 0.7 * ages + noise(10),
+        'serum_urea_nitrogen': 10 + 0.1 * ages + noise(3),
+        'creatinine': 0.7 + 0.005 * ages + 0.2 * male + noise(0.15),
+        'glucose': 70 + 0.5 * ages + noise(10),
+        'log_crp': np.log(c_reactive_protein * 10),  # mg/L
+        'lymphocyte_percent': 35 - 0.1 * ages + noise(5),
+        'mean_cell_volume': 85 + 0.1 * ages + noise(3),
+        'red_cell_distribution_width': 12 + 0.02 * ages + noise(1),
+        'white_blood_cell_count': 7 + noise(1.5)
+    }
+    
+    if questionnaire:
+        for question_id, values in _choice_questions():
+            # Categorical columns are compact in memory and dictionary-encoded in Parquet
+            codes = rng.integers(0, len(values), n_rows).astype(np.int8)
+            data[QUESTION_PREFIX + question_id] = pd.Categorical.from_codes(codes, categories=values)
+    
+    return pd.DataFrame(data)
+
+
+def questionnaire_responses(data: pd.DataFrame) -> List[Dict]:
+    """
+    Convert generated rows to questionnaire response dictionaries.
+    
+    Parameters:
+    -----------
+    data : pd.DataFrame
+        Rows generated with questionnaire=True
+    
+    Returns:
+    --------
+    List[Dict]
+        Responses accepted by QuestionnaireAgeCalculator.calculate_biological_age
+    """
+    columns = [c for c in data.columns if c.startswith(QUESTION_PREFIX)]
+    answers = data[columns].rename(columns=lambda c: c[len(QUESTION_PREFIX):])
+    responses = answers.to_dict('records')
+    for response, age, sex in zip(responses, data['age'].astype(int), data['sex_label']):
+        response['age'] = int(age)
+        response['sex'] = sex
+    return responses
+
+
+def plan_chunks(n_rows: int, chunk_rows: int = DEFAULT_CHUNK_ROWS, seed: int = 42) -> List[Tuple]:
+    """
+    Split a cohort into chunks with independent seeds.
+    
+    Parameters:
+    -----------
+    n_rows : int
+        Total number of rows
+    chunk_rows : int
+        Rows per chunk (the last chunk may be shorter)
+    seed : int
+        Root seed; chunk i always gets the i-th child seed
+    
+    Returns:
+    --------
+    List[Tuple]
+        (start row, number of rows, seed sequence) per chunk
+    """
+    n_chunks = -(-n_rows // chunk_rows)
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    return [
+        (i * chunk_rows, min(chunk_rows, n_rows - i * chunk_rows), seeds[i])
+        for i in range(n_chunks)
+    ]
+
+
+def _generate(chunk: Tuple, questionnaire: bool, age_range: Tuple[float, float]) -> pd.DataFrame:
+    start, rows, seed = chunk
+    return generate_chunk(rows, seed, questionnaire=questionnaire,
+                          age_range=age_range, start_id=start)
+
+
+def generate_cohort(output_path: str,
+                    n_rows: int,
+                    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                    seed: int = 42,
+                    workers: Optional[int] = None,
+                    questionnaire: bool = True,
+                    age_range: Tuple[float, float] = (30, 80)) -> Dict:
+    """
+    Generate a synthetic cohort and write it to a CSV or Parquet file.
+    
+    Parameters:
+    -----------
+    output_path : str
+        Output file (.csv or .parquet, one row group per chunk)
+    n_rows : int
+        Total number of rows
+    chunk_rows : int
+        Rows per chunk
+    seed : int
+        Root seed. The output only depends on seed, chunk_rows and n_rows.
+    workers : int, optional
+        Number of worker processes. Defaults to the number of CPUs; 1
+        generates in the current process.
+    questionnaire : bool, default=True
+        Whether to add questionnaire answer columns
+    age_range : Tuple[float, float], default=(30, 80)
+        Range of the chronological ages
+    
+    Returns:
+    --------
+    dict
+        Summary with the number of rows, chunks, elapsed seconds and throughput
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = plan_chunks(n_rows, chunk_rows, seed)
+    
+    start_time = time.perf_counter()
+    writer = ChunkWriter(output_path)
+    try:
+        if workers == 1:
+            for chunk in chunks:
+                writer.write(_generate(chunk, questionnaire, age_range))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(pool.submit(_generate, chunk, questionnaire, age_range))
+                    # Keep at most two chunks per worker in memory
+                    if len(pending) >= 2 * workers:
+                        writer.write(pending.popleft().result())
+                while pending:
+                    writer.write(pending.popleft().result())
+    finally:
+        writer.close()
+    
+    elapsed = time.perf_counter() - start_time
+    return {
+        'rows': n_rows,
+        'chunks': len(chunks),
+        'workers': workers,
+        'seconds': elapsed,
+        'rows_per_second': n_rows / elapsed if elapsed > 0 else float('inf')
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a large synthetic biomarker cohort.")
+    parser.add_argument('output', help="Output file (.csv or .parquet)")
+    parser.add_argument('--rows', type=int, required=True, help="Number of rows")
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS, help="Rows per chunk")
+    parser.add_argument('--seed', type=int, default=42, help="Root random seed")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes")
+    parser.add_argument('--min-age', type=float, default=30, help="Minimum chronological age")
+    parser.add_argument('--max-age', type=float, default=80, help="Maximum chronological age")
+    parser.add_argument('--no-questionnaire', action='store_true',
+                        help="Don't generate questionnaire answers")
+    args = parser.parse_args(argv)
+    
+    summary = generate_cohort(args.output, args.rows,
+                              chunk_rows=args.chunk_rows,
+                              seed=args.seed,
+                              workers=args.workers,
+                              questionnaire=not args.no_questionnaire,
+                              age_range=(args.min_age, args.max_age))
+    
+    print(f"Generated {summary['rows']} rows in {summary['chunks']} chunks "
+          f"with {summary['workers']} workers")
+    print(f"Elapsed: {summary['seconds']:.2f} s ({summary['rows_per_second']:,.0f} rows/s)")
+    print(f"Cohort written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
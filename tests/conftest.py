@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""
+Shared fixtures of the test suite; run it with `python -m pytest` from the repository root.
+"""
+
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from bioage_example import generate_simulated_data  # noqa: E402
+from kd_reference_weights import NHANES_III_MALE_WEIGHTS  # noqa: E402
+
+NHANES_BIOMARKERS = list(NHANES_III_MALE_WEIGHTS)
+
+
+@pytest.fixture(scope='session')
+def cohort():
+    """Simulated cohort with the NHANES III and PhenoAge biomarkers."""
+    return generate_simulated_data(n_samples=2000, seed=7)
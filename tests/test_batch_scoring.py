@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+score_file outputs: chunk dtypes, empty inputs and the in-process scores.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from batch_scoring import CohortScorer, score_file
+
+
+@pytest.fixture
+def cohort_csv(cohort, tmp_path):
+    # Whole ages in the first rows: the first CSV chunks infer int64, later ones float64
+    data = cohort.head(400).copy()
+    data['age'] = [int(round(age)) if i < 200 else age for i, age in enumerate(data['age'])]
+    path = tmp_path / 'cohort.csv'
+    data.to_csv(path, index=False)
+    return path
+
+
+def test_csv_output_matches_in_process_scores(cohort_csv, tmp_path):
+    scorer = CohortScorer(keep_columns=['age', 'sex'])
+    output = tmp_path / 'scores.csv'
+    summary = score_file(str(cohort_csv), str(output), scorer, workers=1, chunk_bytes=4096)
+    assert summary['rows'] == 400 and summary['chunks'] > 1
+    expected = scorer.score(pd.read_csv(cohort_csv))
+    pd.testing.assert_frame_equal(pd.read_csv(output), expected, check_dtype=False)
+
+
+def test_parquet_output_has_one_schema_across_chunks(cohort_csv, tmp_path):
+    pytest.importorskip('pyarrow')
+    scorer = CohortScorer(keep_columns=['age', 'sex'])
+    output = tmp_path / 'scores.parquet'
+    score_file(str(cohort_csv), str(output), scorer, workers=1, chunk_bytes=4096)
+    scores = pd.read_parquet(output)
+    assert len(scores) == 400
+    assert scores['age'].dtype == np.float64 and scores['sex'].dtype == np.float64
+    np.testing.assert_allclose(scores['age'], pd.read_csv(cohort_csv)['age'])
+
+
+@pytest.mark.parametrize('extension', ['.csv', '.parquet'])
+def test_empty_input_writes_the_output_columns(cohort, tmp_path, extension):
+    if extension == '.parquet':
+        pytest.importorskip('pyarrow')
+    path = tmp_path / 'empty.csv'
+    cohort.head(0).to_csv(path, index=False)
+    scorer = CohortScorer(keep_columns=['age'])
+    output = tmp_path / ('scores' + extension)
+    assert score_file(str(path), str(output), scorer, workers=1)['rows'] == 0
+    
+    scores = pd.read_csv(output) if extension == '.csv' else pd.read_parquet(output)
+    assert len(scores) == 0
+    assert list(scores.columns) == ['age', 'bioage_nhanes', 'bioage_nhanes_with_ca', 'phenoage',
+                                    'aging_pace_nhanes', 'aging_pace_nhanes_with_ca', 'aging_pace_phenoage']
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized NHANES III and PhenoAge scoring against the scalar functions.
+"""
+
+import numpy as np
+import pytest
+
+from batch_scoring import PHENOAGE_COLUMNS
+from conftest import NHANES_BIOMARKERS
+from kd_reference_weights import (
+    calculate_bioage_from_reference,
+    calculate_bioage_from_reference_batch,
+    calculate_phenoage,
+    calculate_phenoage_batch
+)
+
+
+@pytest.fixture(scope='module')
+def rows(cohort):
+    return cohort.iloc[:300]
+
+
+@pytest.mark.parametrize('include_chronological_age', [False, True])
+def test_reference_batch_matches_scalar_for_mixed_sexes(rows, include_chronological_age):
+    expected = [
+        calculate_bioage_from_reference(
+            {b: row[b] for b in NHANES_BIOMARKERS}, sex=row['sex_label'],
+            include_chronological_age=include_chronological_age, chronological_age=row['age'])
+        for _, row in rows.iterrows()
+    ]
+    result = calculate_bioage_from_reference_batch(
+        {b: rows[b].to_numpy() for b in NHANES_BIOMARKERS}, rows['sex_label'].to_numpy(),
+        include_chronological_age=include_chronological_age, chronological_age=rows['age'].to_numpy())
+    np.testing.assert_allclose(result, expected, rtol=1e-12)
+
+
+def test_reference_batch_single_sex_and_case(rows):
+    values = {b: rows[b].to_numpy() for b in NHANES_BIOMARKERS}
+    expected = [calculate_bioage_from_reference({b: row[b] for b in NHANES_BIOMARKERS}, sex='female')
+                for _, row in rows.iterrows()]
+    np.testing.assert_allclose(calculate_bioage_from_reference_batch(values, 'female'), expected, rtol=1e-12)
+    np.testing.assert_allclose(calculate_bioage_from_reference_batch(values, ['Female'] * len(rows)),
+                               expected, rtol=1e-12)
+
+
+def test_reference_batch_float32_is_close(rows):
+    values = {b: rows[b].to_numpy() for b in NHANES_BIOMARKERS}
+    sex = rows['sex_label'].to_numpy()
+    np.testing.assert_allclose(calculate_bioage_from_reference_batch(values, sex, dtype=np.float32),
+                               calculate_bioage_from_reference_batch(values, sex), atol=1e-3)
+
+
+def test_reference_batch_rejects_invalid_input(rows):
+    values = {b: rows[b].to_numpy() for b in NHANES_BIOMARKERS}
+    with pytest.raises(ValueError):
+        calculate_bioage_from_reference_batch(values, 'other')
+    with pytest.raises(ValueError):
+        calculate_bioage_from_reference_batch({'unknown': rows['age'].to_numpy()}, 'male')
+    with pytest.raises(ValueError):
+        calculate_bioage_from_reference_batch(values, 'male', include_chronological_age=True)
+
+
+def test_phenoage_batch_matches_scalar():
+    # Values in the units of the weights; the simulated cohort overflows the scalar formula
+    rng = np.random.default_rng(13)
+    n = 300
+    arguments = dict(albumin=rng.normal(42, 3, n), creatinine=rng.normal(80, 15, n), glucose=rng.normal(5, 0.8, n),
+                     log_crp=rng.normal(-0.5, 1, n), lymphocyte_percent=rng.normal(30, 7, n),
+                     mean_cell_volume=rng.normal(90, 4, n), red_cell_distribution_width=rng.normal(13, 1, n),
+                     alkaline_phosphatase=rng.normal(70, 20, n), white_blood_cell_count=rng.normal(6, 1.5, n),
+                     chronological_age=rng.uniform(20, 85, n))
+    expected = [calculate_phenoage(**{argument: values[i] for argument, values in arguments.items()})
+                for i in range(n)]
+    np.testing.assert_allclose(calculate_phenoage_batch(**arguments), expected, rtol=1e-8)
+    np.testing.assert_allclose(calculate_phenoage_batch(**arguments, dtype=np.float32), expected, atol=1e-3)
+
+
+def test_phenoage_batch_reads_the_batch_columns(rows):
+    arguments = {argument: rows[column].to_numpy() for argument, column in PHENOAGE_COLUMNS.items()}
+    assert calculate_phenoage_batch(**arguments).shape == (len(rows),)
+
+
+def test_phenoage_batch_stays_finite_for_low_risk():
+    # exp(xb) below machine precision makes the step-by-step formula return -inf
+    arguments = dict(albumin=5.0, creatinine=0.5, glucose=-100.0, log_crp=-3.0, lymphocyte_percent=40.0,
+                     mean_cell_volume=85.0, red_cell_distribution_width=12.0, alkaline_phosphatase=50.0,
+                     white_blood_cell_count=5.0, chronological_age=20.0)
+    result = calculate_phenoage_batch(**{name: np.array([value]) for name, value in arguments.items()})
+    assert np.isfinite(result).all()
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+KlemeraDoubal against the original per-biomarker, per-row implementation.
+"""
+
+import pickle
+
+import numpy as np
+import pytest
+from scipy import stats
+
+from conftest import NHANES_BIOMARKERS
+from klemera_doubal import KlemeraDoubal, _covariance, _estimate_s_BA2
+
+
+def baseline_params(data, biomarkers, age_col='age'):
+    # One scipy.stats.linregress per biomarker, as fit did originally
+    ca = data[age_col].values
+    params = {}
+    for biomarker in biomarkers:
+        x = data[biomarker].values
+        slope, intercept, r_value, p_value, std_err = stats.linregress(ca, x)
+        residuals = x - (intercept + slope * ca)
+        params[biomarker] = {
+            'k_i': slope,
+            'q_i': intercept,
+            's_i': np.sqrt(np.sum(residuals**2) / (len(residuals) - 2)),
+            'r2': r_value**2,
+            'corr': r_value,
+            'p_value': p_value,
+            'std_err': std_err
+        }
+    return params
+
+
+def baseline_predict(params, data, s_BA, include_chronological=False, age_col='age'):
+    # Row by row weighted average, as predict did originally
+    ages = np.zeros(len(data))
+    for i in range(len(data)):
+        sample = data.iloc[i]
+        numerator_sum = denominator_sum = 0
+        for biomarker, p in params.items():
+            weight = p['k_i']**2 / p['s_i']**2
+            numerator_sum += weight * (sample[biomarker] - p['q_i']) / p['k_i']
+            denominator_sum += weight
+        if include_chronological:
+            numerator_sum += sample[age_col] / s_BA**2
+            denominator_sum += 1 / s_BA**2
+        ages[i] = numerator_sum / denominator_sum
+    return ages
+
+
+@pytest.fixture(scope='module')
+def fitted(cohort):
+    kd = KlemeraDoubal(chronological_age_col='age')
+    kd.fit(cohort, NHANES_BIOMARKERS)
+    return kd
+
+
+def test_fit_matches_linregress(cohort, fitted):
+    expected = baseline_params(cohort, NHANES_BIOMARKERS)
+    for biomarker in NHANES_BIOMARKERS:
+        for name, value in expected[biomarker].items():
+            assert fitted.params[biomarker][name] == pytest.approx(value, rel=1e-7, abs=1e-12), (biomarker, name)
+    s_BA = 1 / np.sqrt(sum(p['k_i']**2 / p['s_i']**2 for p in expected.values()))
+    assert fitted.s_BA == pytest.approx(s_BA, rel=1e-9)
+
+
+def test_covariance_is_independent_of_chunking(cohort):
+    columns = ['age'] + NHANES_BIOMARKERS
+    moments = _covariance(cohort, columns, chunk_rows=97)
+    values = cohort[columns].to_numpy()
+    assert moments['n'] == len(cohort)
+    np.testing.assert_allclose(moments['mean'], values.mean(axis=0), rtol=1e-12)
+    np.testing.assert_allclose(moments['covariance'], np.cov(values, rowvar=False), rtol=1e-9)
+    np.testing.assert_array_equal(moments['min'], values.min(axis=0))
+    np.testing.assert_array_equal(moments['max'], values.max(axis=0))
+
+
+@pytest.mark.parametrize('include_chronological', [False, True])
+def test_predict_matches_baseline(cohort, fitted, include_chronological):
+    data = cohort.iloc[:200]
+    expected = baseline_predict(fitted.params, data, fitted.s_BA, include_chronological)
+    np.testing.assert_allclose(fitted.predict(data, include_chronological=include_chronological),
+                               expected, rtol=1e-10)
+
+
+def test_predict_accepts_column_mappings(cohort, fitted):
+    columns = {name: cohort[name].to_numpy() for name in ['age'] + NHANES_BIOMARKERS}
+    np.testing.assert_allclose(fitted.predict(columns), fitted.predict(cohort), rtol=1e-12)
+
+
+def test_predict_float32_is_close(cohort, fitted):
+    np.testing.assert_allclose(fitted.predict(cohort, dtype=np.float32), fitted.predict(cohort), atol=1e-3)
+
+
+def test_predict_variants(cohort, fitted):
+    variants = fitted.predict_variants(cohort)
+    np.testing.assert_allclose(variants['BA_E'], fitted.predict(cohort), rtol=1e-12)
+    np.testing.assert_allclose(variants['BA_CA'], fitted.predict(cohort, include_chronological=True),
+                               rtol=1e-12)
+    
+    # BA_EC weights chronological age by 1 / s_BA2 (not positive for the simulated cohort)
+    kd = pickle.loads(pickle.dumps(fitted))
+    kd.s_BA2 = 25.0
+    weights = np.array([kd.params[b]['k_i']**2 / kd.params[b]['s_i']**2 for b in NHANES_BIOMARKERS])
+    ca = cohort['age'].values
+    expected = (variants['BA_E'] * weights.sum() + ca / kd.s_BA2) / (weights.sum() + 1 / kd.s_BA2)
+    np.testing.assert_allclose(kd.predict_variants(cohort)['BA_EC'], expected, rtol=1e-10)
+
+
+def test_predict_variants_without_positive_s_BA2(cohort, fitted):
+    kd = pickle.loads(pickle.dumps(fitted))
+    kd.s_BA2 = -1.0
+    assert np.isnan(kd.predict_variants(cohort)['BA_EC']).all()
+    del kd.s_BA2  # Fitted by a version without the corrected estimate
+    assert np.isnan(kd.predict_variants(cohort)['BA_EC']).all()
+
+
+def test_estimate_s_BA2_matches_direct_computation(cohort, fitted):
+    ca = cohort['age'].values
+    variance = np.var(fitted.predict(cohort) - ca, ddof=1)
+    r = np.array([fitted.params[b]['corr'] for b in NHANES_BIOMARKERS])
+    r_char = np.sum(r**2 / np.sqrt(1 - r**2)) / np.sum(np.abs(r) / np.sqrt(1 - r**2))
+    m = len(NHANES_BIOMARKERS)
+    expected = variance - (1 - r_char**2) / r_char**2 * (ca.max() - ca.min())**2 / (12 * m)
+    
+    assert fitted.r_char == pytest.approx(r_char, rel=1e-10)
+    assert fitted.s_BA2 == pytest.approx(expected, rel=1e-8)
+    k_i, s_i = fitted._param_arrays['k_i'], fitted._param_arrays['s_i']
+    assert _estimate_s_BA2(k_i, s_i, r, fitted._training_moments) == pytest.approx((expected, r_char), rel=1e-8)
+
+
+def test_predict_cached_reuses_the_last_prediction(cohort, fitted):
+    kd = pickle.loads(pickle.dumps(fitted))
+    del kd.__dict__['_last_prediction']  # Pickled before the attribute existed
+    first = kd.predict_cached(cohort)
+    assert kd.predict_cached(cohort) is first
+    np.testing.assert_allclose(first, fitted.predict(cohort), rtol=1e-12)
+
+
+def test_prediction_cache_detects_refits(cohort):
+    kd = KlemeraDoubal(chronological_age_col='age')
+    kd.fit(cohort, NHANES_BIOMARKERS)
+    cache = kd.enable_prediction_cache()
+    first = kd.predict(cohort)
+    assert kd.predict(cohort) is first
+    assert (cache.hits, cache.misses) == (1, 1)
+    
+    kd.fit(cohort.iloc[:1000], NHANES_BIOMARKERS)
+    np.testing.assert_allclose(kd.predict(cohort), baseline_predict(
+        kd.params, cohort, kd.s_BA), rtol=1e-10)
+
+
+def test_fit_rejects_missing_values(cohort):
+    data = cohort.copy()
+    data.loc[5, 'serum_albumin'] = np.nan
+    with pytest.raises(ValueError, match=r"\['serum_albumin'\]"):
+        KlemeraDoubal(chronological_age_col='age').fit(data, NHANES_BIOMARKERS)
+
+
+def test_predict_cached_fingerprints_sampled_rows(cohort, fitted, monkeypatch):
+    import klemera_doubal
+    calls = []
+    fingerprint = klemera_doubal.data_fingerprint
+    monkeypatch.setattr(klemera_doubal, 'data_fingerprint',
+                        lambda *args, **kwargs: calls.append(kwargs['sample_rows']) or fingerprint(*args, **kwargs))
+    kd = pickle.loads(pickle.dumps(fitted))
+    kd.predict_cached(cohort)
+    assert calls == [klemera_doubal.LAST_PREDICTION_FINGERPRINT_ROWS]
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental trends of LongitudinalStore against a full least-squares fit.
+"""
+
+import numpy as np
+import pytest
+
+from longitudinal import SECONDS_PER_YEAR, LongitudinalStore, new_token, pseudonymize, valid_token
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LongitudinalStore(str(tmp_path / 'longitudinal.db'), secret='test-secret')
+
+
+def result(pace):
+    return {'chronological_age': 50.0, 'biological_age': 50.0 + pace, 'aging_pace': pace}
+
+
+def test_trend_matches_least_squares(store):
+    rng = np.random.default_rng(19)
+    token = new_token()
+    start = 1.7e9
+    # Out of order submissions are part of the same fit
+    times = start + np.sort(rng.uniform(0, 3, 12))[rng.permutation(12)] * SECONDS_PER_YEAR
+    times[0] = start
+    paces = rng.normal(1, 2, 12)
+    for measured_at, pace in zip(times, paces):
+        trend = store.record(token, result(pace), measured_at=measured_at)
+    
+    slope = np.polyfit((times - start) / SECONDS_PER_YEAR, paces, 1)[0]
+    trend.pop('change_since_last')
+    assert trend == store.trend(token)
+    assert trend['measurements'] == 12
+    assert trend['pace_change_per_year'] == pytest.approx(slope, abs=0.005 + 1e-9)
+    assert trend['mean_aging_pace'] == round(paces.mean(), 1)
+    assert trend['years_tracked'] == round((times.max() - start) / SECONDS_PER_YEAR, 2)
+    assert [row['measured_at'] for row in store.history(token)] == sorted(times)
+
+
+def test_no_trend_over_short_spans(store):
+    token = new_token()
+    store.record(token, result(1.0), measured_at=1.7e9)
+    trend = store.record(token, result(2.0), measured_at=1.7e9 + 3600)
+    assert trend['pace_change_per_year'] is None
+    assert trend['change_since_last'] == 1.0
+
+
+def test_tokens_are_validated_and_pseudonymized(store, tmp_path):
+    token = new_token()
+    assert valid_token(token) and not valid_token('alice') and not valid_token(None)
+    assert store.record('alice', result(1.0)) is None
+    assert store.trend('alice') is None and store.history('alice') == []
+    
+    store.record(token, result(1.0))
+    assert store.person(token) == pseudonymize(token, 'test-secret')
+    assert store.trend(new_token()) is None
+    other = LongitudinalStore(str(tmp_path / 'longitudinal.db'), secret='other-secret')
+    assert other.trend(token) is None
+
+
+def test_a_secret_is_required(tmp_path, monkeypatch):
+    with pytest.raises(ValueError):
+        LongitudinalStore(str(tmp_path / 'longitudinal.db'), secret='')
+    monkeypatch.setenv('LONGITUDINAL_DB', str(tmp_path / 'longitudinal.db'))
+    monkeypatch.delenv('LONGITUDINAL_SECRET', raising=False)
+    with pytest.raises(ValueError):
+        LongitudinalStore.from_environment()
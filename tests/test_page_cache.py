@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+PageCache and the ETag/304 handling of the cached pages.
+"""
+
+import os
+
+import pytest
+
+from page_cache import PageCache, content_hash
+
+
+def test_pages_are_rendered_once_per_key():
+    cache = PageCache(name='test')
+    calls = []
+    
+    def render():
+        calls.append(1)
+        return '<p>café</p>'
+    
+    page = cache.get(('index', 1), render)
+    assert cache.get(('index', 1), render) is page
+    assert len(calls) == 1 and page.body == '<p>café</p>'.encode('utf-8')
+    assert cache.get(('index', 2), lambda: '<p>other</p>').etag != page.etag
+    assert page.encoded('gzip') is page.encoded('gzip')
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_content_hash_is_stable():
+    assert content_hash({'b': 1, 'a': [1, 2]}) == content_hash({'a': [1, 2], 'b': 1})
+    assert content_hash({'a': 1}) != content_hash({'a': 2})
+
+
+@pytest.fixture(scope='module')
+def client(tmp_path_factory):
+    # The app logs to app.log in the working directory
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('app'))
+    try:
+        from app import app
+        app.config['TESTING'] = True
+        yield app.test_client()
+    finally:
+        os.chdir(cwd)
+
+
+def test_matching_etags_get_304(client):
+    response = client.get('/about')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert 'public' in response.headers['Cache-Control']
+    assert 'Accept-Encoding' in response.headers['Vary']
+    
+    revalidated = client.get('/about', headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+    assert revalidated.headers['ETag'] == etag
+    assert client.get('/about', headers={'If-None-Match': '"stale"'}).status_code == 200
+
+
+def test_compressed_representations_revalidate(client):
+    response = client.get('/about', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    etag = response.headers['ETag']
+    assert etag.endswith('-gzip"')
+    revalidated = client.get('/about', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert revalidated.status_code == 304
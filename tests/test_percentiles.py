@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+PercentileIndex against percentiles computed from the full lists.
+"""
+
+import numpy as np
+
+from percentiles import PercentileIndex, age_band, band_label
+
+
+def brute_force_percent(paces, aging_pace):
+    paces = np.asarray(paces)
+    above = np.sum(paces > aging_pace)
+    ties = np.sum(paces == aging_pace)
+    return round(100 * (above + ties / 2) / len(paces))
+
+
+def test_age_bands():
+    assert [age_band(age) for age in (10, 18, 29.9, 30, 85)] == [0, 0, 0, 1, 6]
+    assert (band_label(2), band_label(6)) == ('40-49', '80+')
+
+
+def test_better_than_matches_brute_force():
+    rng = np.random.default_rng(17)
+    rows = [(float(age), sex, float(round(pace, 1)))
+            for age, sex, pace in zip(rng.uniform(40, 50, 400), rng.choice(['male', 'female'], 400),
+                                      rng.normal(0, 3, 400))]
+    index = PercentileIndex(min_samples=30)
+    index.update(rows[:300])
+    for age, sex, pace in rows[300:]:
+        index.add(age, sex, pace)  # Incremental inserts keep the lists sorted
+    assert len(index) == 400
+    
+    for pace in (-2.0, 0.0, 0.5, 3.0):
+        males = [p for _, sex, p in rows if sex == 'male']
+        result = index.better_than(45, 'male', pace)
+        assert result == {'percent': brute_force_percent(males, pace), 'age_band': '40-49',
+                          'sex': 'male', 'size': len(males)}
+        # Unknown sexes compare with both sexes of the band
+        assert index.better_than(45, None, pace)['percent'] == brute_force_percent([p for _, _, p in rows], pace)
+
+
+def test_small_groups_fall_back_and_synthetic_rows_do_not_count():
+    index = PercentileIndex(min_samples=30)
+    index.update([(45, 'male', 1.0)] * 5 + [(45, 'female', 0.0)] * 30)
+    assert index.better_than(45, 'male', 0.5)['sex'] is None
+    assert index.better_than(65, 'male', 0.5) is None
+    
+    index.update([(65, 'male', 0.0)] * 100, real=False)
+    assert index.count(65, 'male') == 100
+    assert index.better_than(65, 'male', 0.5) is None
+
+
+def test_reference_file(tmp_path):
+    path = tmp_path / 'reference.csv'
+    lines = ['age,sex,aging_pace'] + [f"55,{'male' if i % 2 else ''},{i / 10}" for i in range(60)] + ['55,male,x']
+    path.write_text('\n'.join(lines) + '\n')
+    index = PercentileIndex(min_samples=30)
+    assert index.add_reference_file(str(path)) == 60
+    assert index.better_than(55, 'male', 3.0)['size'] == 30
+    assert index.better_than(55, 'female', 3.0)['size'] == 60
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+PredictionCache bounds, in memory and on disk.
+"""
+
+import os
+import pickle
+
+import numpy as np
+
+from prediction_cache import PredictionCache
+
+
+def test_memory_lru_is_bounded():
+    cache = PredictionCache(max_entries=2)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, np.zeros(10))
+    assert len(cache) == 2 and cache.get('a') is None
+    assert not cache.get('c').flags.writeable
+
+
+def test_disk_is_pruned_least_recently_used_first(tmp_path):
+    cache = PredictionCache(directory=str(tmp_path), max_disk_bytes=3 * 8200)  # Three files of 1000 float64
+    for i, key in enumerate(('a', 'b', 'c')):
+        cache.put(key, np.full(1000, i, dtype=np.float64))
+        os.utime(tmp_path / f"{key}.npy", (1000 + i, 1000 + i))
+    assert sorted(os.listdir(tmp_path)) == ['a.npy', 'b.npy', 'c.npy']
+    
+    # A disk hit refreshes 'a', so 'b' is the least recently used file
+    cache.clear()
+    assert cache.get('a')[0] == 0
+    cache.put('d', np.zeros(1000))
+    assert sorted(os.listdir(tmp_path)) == ['a.npy', 'c.npy', 'd.npy']
+    
+    restored = pickle.loads(pickle.dumps(cache))
+    assert restored.max_disk_bytes == cache.max_disk_bytes and len(restored) == 0
+    assert restored.get('c')[0] == 2
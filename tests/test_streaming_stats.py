@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Merged streaming aggregates against single-pass statistics.
+"""
+
+import numpy as np
+import pytest
+
+from percentiles import AGE_BANDS
+from streaming_stats import FixedHistogram, PaceAggregates, RunningMoments
+
+
+@pytest.fixture(scope='module')
+def values():
+    rng = np.random.default_rng(3)
+    # A large offset makes naive sum-of-squares variances lose precision
+    return 1e6 + rng.normal(0, 2, 10000)
+
+
+def test_moments_merge_in_chunks(values):
+    moments = RunningMoments()
+    for chunk in np.array_split(values, 7):
+        moments.merge(RunningMoments().update(chunk))
+    assert moments.count == len(values)
+    assert moments.mean == pytest.approx(values.mean(), rel=1e-14)
+    assert moments.variance == pytest.approx(values.var(ddof=1), rel=1e-9)
+    assert (moments.min, moments.max) == (values.min(), values.max())
+
+
+def test_moments_ignore_nans_and_empty_chunks():
+    moments = RunningMoments().update([1.0, np.nan, 3.0]).update([]).merge(RunningMoments())
+    assert (moments.count, moments.mean, moments.variance) == (2, 2.0, 2.0)
+    empty = RunningMoments().to_dict()
+    assert empty['count'] == 0 and np.isnan(empty['mean']) and np.isnan(empty['std'])
+
+
+def test_histogram_quantiles_are_exact_to_the_bin_width():
+    rng = np.random.default_rng(5)
+    data = rng.normal(0, 5, 50000)
+    histogram = FixedHistogram(-100, 100, 2000)
+    for chunk in np.array_split(data, 4):
+        histogram.merge(FixedHistogram(-100, 100, 2000).update(chunk))
+    qs = [0.05, 0.5, 0.95]
+    np.testing.assert_allclose(histogram.quantiles(qs), np.quantile(data, qs), atol=0.1)
+
+
+def test_histogram_out_of_range_and_incompatible_merges():
+    histogram = FixedHistogram(0, 10, 10).update([-5.0, 5.0, 50.0])
+    assert histogram.counts[0] == 1 and histogram.counts[-1] == 1
+    np.testing.assert_allclose(histogram.quantiles([0.0, 1.0]), [0.0, 10.0])
+    with pytest.raises(ValueError):
+        histogram.merge(FixedHistogram(0, 10, 20))
+
+
+def test_pace_aggregates_per_band_match_pandas():
+    rng = np.random.default_rng(11)
+    age = rng.uniform(18, 90, 20000)
+    pace = rng.normal(0, 3, 20000)
+    merged = PaceAggregates()
+    for chunk in np.array_split(np.arange(len(age)), 5):
+        merged.merge(PaceAggregates().update(age[chunk], {'aging_pace': pace[chunk]}))
+    
+    assert merged.moments('aging_pace').count == len(age)
+    bands = np.searchsorted(AGE_BANDS, age, side='right') - 1
+    for band in np.unique(bands):
+        selected = pace[bands == band]
+        moments = merged.moments('aging_pace', int(band))
+        assert moments.count == len(selected)
+        assert moments.mean == pytest.approx(selected.mean(), rel=1e-12, abs=1e-12)
+        assert moments.std == pytest.approx(selected.std(ddof=1), rel=1e-9)
+    
+    frame = merged.to_frame()
+    assert list(frame['age_band'])[0] == 'all'
+    assert frame['count'].iloc[0] == len(age)